@@ -0,0 +1,17 @@
+"""
+Celery config for AtomREST project.
+
+Workers and a scheduler of periodic jobs are started separately from the web server:
+celery -A AtomREST worker
+celery -A AtomREST beat
+"""
+
+import os
+
+from celery import Celery
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'AtomREST.settings')
+
+app = Celery('AtomREST')
+app.config_from_object('django.conf:settings', namespace='CELERY')
+app.autodiscover_tasks()
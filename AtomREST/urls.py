@@ -15,6 +15,7 @@ router.register(r'projects', base_views.ProjectViewSet)
 router.register(r'buildings', base_views.BuildingViewSet)
 router.register(r'systems', base_views.SystemViewSet)
 router.register(r'models', model_views.Model3DViewSet)
+router.register(r'model_uploads', model_views.ModelUploadViewSet)
 router.register(r'view_points', model_views.ViewPointViewSet)
 router.register(r'notes', model_views.NotesViewSet)
 router.register(r'remarks', model_views.RemarksViewSet)
@@ -22,6 +23,15 @@ router.register(r'remarks', model_views.RemarksViewSet)
 urlpatterns = [
     path('api/v1/view_points_export', model_views.ExportViewPointsView.as_view(), name='view_points_export'),
     path('api/v1/view_points_import', model_views.ImportViewPointsView.as_view(), name='view_points_import'),
+    path('api/v1/view_points_export_jobs', model_views.ExportViewPointsJobView.as_view(),
+         name='view_points_export_jobs'),
+    path('api/v1/view_points_import_jobs', model_views.ImportViewPointsJobView.as_view(),
+         name='view_points_import_jobs'),
+    path('api/v1/jobs/<job_id>', model_views.JobStatusView.as_view(), name='job_status'),
+    path('api/v1/model_files/<int:pk>/<str:kind>', model_views.ModelFileView.as_view(), name='model_file'),
+    path('api/v1/model_artefacts/<int:pk>', model_views.ModelArtefactView.as_view(), name='model_artefact'),
+    path('api/v1/bundles/<slug:project>/<slug:building>', model_views.BuildingBundleView.as_view(),
+         name='building_bundle'),
     path('', include('EasyView.urls')),
     path('api/v1/', include(router.urls)),
     path('admin/', admin.site.urls),
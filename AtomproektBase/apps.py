@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AtomproektbaseConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'AtomproektBase'
+
+    def ready(self):
+        from AtomproektBase import signals  # noqa: F401
@@ -1,8 +1,51 @@
+from django.core.cache import cache
+from django.db.models import Prefetch
 from django.http import HttpRequest
 from AtomproektBase import models
 
+PROJECTS_TREE_KEY = 'atomproekt_projects_tree'
+
 
 def projects_context(request: HttpRequest):
-    """A simple context processor to include all Project models"""
+    """A simple context processor to include navigation tree of all Project models"""
+
+    return {'projects': get_projects_tree()}
+
+
+def get_projects_tree() -> list:
+    """
+    Returns navigation tree of projects and their buildings. The tree is built once and kept in cache until
+    a project, a building or a building's model is saved or deleted.
+
+    :return: list of dicts that describe projects, every one of them has a list of its buildings.
+    """
+    tree = cache.get(PROJECTS_TREE_KEY)
+    if tree is None:
+        tree = build_projects_tree()
+        cache.set(PROJECTS_TREE_KEY, tree, None)
+    return tree
+
+
+def build_projects_tree() -> list:
+    """Builds navigation tree of projects and their buildings"""
+    projects = models.Project.objects.prefetch_related(
+        Prefetch('buildings', queryset=models.Building.objects.select_related('model')),
+    )
+    return [
+        {
+            'name': project.name,
+            'slug': project.slug,
+            'buildings': [
+                {
+                    'kks': building.kks,
+                    'slug': building.slug,
+                    'has_model': hasattr(building, 'model'),
+                } for building in project.buildings.all()
+            ],
+        } for project in projects
+    ]
+
 
-    return {'projects': models.Project.objects.all()}
+def invalidate_projects_tree():
+    """Drops cached navigation tree"""
+    cache.delete(PROJECTS_TREE_KEY)
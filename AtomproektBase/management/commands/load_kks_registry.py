@@ -0,0 +1,38 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from AtomproektBase import registry
+
+
+class Command(BaseCommand):
+    """Loads a KKS registry of projects, buildings and systems from a file in one transaction"""
+    help = (
+        'Creates or updates projects, buildings and systems of a KKS registry from a CSV or JSON Lines file. '
+        'Records are written in batches while the file is read, so they should follow records of projects '
+        'and buildings they refer to.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='path to a file of a registry')
+        parser.add_argument(
+            '--format', choices=registry.FORMATS, help='format of the file, it is found by its extension by default',
+        )
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or os.path.splitext(options['path'])[1].lstrip('.').lower()
+        if file_format not in registry.FORMATS:
+            raise CommandError(f'Unknown format of a registry "{file_format}", use --format')
+        progress = self.stdout.write if options['verbosity'] > 0 else None
+        try:
+            with open(options['path'], encoding='utf-8-sig', newline='') as file:
+                result = registry.load_registry(registry.read_registry(file, file_format), progress)
+        except (OSError, registry.RegistryError) as error:
+            raise CommandError(error)
+        for record_type in registry.RECORD_FIELDS:
+            created, updated = result[record_type]
+            self.stdout.write(f'{record_type}: {created} created, {updated} updated')
+        added, removed = result['system_buildings']
+        self.stdout.write(self.style.SUCCESS(
+            f'Registry is loaded, {added} buildings of systems added, {removed} removed'
+        ))
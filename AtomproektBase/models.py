@@ -39,13 +39,17 @@ class SlugBase(models.Model):
 
     def _save_slug(self):
         """It collects all data to produce a slug and saves it"""
+        self.slug = self.get_slug()
+
+    def get_slug(self) -> str:
+        """It produces a slug of fields to slugify, fields should be checked before"""
         slug_list = []
         for field in self.fields_to_slugify:
             attribute = self.__getattribute__(field)
             if isinstance(attribute, models.Model):
                 attribute = attribute.slug
             slug_list.append(attribute)
-        self.slug = '_'.join(map(slugify, slug_list))
+        return '_'.join(map(slugify, slug_list))
 
     def __str__(self):
         return self.slug  # pragma: no cover
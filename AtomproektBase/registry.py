@@ -0,0 +1,273 @@
+"""
+Loader of a KKS registry of projects, buildings and systems. Records of a registry are read one by one from CSV
+or JSON Lines and are written in one transaction by bulk queries as soon as a batch of records of the same type
+is read: existing rows are found by their natural keys (a name of a project, a project and a KKS code of a building,
+a KKS code of a system), changed ones are updated, new ones are created with slugs made for the whole batch,
+and buildings of systems are replaced with the buildings listed in the registry. Only PKs of projects
+and buildings are kept until the end, so memory doesn't depend on a number of systems.
+
+Every record has a 'type' that is 'project', 'building' or 'system' and fields of its model. Buildings and systems
+refer to a project by its name, systems list KKS codes of their buildings separated by ';' in CSV or as a list
+in JSON. A record should follow records of projects and buildings it refers to, or they should exist already.
+"""
+import csv
+import json
+from typing import Callable, Iterable, Iterator, TextIO
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from AtomproektBase import context, versions
+from AtomproektBase.models import Building, Project, System
+
+BATCH_SIZE = 1000
+FORMATS = ('csv', 'jsonl')
+CSV_COLUMNS = [
+    'type', 'project', 'kks', 'name', 'country', 'description', 'stage', 'seismic_category', 'safety_category',
+    'buildings',
+]
+# models and fields of records by types of records, in order they are written in
+RECORD_FIELDS = {
+    'project': (Project, ['name', 'country', 'description', 'stage']),
+    'building': (Building, ['kks', 'name']),
+    'system': (System, ['kks', 'name', 'seismic_category', 'safety_category']),
+}
+
+
+class RegistryError(ValueError):
+    """A registry can't be loaded, a message tells a line with a wrong record"""
+
+
+def read_registry(file: TextIO, file_format: str) -> Iterator[tuple]:
+    """
+    Reads records of a registry one by one.
+
+    :param file: a text file of a registry.
+    :param file_format: 'csv' with CSV_COLUMNS in a header or 'jsonl' with a JSON object in every line.
+    :return: iterator over numbers of lines and dicts of records.
+    """
+    if file_format == 'csv':
+        reader = csv.DictReader(file)
+        for record in reader:
+            yield reader.line_num, record
+        return
+    for number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as error:
+            raise RegistryError(f'Line {number}: {error}')
+        if not isinstance(record, dict):
+            raise RegistryError(f'Line {number}: a record should be an object')
+        yield number, record
+
+
+def clean_record(number: int, record: dict) -> tuple:
+    """
+    Validates a record of a registry by fields of its model.
+
+    :param number: number of a line of the record.
+    :param record: dict of the record.
+    :return: type of the record, its natural key and dict of its values with 'line', and 'project' and 'buildings'
+    for buildings and systems.
+    """
+    record_type = record.get('type')
+    if record_type not in RECORD_FIELDS:
+        raise RegistryError(f'Line {number}: unknown type of a record "{record_type}"')
+    model, fields = RECORD_FIELDS[record_type]
+    values = {'line': number}
+    for field in fields:
+        try:
+            values[field] = model._meta.get_field(field).clean(_get_text(record.get(field)), None)
+        except ValidationError as error:
+            raise RegistryError(f'Line {number}: {field}: {" ".join(error.messages)}')
+    if record_type == 'project':
+        return record_type, values['name'], values
+    values['project'] = _get_text(record.get('project'))
+    if not values['project']:
+        raise RegistryError(f'Line {number}: project: This field cannot be blank.')
+    if record_type == 'building':
+        return record_type, (values['project'], values['kks']), values
+    buildings = record.get('buildings') or []
+    if isinstance(buildings, str):
+        buildings = buildings.split(';')
+    elif not isinstance(buildings, list):
+        raise RegistryError(f'Line {number}: buildings: Expected a list of KKS codes.')
+    values['buildings'] = {_get_text(code) for code in buildings} - {''}
+    return record_type, values['kks'], values
+
+
+def load_registry(records: Iterable[tuple], progress: Callable[[str], None] = None) -> dict:
+    """
+    Loads a registry in one transaction, nothing is changed if some record is wrong.
+
+    :param records: numbers of lines and dicts of records, as returned by read_registry.
+    :param progress: callable that takes messages about written batches.
+    :return: dict of numbers of created and updated rows by types of records, and numbers of added
+    and removed buildings of systems as 'system_buildings'.
+    """
+    loader = _RegistryLoader(progress or (lambda message: None))
+    with transaction.atomic():
+        for number, record in records:
+            loader.add(*clean_record(number, record))
+        loader.flush()
+    # rows are written by bulk queries which send no signals
+    for model in (Project, Building, System):
+        versions.bump_version(model)
+    context.invalidate_projects_tree()
+    return {record_type: tuple(numbers) for record_type, numbers in loader.result.items()}
+
+
+class _RegistryLoader:
+    """Keeps batches of records until they are written and PKs of written projects and buildings"""
+    def __init__(self, progress: Callable[[str], None]):
+        self.progress = progress
+        self.pending = {record_type: {} for record_type in RECORD_FIELDS}
+        self.project_pks = {}
+        self.building_pks = {}
+        self.result = {record_type: [0, 0] for record_type in [*RECORD_FIELDS, 'system_buildings']}
+
+    def add(self, record_type: str, key, values: dict):
+        """Adds a record to a batch of its type, a full batch is written with batches it may refer to"""
+        # a later record replaces an earlier one with the same key
+        self.pending[record_type][key] = values
+        if len(self.pending[record_type]) >= BATCH_SIZE:
+            self.flush(record_type)
+
+    def flush(self, last_type: str = 'system'):
+        """Writes pending batches of all types up to a given one"""
+        for record_type in RECORD_FIELDS:
+            rows, self.pending[record_type] = self.pending[record_type], {}
+            if rows:
+                getattr(self, f'_write_{record_type}s')(rows)
+            if record_type == last_type:
+                break
+
+    def _write_projects(self, rows: dict):
+        self.project_pks.update(self._upsert(
+            Project, {name: _get_fields(values, 'project') for name, values in rows.items()},
+            lambda row: row.name, lambda keys: Project.objects.filter(name__in=keys),
+        ))
+
+    def _write_buildings(self, rows: dict):
+        self._find_projects(rows.values())
+        buildings = {}
+        for values in rows.values():
+            project_pk = self.project_pks[values['project']]
+            buildings[(project_pk, values['kks'])] = {**_get_fields(values, 'building'), 'project_id': project_pk}
+        self.building_pks.update(self._upsert(
+            Building, buildings, lambda row: (row.project_id, row.kks), _find_buildings,
+        ))
+
+    def _write_systems(self, rows: dict):
+        self._find_projects(rows.values())
+        self._find_buildings(rows.values())
+        systems = {kks: {
+            **_get_fields(values, 'system'), 'project_id': self.project_pks[values['project']],
+        } for kks, values in rows.items()}
+        system_pks = self._upsert(
+            System, systems, lambda row: row.kks, lambda keys: System.objects.filter(kks__in=keys),
+        )
+        self._set_system_buildings({
+            system_pks[kks]: {
+                self.building_pks[(self.project_pks[values['project']], code)] for code in values['buildings']
+            } for kks, values in rows.items()
+        })
+
+    def _find_projects(self, rows: Iterable[dict]):
+        """Finds PKs of existing projects that records refer to, all of them should exist"""
+        rows = [values for values in rows if values['project'] not in self.project_pks]
+        if not rows:
+            return
+        self.project_pks.update(Project.objects.filter(
+            name__in={values['project'] for values in rows},
+        ).values_list('name', 'pk'))
+        for values in rows:
+            if values['project'] not in self.project_pks:
+                raise RegistryError(f'Line {values["line"]}: project "{values["project"]}" is not found')
+
+    def _find_buildings(self, rows: Iterable[dict]):
+        """Finds PKs of existing buildings that systems refer to, all of them should exist"""
+        references = [
+            (values['line'], (self.project_pks[values['project']], code))
+            for values in rows for code in values['buildings']
+        ]
+        keys = {key for _, key in references} - set(self.building_pks)
+        if not keys:
+            return
+        for pk, project, kks in _find_buildings(keys).order_by('-pk').values_list('pk', 'project', 'kks'):
+            if (project, kks) in keys:
+                self.building_pks[(project, kks)] = pk
+        for line, key in references:
+            if key not in self.building_pks:
+                raise RegistryError(f'Line {line}: building "{key[1]}" is not found')
+
+    def _upsert(self, model, rows: dict, get_key: Callable, find_rows: Callable) -> dict:
+        """
+        Updates existing rows of a batch and creates missing ones, by three queries.
+
+        :param model: a model with a slug.
+        :param rows: dicts of values of fields by natural keys.
+        :param get_key: callable that returns a natural key of a row.
+        :param find_rows: callable that returns a queryset with existing rows for a list of natural keys.
+        :return: dict of PKs of rows by natural keys.
+        """
+        model()._check_fields_to_slugify()
+        existing = {get_key(row): row for row in find_rows(list(rows))}
+        pks, to_create, to_update = {}, [], []
+        for key, values in rows.items():
+            row = existing.get(key)
+            if row is None:
+                row = model(**values)
+                to_create.append(row)
+            elif any(getattr(row, field) != value for field, value in values.items()) or not row.slug:
+                for field, value in values.items():
+                    setattr(row, field, value)
+                to_update.append(row)
+            else:
+                pks[key] = row.pk
+                continue
+            if not row.slug:
+                row.slug = row.get_slug()
+        model.objects.bulk_create(to_create)
+        if to_update:
+            model.objects.bulk_update(to_update, [*next(iter(rows.values())), 'slug'])
+        pks.update((get_key(row), row.pk) for row in to_create + to_update)
+        numbers = self.result[model._meta.model_name]
+        numbers[0], numbers[1] = numbers[0] + len(to_create), numbers[1] + len(to_update)
+        self.progress(
+            f'{model._meta.verbose_name_plural}: {len(rows)} written, {sum(numbers)} created or updated in total'
+        )
+        return pks
+
+    def _set_system_buildings(self, buildings: dict):
+        """Replaces buildings of a batch of systems, given as sets of PKs of buildings by PKs of systems"""
+        through = System.buildings.through
+        existing = {
+            (system, building): pk for pk, system, building in
+            through.objects.filter(system__in=list(buildings)).values_list('pk', 'system', 'building')
+        }
+        required = {(system, building) for system, building_pks in buildings.items() for building in building_pks}
+        stale = [pk for pair, pk in existing.items() if pair not in required]
+        if stale:
+            through.objects.filter(pk__in=stale).delete()
+        new = [through(system_id=system, building_id=building) for system, building in required - set(existing)]
+        through.objects.bulk_create(new, batch_size=BATCH_SIZE)
+        numbers = self.result['system_buildings']
+        numbers[0], numbers[1] = numbers[0] + len(new), numbers[1] + len(stale)
+
+
+def _get_text(value) -> str:
+    """Returns a value of a record as a stripped string, missing values are empty"""
+    return '' if value is None else str(value).strip()
+
+
+def _get_fields(values: dict, record_type: str) -> dict:
+    """Returns values of fields of a model of a record"""
+    return {field: values[field] for field in RECORD_FIELDS[record_type][1]}
+
+
+def _find_buildings(keys):
+    """Returns existing buildings that may have given projects and KKS codes"""
+    return Building.objects.filter(project__in={project for project, _ in keys}, kks__in={kks for _, kks in keys})
@@ -0,0 +1,25 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from AtomproektBase import models, context, versions
+
+
+@receiver([post_save, post_delete], sender=models.Project)
+@receiver([post_save, post_delete], sender=models.Building)
+def on_navigation_change(sender, **kwargs):
+    """Drops cached navigation tree when a project or a building is changed"""
+    context.invalidate_projects_tree()
+
+
+@receiver([post_save, post_delete], sender=models.Project)
+@receiver([post_save, post_delete], sender=models.Building)
+@receiver([post_save, post_delete], sender=models.System)
+def on_version_change(sender, **kwargs):
+    """Starts a new version of rows of a changed model, so conditional requests to its API get fresh data"""
+    versions.bump_version(sender)
+
+
+@receiver(m2m_changed, sender=models.System.buildings.through)
+def on_system_buildings_change(sender, **kwargs):
+    """Starts a new version of systems when their buildings are changed"""
+    versions.bump_version(models.System)
@@ -0,0 +1,52 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from AtomproektBase import models
+from AtomproektBase.test.test_models import SetUp
+
+
+class QueriesBudgetTestCase(SetUp):
+    """Base for tests that check that API endpoints make a fixed number of queries"""
+
+    def assertQueriesDoNotGrow(self, url: str, add_rows, budget: int):
+        """
+        Requests an endpoint, adds more rows, requests it again and checks that the number of queries
+        has not changed and doesn't exceed the budget.
+
+        :param url: URL of an endpoint.
+        :param add_rows: callable that adds more rows which are returned by the endpoint.
+        :param budget: maximal number of queries the endpoint is allowed to make.
+        """
+        with CaptureQueriesContext(connection) as before:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        add_rows()
+        with CaptureQueriesContext(connection) as after:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(after.captured_queries), len(before.captured_queries), msg=url)
+        self.assertLessEqual(len(after.captured_queries), budget, msg=url)
+
+
+class BaseAPIQueriesTest(QueriesBudgetTestCase):
+    """Tests for numbers of queries of the base API endpoints"""
+
+    def add_rows(self):
+        """Adds some projects, buildings and systems"""
+        for i in range(models.Project.objects.count(), models.Project.objects.count() + 3):
+            project = models.Project.objects.create(name=f'Project {i}', country='Utopia', description='', stage='P')
+            building = models.Building.objects.create(kks=f'9{i}UJA', name='Reactor building', project=project)
+            system = models.System.objects.create(
+                kks=f'9{i}JRT', name='System', project=project, seismic_category='1', safety_category='1')
+            system.buildings.add(building, self.building1_1)
+
+    def test_list_queries(self):
+        """Checks that list endpoints make a fixed number of queries"""
+        cases = [
+            ('/api/v1/projects/', 2),
+            ('/api/v1/buildings/', 2),
+            ('/api/v1/systems/', 2),
+        ]
+        for url, budget in cases:
+            with self.subTest(msg=url):
+                self.assertQueriesDoNotGrow(url, self.add_rows, budget)
@@ -0,0 +1,36 @@
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+
+from AtomproektBase import context, models
+from AtomproektBase.test.test_models import SetUp
+
+
+class ProjectsTreeTest(SetUp):
+    """Tests for a cached navigation tree of projects"""
+    def setUp(self) -> None:
+        super(ProjectsTreeTest, self).setUp()
+        cache.clear()
+
+    def test_tree(self):
+        """Checks that the tree contains projects with their buildings"""
+        tree = context.get_projects_tree()
+        self.assertEqual([project['slug'] for project in tree], [self.project1.slug, self.project2.slug])
+        self.assertEqual([building['kks'] for building in tree[0]['buildings']], ['10UJA', '10UKA'])
+        self.assertEqual(tree[1]['buildings'], [])
+
+    def test_tree_is_cached(self):
+        """Checks that the tree is not queried again until projects or buildings are changed"""
+        context.get_projects_tree()
+        with self.assertNumQueries(0):
+            context.get_projects_tree()
+        models.Building.objects.create(kks='20UJA', name='Reactor building', project=self.project2)
+        self.assertEqual(context.get_projects_tree()[1]['buildings'][0]['kks'], '20UJA')
+
+    @override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+    def test_page_queries(self):
+        """Checks that a page with navigation costs no queries once the tree is cached"""
+        self.client.get(reverse('index'))
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('index'))
+        self.assertContains(response, self.project1.name)
@@ -0,0 +1,116 @@
+import csv
+import io
+import json
+import os
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from AtomproektBase import models, registry
+from AtomproektBase.test.test_models import SetUp
+
+
+def make_registry_csv(systems: int) -> str:
+    """Returns a CSV registry with a new project, its building and a number of systems in both of its buildings"""
+    file = io.StringIO()
+    writer = csv.DictWriter(file, registry.CSV_COLUMNS)
+    writer.writeheader()
+    writer.writerow({
+        'type': 'project', 'name': 'Мегастанция-3', 'country': 'Oz', 'description': 'Emerald NPP', 'stage': 'P',
+    })
+    writer.writerow({'type': 'building', 'project': 'Мегастанция-3', 'kks': '30UJA', 'name': 'Reactor building'})
+    writer.writerow({'type': 'building', 'project': 'Мегастанция-3', 'kks': '30UKA', 'name': 'Auxiliary building'})
+    for i in range(systems):
+        writer.writerow({
+            'type': 'system', 'project': 'Мегастанция-3', 'kks': f'30JRT{i:02}', 'name': f'System {i}',
+            'seismic_category': '1', 'safety_category': 'NA', 'buildings': '30UJA; 30UKA',
+        })
+    return file.getvalue()
+
+
+class RegistryTest(SetUp):
+    """Tests for the loader of a KKS registry"""
+    def load(self, content: str, file_format: str = 'csv') -> dict:
+        return registry.load_registry(registry.read_registry(io.StringIO(content), file_format))
+
+    def test_load(self):
+        """Checks that rows are created with slugs by a number of queries that doesn't depend on a number of rows"""
+        with CaptureQueriesContext(connection) as few:
+            self.assertEqual(self.load(make_registry_csv(2)), {
+                'project': (1, 0), 'building': (2, 0), 'system': (2, 0), 'system_buildings': (4, 0),
+            })
+        models.Project.objects.filter(name='Мегастанция-3').delete()
+        with CaptureQueriesContext(connection) as many:
+            self.assertEqual(self.load(make_registry_csv(20))['system'], (20, 0))
+        self.assertEqual(len(few.captured_queries), len(many.captured_queries))
+        project = models.Project.objects.get(name='Мегастанция-3')
+        self.assertEqual(project.slug, 'megastantsiya-3')
+        system = models.System.objects.get(kks='30JRT05')
+        self.assertEqual((system.slug, system.project, system.safety_category), ('30jrt05', project, 'NA'))
+        self.assertEqual(sorted(system.buildings.values_list('kks', flat=True)), ['30UJA', '30UKA'])
+        self.assertEqual(self.load(make_registry_csv(20))['system'], (0, 0))
+
+    def test_batches(self):
+        """Checks that records are written in batches while they are read, after records they refer to"""
+        messages = []
+        with mock.patch.object(registry, 'BATCH_SIZE', 2):
+            records = registry.read_registry(io.StringIO(make_registry_csv(5)), 'csv')
+            result = registry.load_registry(records, messages.append)
+        self.assertEqual(result['system'], (5, 0))
+        self.assertEqual(result['system_buildings'], (10, 0))
+        self.assertEqual(messages[:3], [
+            'projects: 1 written, 1 created or updated in total',
+            'buildings: 2 written, 2 created or updated in total',
+            'systems: 2 written, 2 created or updated in total',
+        ])
+        self.assertEqual(models.System.objects.get(kks='30JRT04').buildings.count(), 2)
+
+    def test_update(self):
+        """Checks that existing rows are updated and buildings of systems are replaced with listed ones"""
+        records = [
+            {'type': 'system', 'project': self.project1.name, 'kks': '10KAA', 'name': 'Component cooling',
+             'seismic_category': '2', 'safety_category': '2', 'buildings': ['10UKA']},
+            {'type': 'building', 'project': self.project1.name, 'kks': '10UJA', 'name': 'Containment'},
+        ]
+        result = self.load('\n'.join(json.dumps(record) for record in records) + '\n\n', 'jsonl')
+        self.assertEqual(result, {
+            'project': (0, 0), 'building': (0, 1), 'system': (0, 1), 'system_buildings': (0, 1),
+        })
+        self.system1_2.refresh_from_db()
+        self.assertEqual((self.system1_2.name, self.system1_2.slug), ('Component cooling', '10kaa'))
+        self.assertEqual(list(self.system1_2.buildings.all()), [self.building1_2])
+        self.building1_1.refresh_from_db()
+        self.assertEqual(self.building1_1.name, 'Containment')
+
+    def test_errors(self):
+        """Checks that a wrong record is reported with its line and nothing is loaded"""
+        content = make_registry_csv(2).replace('NA', 'X', 1)
+        with self.assertRaisesMessage(registry.RegistryError, 'Line 5: safety_category'):
+            self.load(content)
+        content = make_registry_csv(2).replace('30UKA,Auxiliary', '30UKB,Auxiliary')
+        with self.assertRaisesMessage(registry.RegistryError, 'Line 5: building "30UKA" is not found'):
+            self.load(content)
+        self.assertFalse(models.Project.objects.filter(name='Мегастанция-3').exists())
+        with self.assertRaisesMessage(registry.RegistryError, 'Line 1: unknown type'):
+            self.load('{"type": "unit"}', 'jsonl')
+
+    def test_command(self):
+        """Checks that the command loads a file with a format found by its extension"""
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'registry.csv')
+            with open(path, 'w', encoding='utf-8-sig', newline='') as file:
+                file.write(make_registry_csv(3))
+            output = io.StringIO()
+            call_command('load_kks_registry', path, stdout=output)
+            self.assertIn('system: 3 created, 0 updated', output.getvalue())
+            self.assertIn('systems: 3 written', output.getvalue())
+            output = io.StringIO()
+            call_command('load_kks_registry', path, stdout=output, verbosity=0)
+            self.assertNotIn('written', output.getvalue())
+            with self.assertRaises(CommandError):
+                call_command('load_kks_registry', os.path.join(directory, 'registry.xml'))
+        self.assertEqual(models.System.objects.filter(kks__startswith='30').count(), 3)
@@ -0,0 +1,45 @@
+import hashlib
+import time
+from uuid import uuid4
+
+from django.core.cache import cache
+
+VERSION_KEY = 'atomrest_version_{}'
+
+
+def get_version(model: type) -> tuple:
+    """
+    Returns current version of all rows of a model. A version is changed every time a row of the model is saved
+    or deleted. If a version is lost from cache, a new one is started, so clients just revalidate their data.
+
+    :param model: model class.
+    :return: tuple of a unique version token and a timestamp of the last change.
+    """
+    key = VERSION_KEY.format(model._meta.label_lower)
+    version = cache.get(key)
+    if version is None:
+        version = (uuid4().hex, time.time())
+        if not cache.add(key, version, None):
+            version = cache.get(key, version)
+    return version
+
+
+def bump_version(model: type):
+    """Starts a new version of rows of a model"""
+    cache.set(VERSION_KEY.format(model._meta.label_lower), (uuid4().hex, time.time()), None)
+
+
+def get_validators(version_models: list, *variant) -> tuple:
+    """
+    Computes validators of a response that depends on rows of given models.
+
+    :param version_models: models whose rows the response is built of.
+    :param variant: strings that distinguish different responses built of the same rows, like a path.
+    :return: tuple of a strong ETag and a timestamp of the last modification.
+    """
+    versions = [get_version(model) for model in version_models]
+    digest = hashlib.sha1()
+    for part in [token for token, _ in versions] + list(variant):
+        digest.update(part.encode())
+        digest.update(b'\0')
+    return f'"{digest.hexdigest()}"', int(max(timestamp for _, timestamp in versions))
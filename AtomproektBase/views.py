@@ -1,25 +1,75 @@
+from django.db.models import Prefetch
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from rest_framework import viewsets
 from rest_framework import permissions
 
-from AtomproektBase import serializers, models
+from AtomproektBase import serializers, models, versions
 
 
-class ProjectViewSet(viewsets.ModelViewSet):
+class ConditionalGetMixin:
+    """
+    Mixin for view sets that answers list and retrieve requests with ETag and Last-Modified validators.
+    If a client already has current data, it gets 304 response before anything is queried or serialized.
+    Validators are built of versions of models listed in 'version_models', so all models whose rows get
+    into a response should be listed there.
+    """
+    version_models = []
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(super().list, request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(super().retrieve, request, *args, **kwargs)
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        """
+        Returns 304 response if a client has current data, otherwise calls a handler and adds validators
+        to its response.
+
+        :param handler: a method that builds a full response.
+        :param request: a request.
+        :return: a response.
+        """
+        etag, last_modified = versions.get_validators(
+            self.version_models or [self.queryset.model],
+            request.get_full_path(),
+            request.accepted_media_type,
+        )
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = handler(request, *args, **kwargs)
+        if response.status_code in (200, 304):
+            response['ETag'] = etag
+            response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class ProjectViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """View set for a project model"""
-    queryset = models.Project.objects.all()
+    version_models = [models.Project, models.Building]
+    queryset = models.Project.objects.prefetch_related(
+        Prefetch('buildings', queryset=models.Building.objects.only('pk', 'project')),
+    )
     serializer_class = serializers.ProjectSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 
-class BuildingViewSet(viewsets.ModelViewSet):
+class BuildingViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """View set for a building model"""
-    queryset = models.Building.objects.all()
+    version_models = [models.Building, models.System, models.Building._meta.get_field('model').related_model]
+    queryset = models.Building.objects.select_related('model').prefetch_related(
+        Prefetch('systems', queryset=models.System.objects.only('pk')),
+    )
     serializer_class = serializers.BuildingSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 
-class SystemViewSet(viewsets.ModelViewSet):
+class SystemViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """View set for a system model"""
-    queryset = models.System.objects.all()
+    version_models = [models.System, models.Building]
+    queryset = models.System.objects.prefetch_related(
+        Prefetch('buildings', queryset=models.Building.objects.only('pk')),
+    )
     serializer_class = serializers.SystemSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
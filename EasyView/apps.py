@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class NaviswebConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'EasyView'
+
+    def ready(self):
+        from EasyView import signals  # noqa: F401
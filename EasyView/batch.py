@@ -0,0 +1,206 @@
+"""
+Batch endpoints of view sets. Rows are fetched, created, updated or deleted by one request in one transaction,
+with a number of queries that doesn't depend on a number of rows: related objects of all rows are found
+at once and rows are written by bulk queries.
+"""
+import copy
+from contextlib import contextmanager
+from urllib import parse
+
+from django.core.exceptions import ObjectDoesNotExist, ValidationError as DjangoValidationError
+from django.db import IntegrityError, router, transaction
+from django.db.models.deletion import Collector
+from django.dispatch import Signal
+from django.urls import Resolver404, get_script_prefix, resolve
+from django.utils.encoding import uri_to_iri
+from rest_framework import serializers, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.validators import UniqueValidator
+
+MAX_BATCH_SIZE = 1000
+
+# Sent with a model as a sender, a list of 'rows' after they are written by bulk queries, which send no post_save
+# signals, and a list of 'previous_rows' with values the rows had before an update
+rows_changed = Signal()
+
+
+def get_url_kwargs(url) -> dict:
+    """Returns keyword arguments of a view that an API URL points to, or an empty dict if it points nowhere"""
+    if not isinstance(url, str):
+        return {}
+    path = parse.urlparse(url).path
+    prefix = get_script_prefix()
+    if path.startswith(prefix):
+        path = '/' + path[len(prefix):]
+    try:
+        return resolve(uri_to_iri(parse.unquote(path))).kwargs
+    except Resolver404:
+        return {}
+
+
+def get_row_pk(item):
+    """Returns a PK of a row that is given by its 'pk' or 'url'"""
+    if not isinstance(item, dict):
+        return None
+    return item.get('pk') or get_url_kwargs(item.get('url')).get('pk')
+
+
+@contextmanager
+def batch_transaction():
+    """Runs writes of a batch in a transaction, rows that break uniqueness fail the whole batch"""
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError as error:
+        raise ValidationError({'non_field_errors': [str(error).splitlines()[0]]}) from error
+
+
+class BatchHyperlinkedRelatedField(serializers.HyperlinkedRelatedField):
+    """A hyperlinked related field that takes an object of those found for a whole batch instead of querying it"""
+    def get_object(self, view_name, view_args, view_kwargs):
+        found = getattr(self.root, 'related_objects', {}).get(self.field_name)
+        if found is None:
+            return super(BatchHyperlinkedRelatedField, self).get_object(view_name, view_args, view_kwargs)
+        try:
+            return found[self.get_queryset().model._meta.pk.to_python(view_kwargs[self.lookup_url_kwarg])]
+        except (KeyError, DjangoValidationError):
+            raise ObjectDoesNotExist
+
+
+class BatchListSerializer(serializers.ListSerializer):
+    """
+    A list serializer that validates a batch of rows with one query per related field and saves them
+    by bulk queries. Uniqueness is checked by a database, so a batch that breaks it raises IntegrityError.
+    """
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.related_objects = self.find_related_objects(data)
+            for field in self.child.fields.values():
+                field.validators = [
+                    validator for validator in field.validators if not isinstance(validator, UniqueValidator)
+                ]
+        return super(BatchListSerializer, self).to_internal_value(data)
+
+    def find_related_objects(self, data: list) -> dict:
+        """Finds objects that rows of a batch refer to, by names of related fields and their PKs"""
+        related_objects = {}
+        for name, field in self.child.fields.items():
+            if not isinstance(field, BatchHyperlinkedRelatedField) or field.read_only or field.lookup_field != 'pk':
+                continue
+            pk_field, pks = field.get_queryset().model._meta.pk, set()
+            for item in data:
+                pk = get_url_kwargs(item.get(name) if isinstance(item, dict) else None).get(field.lookup_url_kwarg)
+                try:
+                    pks.add(pk_field.to_python(pk))
+                except DjangoValidationError:
+                    continue
+            pks.discard(None)
+            related_objects[name] = field.get_queryset().in_bulk(pks) if pks else {}
+        return related_objects
+
+    def create(self, validated_data: list) -> list:
+        model = self.child.Meta.model
+        return model.objects.bulk_create([model(**attrs) for attrs in validated_data])
+
+    def update(self, instances: list, validated_data: list) -> list:
+        fields = set()
+        for instance, attrs in zip(instances, validated_data):
+            for name, value in attrs.items():
+                setattr(instance, name, value)
+            fields.update(attrs)
+        if fields:
+            self.child.Meta.model.objects.bulk_update(instances, fields)
+        return instances
+
+
+class BatchMixin:
+    """
+    A mixin for model view sets that adds 'batch' endpoint. GET returns rows with PKs given in 'ids' as '1,2,3'
+    in the same order, POST creates rows of a list, PATCH partially updates rows of a list which are identified
+    by their 'pk' or 'url', DELETE deletes rows with PKs given in 'ids'. Serializers of view sets should use
+    BatchListSerializer and BatchHyperlinkedRelatedField.
+    """
+    @action(detail=False)
+    def batch(self, request):
+        rows = self.get_batch_rows(self.get_batch_pks(request))
+        return Response(self.get_serializer(list(rows.values()), many=True).data)
+
+    @batch.mapping.post
+    def batch_create(self, request):
+        self.check_batch(request.data)
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        with batch_transaction():
+            rows = serializer.save()
+            rows_changed.send(sender=self.queryset.model, rows=rows, previous_rows=[])
+        rows = self.get_batch_rows([row.pk for row in rows])
+        return Response(self.get_serializer(list(rows.values()), many=True).data, status=status.HTTP_201_CREATED)
+
+    @batch.mapping.patch
+    def batch_update(self, request):
+        self.check_batch(request.data)
+        pk_field = serializers.IntegerField(min_value=1)
+        try:
+            pks = [pk_field.run_validation(get_row_pk(item)) for item in request.data]
+        except ValidationError as error:
+            raise ValidationError({'pk': error.detail})
+        if len(set(pks)) < len(pks):
+            raise ValidationError({'pk': ['Rows are repeated.']})
+        with batch_transaction():
+            rows = self.get_batch_rows(pks, for_update=True)
+            instances = [rows[pk] for pk in pks]
+            changed_rows = [copy.copy(instance) for instance in instances]
+            serializer = self.get_serializer(instances, data=request.data, many=True, partial=True)
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+            rows_changed.send(sender=self.queryset.model, rows=instances, previous_rows=changed_rows)
+        rows = self.get_batch_rows(pks)
+        return Response(self.get_serializer(list(rows.values()), many=True).data)
+
+    @batch.mapping.delete
+    def batch_destroy(self, request):
+        pks = self.get_batch_pks(request)
+        with transaction.atomic():
+            rows = self.get_batch_rows(pks, for_update=True)
+            # rows are deleted with related objects they were fetched with, so signals of them need no queries
+            collector = Collector(using=router.db_for_write(self.queryset.model))
+            collector.collect(list(rows.values()))
+            collector.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    def get_batch_pks(self, request) -> list:
+        """Reads PKs of rows from 'ids' query parameter"""
+        field = serializers.ListField(
+            child=serializers.IntegerField(min_value=1), min_length=1, max_length=MAX_BATCH_SIZE,
+        )
+        try:
+            return list(dict.fromkeys(field.run_validation(request.query_params.get('ids', '').split(','))))
+        except ValidationError as error:
+            raise ValidationError({'ids': error.detail})
+
+    def get_batch_rows(self, pks: list, for_update: bool = False) -> dict:
+        """
+        Fetches rows of a batch by one query with all related objects the view set fetches.
+
+        :param pks: PKs of rows.
+        :param for_update: if rows are locked until the end of a transaction, all of them should exist then.
+        :return: dict of rows by their PKs, in order of given PKs.
+        """
+        queryset = self.get_queryset()
+        if for_update:
+            queryset = queryset.select_for_update(of=('self',))
+        rows = queryset.in_bulk(pks)
+        if for_update and len(rows) < len(pks):
+            missing = [str(pk) for pk in pks if pk not in rows]
+            raise ValidationError({'ids': [f'Rows are not found: {", ".join(missing[:20])}']})
+        return {pk: rows[pk] for pk in pks if pk in rows}
+
+    @staticmethod
+    def check_batch(data):
+        """Checks that a body of a request is a list of rows of an allowed size"""
+        if not isinstance(data, list):
+            raise ValidationError({'non_field_errors': ['Expected a list of rows.']})
+        if not 0 < len(data) <= MAX_BATCH_SIZE:
+            raise ValidationError({'non_field_errors': [f'A batch should have from 1 to {MAX_BATCH_SIZE} rows.']})
@@ -0,0 +1,128 @@
+"""
+Content-addressed storage of model files. A file is stored once under a name made of a hash of its contents,
+so uploading the same file again only points a model to the stored one, and everything that is built of
+the file is found by its hash.
+
+A content hash is a hex SHA-256 of concatenated binary SHA-256 digests of 4 MB blocks of a file, like
+Dropbox content hash. Unlike a plain SHA-256, it is found of parts of a file that come in any order,
+as long as they start at bounds of blocks.
+"""
+import hashlib
+import posixpath
+import re
+
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.db import models
+from django.db.models.fields.files import FieldFile
+
+from EasyView import delivery
+
+BLOCK_SIZE = 4 * 1024 * 1024
+BLOBS_DIR = 'models/blobs'
+BLOB_NAME_RE = re.compile(rf'^{BLOBS_DIR}/[0-9a-f]{{2}}/(?P<hash>[0-9a-f]{{64}})(\.\w+)?$')
+
+
+class ContentHasher:
+    """Finds a content hash of data that is given by parts in order"""
+    def __init__(self):
+        self.block_digests = []
+        self._block = hashlib.sha256()
+        self._block_size = 0
+
+    def update(self, data: bytes):
+        data = memoryview(data)
+        while data:
+            part = data[:BLOCK_SIZE - self._block_size]
+            self._block.update(part)
+            self._block_size += len(part)
+            data = data[len(part):]
+            if self._block_size == BLOCK_SIZE:
+                self.block_digests.append(self._block.digest())
+                self._block, self._block_size = hashlib.sha256(), 0
+
+    def get_block_digests(self) -> list:
+        """Returns digests of all blocks, including the last incomplete one"""
+        return self.block_digests + ([self._block.digest()] if self._block_size else [])
+
+    def hexdigest(self) -> str:
+        return get_content_hash(self.get_block_digests())
+
+
+class ContentHashUploadHandler(TemporaryFileUploadHandler):
+    """Upload handler that finds a content hash of a large uploaded file while it is streamed to a disk"""
+    def new_file(self, *args, **kwargs):
+        super(ContentHashUploadHandler, self).new_file(*args, **kwargs)
+        self.hasher = ContentHasher()
+
+    def receive_data_chunk(self, raw_data: bytes, start: int):
+        self.hasher.update(raw_data)
+        return super(ContentHashUploadHandler, self).receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size: int):
+        file = super(ContentHashUploadHandler, self).file_complete(file_size)
+        file.content_hash = self.hasher.hexdigest()
+        return file
+
+
+class ContentAddressedFieldFile(FieldFile):
+    """
+    A file that is saved as a blob named by its content hash. If such a blob is already stored, the file is not
+    sent to the storage again. The hash is taken from 'content_hash' attribute of a file if it was found while
+    the file was received.
+    """
+    def save(self, name: str, content, save: bool = True):
+        content_hash = getattr(content, 'content_hash', None) or hash_file(content)
+        blob_name = get_blob_name(content_hash, name)
+        if self.storage.exists(blob_name):
+            self.name = blob_name
+        else:
+            self.name = self.storage.save(blob_name, content, max_length=self.field.max_length)
+        setattr(self.instance, self.field.attname, self.name)
+        self._committed = True
+        if save:
+            self.instance.save()
+    save.alters_data = True
+
+
+class ContentAddressedFileField(models.FileField):
+    """A file field that keeps one blob per content, files that are uploaded again take no space and time"""
+    attr_class = ContentAddressedFieldFile
+
+
+def get_content_hash(block_digests: list) -> str:
+    """Returns a content hash by binary digests of blocks of a file"""
+    return hashlib.sha256(b''.join(block_digests)).hexdigest()
+
+
+def hash_file(file) -> str:
+    """Reads a file and returns its content hash"""
+    hasher = ContentHasher()
+    for chunk in file.chunks(BLOCK_SIZE) if hasattr(file, 'chunks') else iter(lambda: file.read(BLOCK_SIZE), b''):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def get_blob_name(content_hash: str, file_name: str) -> str:
+    """Returns a name of a blob, an extension of an original file is kept so the blob is sent with a right type"""
+    extension = posixpath.splitext(file_name)[1].lower()
+    return f'{BLOBS_DIR}/{content_hash[:2]}/{content_hash}{extension}'
+
+
+def get_content_key(field_file: FieldFile) -> str:
+    """
+    Returns a key that changes only when contents of a file are changed: a content hash of a blob, or
+    a signature of a file that was stored before files became content-addressed.
+    """
+    match = BLOB_NAME_RE.match(field_file.name)
+    return match.group('hash') if match else delivery.get_file_signature(field_file)
+
+
+def delete_unused_blob(field_file: FieldFile):
+    """Deletes a file with its precompressed variants if no row of its model refers to it anymore"""
+    model = type(field_file.instance)
+    lookup = models.Q()
+    for field in model._meta.get_fields():
+        if isinstance(field, ContentAddressedFileField):
+            lookup |= models.Q(**{field.name: field_file.name})
+    if not model.objects.filter(lookup).exists():
+        delivery.delete_model_file(field_file)
@@ -0,0 +1,80 @@
+"""
+A bundle of everything the viewer needs to open a building: its project, the model and all view points
+of the model with their notes and remarks, in one JSON document. The bundle is built of a fixed number of queries
+and kept in cache under a key made of versions of models it is built of, so it is built again only after
+some of their rows are changed, and bundles of old versions just expire.
+"""
+from django.core.cache import cache
+from django.db.models import Prefetch
+from rest_framework.renderers import JSONRenderer
+from rest_framework.reverse import reverse
+
+from AtomproektBase.models import Building, Project
+from EasyView import models, serializers
+
+# models whose rows get into a bundle
+VERSION_MODELS = [Project, Building, models.Model3D, models.ModelArtefact, models.ViewPoint, models.Note, models.Remark]
+BUNDLE_KEY = 'easyview_building_bundle_{}'
+BUNDLE_TIMEOUT = 24 * 60 * 60
+
+
+def get_building_bundle(project_slug: str, building_slug: str, etag: str, context: dict) -> bytes:
+    """
+    Returns a bundle of a building as JSON. A bundle is built once for every version of its rows.
+
+    :param project_slug: slug of a project of the building.
+    :param building_slug: slug of the building.
+    :param etag: ETag of the bundle that is built of versions of VERSION_MODELS and a URL of the bundle.
+    :param context: context of serializers with a request that absolute URLs are built by.
+    :return: the bundle.
+    :raise Model3D.DoesNotExist: if the building has no model.
+    """
+    key = BUNDLE_KEY.format(etag.strip('"'))
+    bundle = cache.get(key)
+    if bundle is None:
+        model = models.Model3D.objects.select_related('building__project').prefetch_related(
+            Prefetch('artefacts', queryset=models.ModelArtefact.objects.exclude(kind=models.ModelArtefact.TILE).only(
+                'pk', 'model', 'kind', 'level',
+            )),
+            Prefetch('view_points', queryset=models.ViewPoint.objects.select_related('remark').prefetch_related(
+                'notes',
+            )),
+        ).get(building__project__slug=project_slug, building__slug=building_slug)
+        bundle = JSONRenderer().render(build_building_bundle(model, context))
+        cache.set(key, bundle, BUNDLE_TIMEOUT)
+    return bundle
+
+
+def build_building_bundle(model: models.Model3D, context: dict) -> dict:
+    """
+    Serializes a model with its building, project and view points. View points have their notes and remark
+    serialized in place of their URLs, like the viewer keeps them.
+
+    :param model: a model with prefetched artefacts and view points with notes and remarks.
+    :param context: context of serializers.
+    :return: dict with 'project', 'building', 'model' and 'view_points'.
+    """
+    building = model.building
+    project = building.project
+    request = context.get('request')
+    view_points = list(model.view_points.all())
+    serialized_view_points = serializers.ViewPointSerializer(view_points, many=True, context=context).data
+    for view_point, data in zip(view_points, serialized_view_points):
+        data['notes'] = serializers.NoteSerializer(view_point.notes.all(), many=True, context=context).data
+        remark = getattr(view_point, 'remark', None)
+        data['remark'] = serializers.RemarkSerializer(remark, context=context).data if remark else None
+    return {
+        'project': {
+            'url': reverse('project-detail', args=[project.pk], request=request),
+            'name': project.name,
+            'slug': project.slug,
+        },
+        'building': {
+            'url': reverse('building-detail', args=[building.pk], request=request),
+            'kks': building.kks,
+            'name': building.name,
+            'slug': building.slug,
+        },
+        'model': serializers.Model3DSerializer(model, context=context).data,
+        'view_points': serialized_view_points,
+    }
@@ -0,0 +1,143 @@
+"""
+Bounding volume hierarchies of meshes of an optimized glTF file, packed as three-mesh-bvh serializes them,
+so the viewer deserializes them instead of building.
+
+All numbers are little-endian. A file consists of:
+- header: 4 bytes of magic b'EVBH', then uint32 format version and uint32 number of primitives P;
+- P primitives, each one is:
+  - uint32 index of a mesh, uint32 index of a primitive in the mesh, uint32 number of indices I,
+    uint32 size of an index in bytes S (2 or 4) and uint32 number of nodes N;
+  - N nodes of 32 bytes in depth-first order, the left child follows its parent: float32[6] bounds
+    (min x, y, z, max x, y, z), then a leaf has uint32 offset of its first triangle, uint16 number of triangles
+    and uint16 0xFFFF, and an inner node has uint32 position of its right child in 4-byte words and uint32 split axis;
+  - uint(S * 8)[I] indices of triangles reordered so that triangles of every leaf go in a row, padded to 4 bytes.
+Positions are taken as they are stored in the file, before dequantization.
+"""
+import logging
+import posixpath
+import struct
+import time
+
+import numpy as np
+from django.core.files.base import ContentFile
+
+from EasyView import delivery
+from EasyView.gltf import Gltf, TRIANGLES
+from EasyView.models import Model3D, ModelArtefact
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'EVBH'
+VERSION = 1
+HEADER = struct.Struct('<4sII')
+PRIMITIVE_HEADER = struct.Struct('<IIIII')
+NODE = np.dtype([('bounds', '<f4', 6), ('offset', '<u4'), ('count', '<u2'), ('flag', '<u2')])
+INNER_NODE = np.dtype([('bounds', '<f4', 6), ('right', '<u4'), ('axis', '<u4')])
+LEAF_FLAG = 0xFFFF
+MAX_LEAF_TRIANGLES = 10
+# a number of triangles of a leaf is uint16, so deeper nodes are split until they fit into it
+MAX_LEAF_SIZE = 0xFFFF
+MAX_DEPTH = 40
+
+
+def build_tree(positions: np.ndarray, indices: np.ndarray) -> tuple:
+    """
+    Builds a bounding volume hierarchy of triangles. Nodes are split at the center of bounds of centroids
+    of their triangles along the longest axis, as 'CENTER' strategy of three-mesh-bvh does. Triangles which
+    centroids can't be split at the center are split in halves by their order along the axis.
+
+    :param positions: positions of vertices.
+    :param indices: flat array of indices of triangles.
+    :return: tuple of packed nodes and reordered indices.
+    """
+    corners = positions[indices.reshape(-1, 3)]
+    lowers, uppers = corners.min(axis=1), corners.max(axis=1)
+    centroids = corners.mean(axis=1)
+    order = np.arange(len(corners))
+    nodes = np.zeros(max(2 * len(corners) - 1, 1), NODE)
+    inner_nodes = nodes.view(INNER_NODE)
+    count = 0
+    # a stack of offset, count, depth of a node and a position of its parent if it is a right child
+    stack = [(0, len(corners), 0, None)]
+    while stack:
+        offset, size, depth, parent = stack.pop()
+        position, count = count, count + 1
+        if parent is not None:
+            inner_nodes[parent]['right'] = position * NODE.itemsize // 4
+        selection = order[offset:offset + size]
+        nodes[position]['bounds'] = [*lowers[selection].min(axis=0), *uppers[selection].max(axis=0)]
+        split = None
+        if size > MAX_LEAF_TRIANGLES and (depth < MAX_DEPTH or size > MAX_LEAF_SIZE):
+            centroid_lower, centroid_upper = centroids[selection].min(axis=0), centroids[selection].max(axis=0)
+            axis = int(np.argmax(centroid_upper - centroid_lower))
+            left = centroids[selection, axis] < (centroid_lower[axis] + centroid_upper[axis]) / 2
+            left_size = int(left.sum())
+            if 0 < left_size < size:
+                order[offset:offset + size] = np.concatenate([selection[left], selection[~left]])
+            else:
+                order[offset:offset + size] = selection[np.argsort(centroids[selection, axis], kind='stable')]
+                left_size = size // 2
+            split = axis, left_size
+        if split is None:
+            nodes[position]['offset'] = offset
+            nodes[position]['count'] = size
+            nodes[position]['flag'] = LEAF_FLAG
+            continue
+        axis, left_size = split
+        inner_nodes[position]['axis'] = axis
+        stack.append((offset + left_size, size - left_size, depth + 1, position))
+        stack.append((offset, left_size, depth + 1, None))
+    return nodes[:count], indices.reshape(-1, 3)[order].ravel()
+
+
+def pack_bvh(source: Gltf) -> bytes:
+    """Builds and packs hierarchies of all indexed triangle primitives of a parsed glTF file"""
+    parts, primitives = [], 0
+    for mesh_index, mesh in enumerate(source.document.get('meshes', [])):
+        for primitive_index, primitive in enumerate(mesh['primitives']):
+            if primitive.get('mode', TRIANGLES) != TRIANGLES or 'indices' not in primitive:
+                continue
+            positions = source.read_accessor(primitive['attributes']['POSITION']).astype(np.float64)
+            indices = source.read_accessor(primitive['indices'])[:, 0]
+            if not len(indices):
+                continue
+            nodes, indices = build_tree(positions, indices)
+            index_bytes = indices.astype(indices.dtype.newbyteorder('<')).tobytes()
+            parts += [
+                PRIMITIVE_HEADER.pack(mesh_index, primitive_index, len(indices), indices.itemsize, len(nodes)),
+                nodes.tobytes(),
+                index_bytes + b'\0' * (-len(index_bytes) % 4),
+            ]
+            primitives += 1
+    return HEADER.pack(MAGIC, VERSION, primitives) + b''.join(parts)
+
+
+def build_bvh(model: Model3D):
+    """
+    Builds hierarchies of the most detailed optimized level of a model and saves them next to it.
+    They are rebuilt when the level is rebuilt, which happens only when contents of a glTF file are changed.
+
+    :param model: a model with optimized levels of detail.
+    :return: built artefact, or None if nothing was built.
+    """
+    lod = model.artefacts.filter(kind=ModelArtefact.LOD, level=0).first()
+    if lod is None:
+        return None
+    source_signature = delivery.get_file_signature(lod.file)
+    artefact = model.artefacts.filter(kind=ModelArtefact.BVH).first()
+    if artefact and artefact.source == source_signature:
+        return None
+    started = time.perf_counter()
+    with lod.file.open('rb') as file:
+        data = pack_bvh(Gltf.load(file.read()))
+    if artefact:
+        delivery.delete_model_file(artefact.file)
+    else:
+        artefact = ModelArtefact(model=model, kind=ModelArtefact.BVH)
+    artefact.source = source_signature
+    stem = posixpath.splitext(posixpath.basename(lod.file.name))[0]
+    artefact.file.save(f'{stem}.bvh', ContentFile(data), save=False)
+    artefact.save()
+    delivery.compress_model_file(artefact.file)
+    logger.debug(f'BVH of {lod.file.name} is built in {time.perf_counter() - started:.2f} s')
+    return artefact
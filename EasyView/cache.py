@@ -0,0 +1,40 @@
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from EasyView import models
+
+REMARKS_SIDEBAR_KEY = 'easyview_remarks_sidebar_{}'
+
+
+def get_remarks_sidebar(model: models.Model3D) -> dict:
+    """
+    Returns rendered lists of remarks of a model grouped by specialities. Lists are rendered once and kept
+    in cache until a remark or a view point of the model is changed.
+
+    :param model: a model which remarks should be rendered.
+    :return: dict with specialities as keys and rendered HTML (or an empty string if there are no remarks) as values.
+    """
+    key = REMARKS_SIDEBAR_KEY.format(model.pk)
+    sidebar = cache.get(key)
+    if sidebar is None:
+        sidebar = render_remarks_sidebar(model)
+        cache.set(key, sidebar, None)
+    return {speciality: mark_safe(html) for speciality, html in sidebar.items()}
+
+
+def render_remarks_sidebar(model: models.Model3D) -> dict:
+    """Renders lists of remarks of a model grouped by specialities, all remarks are fetched by one query"""
+    remarks_by_speciality = {speciality: [] for speciality, _ in models.Remark.SPECIALITIES}
+    remarks = models.Remark.objects.filter(view_point__model=model).only('view_point', 'description', 'speciality')
+    for remark in remarks:
+        remarks_by_speciality.setdefault(remark.speciality, []).append(remark)
+    return {
+        speciality: render_to_string('remarks_list.html', {'remarks': remarks}) if remarks else ''
+        for speciality, remarks in remarks_by_speciality.items()
+    }
+
+
+def invalidate_remarks_sidebar(model_pk: int):
+    """Drops cached lists of remarks of a model"""
+    cache.delete(REMARKS_SIDEBAR_KEY.format(model_pk))
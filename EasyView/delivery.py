@@ -0,0 +1,237 @@
+import hashlib
+import re
+import zlib
+from tempfile import TemporaryFile
+
+import brotli
+from django.core.files import File
+from django.db.models.fields.files import FieldFile
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+from AtomREST.settings import MODEL_FILES_SENDFILE, MODEL_FILES_ACCEL_LOCATION
+
+# Precompressed variants in order of preference, they are stored next to an original file
+ENCODINGS = (
+    ('br', '.br'),
+    ('gzip', '.gz'),
+)
+CONTENT_TYPES = {
+    'glb': 'model/gltf-binary',
+    'gltf': 'model/gltf+json',
+    'json': 'application/json',
+}
+CHUNK_SIZE = 1024 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class GzipCompressor:
+    """Streaming compressor that writes gzip format, has the same interface as brotli.Compressor"""
+    def __init__(self):
+        self._compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+
+    def process(self, data: bytes) -> bytes:
+        return self._compressor.compress(data)
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+COMPRESSORS = {
+    'br': brotli.Compressor,
+    'gzip': GzipCompressor,
+}
+
+
+class Representation:
+    """A file that is sent to a client, either an original one or its precompressed variant"""
+    def __init__(self, storage, name: str, encoding: str = None):
+        self.storage = storage
+        self.name = name
+        self.encoding = encoding
+        self.size = storage.size(name)
+        self.last_modified = int(storage.get_modified_time(name).timestamp())
+        self.etag = f'"{hashlib.sha1(get_signature(storage, name).encode()).hexdigest()}"'
+
+
+def get_signature(storage, name: str) -> str:
+    """Returns a string that changes every time a file is replaced"""
+    return f'{name}:{storage.size(name)}:{storage.get_modified_time(name).timestamp()}'
+
+
+def get_file_signature(field_file: FieldFile) -> str:
+    """Returns a string that changes every time a file of a model is replaced"""
+    return get_signature(field_file.storage, field_file.name)
+
+
+def get_variant_name(name: str, suffix: str) -> str:
+    """Returns a name of a precompressed variant of a file"""
+    return name + suffix
+
+
+def is_variant_fresh(storage, name: str, variant_name: str) -> bool:
+    """Checks that a precompressed variant exists and is not older than its original file"""
+    return storage.exists(variant_name) and storage.get_modified_time(variant_name) >= storage.get_modified_time(name)
+
+
+def delete_model_file(field_file: FieldFile):
+    """Deletes a file with its precompressed variants"""
+    storage, name = field_file.storage, field_file.name
+    for _, suffix in ENCODINGS:
+        if storage.exists(get_variant_name(name, suffix)):
+            storage.delete(get_variant_name(name, suffix))
+    field_file.delete(save=False)
+
+
+def compress_model_file(field_file: FieldFile) -> list:
+    """
+    Saves precompressed variants of a file next to it. Variants that are up to date are not rebuilt,
+    and variants that turn out bigger than the original file are not kept.
+
+    :param field_file: a file of a model.
+    :return: list of names of saved variants.
+    """
+    storage, name = field_file.storage, field_file.name
+    saved = []
+    for encoding, suffix in ENCODINGS:
+        variant_name = get_variant_name(name, suffix)
+        if is_variant_fresh(storage, name, variant_name):
+            continue
+        if storage.exists(variant_name):
+            storage.delete(variant_name)
+        compressor = COMPRESSORS[encoding]()
+        with TemporaryFile() as tf, storage.open(name, 'rb') as original:
+            for chunk in iter(lambda: original.read(CHUNK_SIZE), b''):
+                tf.write(compressor.process(chunk))
+            tf.write(compressor.finish())
+            if tf.tell() >= storage.size(name):
+                continue
+            tf.seek(0)
+            saved.append(storage.save(variant_name, File(tf)))
+    return saved
+
+
+def get_representation(field_file: FieldFile, accept_encoding: str) -> Representation:
+    """Chooses the smallest fresh variant of a file that a client accepts"""
+    storage, name = field_file.storage, field_file.name
+    accepted = {coding.split(';')[0].strip() for coding in accept_encoding.split(',')}
+    for encoding, suffix in ENCODINGS:
+        variant_name = get_variant_name(name, suffix)
+        if encoding in accepted and is_variant_fresh(storage, name, variant_name):
+            return Representation(storage, variant_name, encoding)
+    return Representation(storage, name)
+
+
+def get_range(request: HttpRequest, representation: Representation):
+    """
+    Parses a Range header of a request. Only single byte ranges are supported, for other ranges
+    the whole file is sent, as RFC 7233 allows.
+
+    :return: tuple of start and end (inclusive) positions, None if the whole file should be sent,
+    or False if the range can't be satisfied.
+    """
+    match = RANGE_RE.match(request.META.get('HTTP_RANGE', '').strip())
+    if not match or request.method != 'GET' or not _if_range_passes(request, representation):
+        return None
+    start, end, size = match.group(1), match.group(2), representation.size
+    if not start:
+        if not end or int(end) == 0:
+            return False
+        return max(size - int(end), 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        return False
+    return start, end
+
+
+def _if_range_passes(request: HttpRequest, representation: Representation) -> bool:
+    """Checks that a client has the same file that its ranges are requested for"""
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith('"'):
+        return if_range == representation.etag
+    return parse_http_date_safe(if_range) == representation.last_modified
+
+
+def _read(file, start: int, length: int):
+    """Yields a part of a file by chunks and closes it"""
+    try:
+        file.seek(start)
+        while length > 0:
+            chunk = file.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+def serve_model_file(request: HttpRequest, field_file: FieldFile, as_attachment: bool = False,
+                     file_name: str = None) -> HttpResponse:
+    """
+    Returns a response with a file of a model. Supports conditional requests, single byte ranges and
+    precompressed variants. If MODEL_FILES_SENDFILE is set, the file is sent by a reverse proxy.
+
+    :param request: a request.
+    :param field_file: a file of a model.
+    :param as_attachment: whether a browser should save the file instead of opening it.
+    :param file_name: a name a browser saves the file with, by default it is a name of the file in a storage.
+    :return: a response.
+    """
+    representation = get_representation(field_file, request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    response = get_conditional_response(
+        request, etag=representation.etag, last_modified=representation.last_modified,
+    )
+    if response is None:
+        if MODEL_FILES_SENDFILE:
+            # a proxy sends the file and processes ranges by itself
+            response = HttpResponse()
+            response[MODEL_FILES_SENDFILE] = _get_sendfile_location(representation)
+        else:
+            response = _stream(request, representation)
+    response['ETag'] = representation.etag
+    response['Last-Modified'] = http_date(representation.last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    patch_vary_headers(response, ['Accept-Encoding'])
+    if response.status_code in (200, 206):
+        extension = field_file.name.rsplit('.', 1)[-1].lower()
+        response['Content-Type'] = CONTENT_TYPES.get(extension, 'application/octet-stream')
+        if representation.encoding:
+            response['Content-Encoding'] = representation.encoding
+        if as_attachment:
+            file_name = file_name or field_file.name.rsplit('/', 1)[-1]
+            response['Content-Disposition'] = f'attachment; filename="{file_name}"'
+    return response
+
+
+def _stream(request: HttpRequest, representation: Representation) -> HttpResponse:
+    """Returns a response that streams the whole file or a requested range of it"""
+    size = representation.size
+    byte_range = get_range(request, representation)
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1
+    if request.method == 'HEAD':
+        response = HttpResponse()
+    else:
+        file = representation.storage.open(representation.name, 'rb')
+        response = StreamingHttpResponse(_read(file, start, length))
+    if byte_range:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = length
+    return response
+
+
+def _get_sendfile_location(representation: Representation) -> str:
+    """Returns a value of a header that tells a proxy which file to send"""
+    if MODEL_FILES_SENDFILE.lower() == 'x-accel-redirect':
+        return MODEL_FILES_ACCEL_LOCATION + representation.name
+    return representation.storage.path(representation.name)
@@ -0,0 +1,78 @@
+"""
+Compact binary feed of view points' camera states for the viewer.
+
+All numbers are little-endian. The feed consists of:
+- header: 4 bytes of magic b'EVVP', then uint32 format version, uint32 number of view points N and
+  uint32 number of floats per view point (CAMERA_STRIDE);
+- int64[N] primary keys of view points, the i-th pk belongs to the i-th camera state;
+- float32[N * CAMERA_STRIDE] camera states: position (3), quaternion (4), fov, distance to target and
+  clip constants (6), NaN stands for null values and values of arrays with wrong lengths;
+- uint8[N] clip constants statuses, i-th bit is a status of i-th clipping plane, malformed statuses are zeros.
+"""
+import struct
+
+import numpy as np
+
+from django.core.cache import cache
+
+from EasyView import models
+
+MAGIC = b'EVVP'
+VERSION = 1
+CAMERA_STRIDE = 15
+HEADER = struct.Struct('<4sIII')
+VIEW_POINTS_FEED_KEY = 'easyview_view_points_feed_{}'
+
+
+def get_view_points_feed(model: models.Model3D) -> bytes:
+    """
+    Returns binary feed of all view points of a model. The feed is packed once and kept in cache until
+    view points of the model are changed.
+
+    :param model: a model which view points should be packed.
+    :return: the feed.
+    """
+    key = VIEW_POINTS_FEED_KEY.format(model.pk)
+    feed = cache.get(key)
+    if feed is None:
+        feed = pack_view_points(model)
+        cache.set(key, feed, None)
+    return feed
+
+
+def pack_view_points(model: models.Model3D) -> bytes:
+    """Packs all view points of a model, ordered by pk, into binary feed. View points are fetched by one query"""
+    rows = list(
+        models.ViewPoint.objects.filter(model=model).order_by('pk').values_list(
+            'pk', 'position', 'quaternion', 'fov', 'distance_to_target', 'clip_constants_status', 'clip_constants',
+        )
+    )
+    count = len(rows)
+    pks = np.array([row[0] for row in rows], dtype='<i8')
+    cameras = np.full((count, CAMERA_STRIDE), np.nan, dtype='<f4')
+    statuses = np.zeros((count, 6), dtype=bool)
+    if count:
+        _, positions, quaternions, fovs, distances, clip_statuses, clip_constants = zip(*rows)
+        # None becomes NaN or False
+        cameras[:, 0:3] = np.array([_fit(position, 3) for position in positions], dtype=float)
+        cameras[:, 3:7] = np.array([_fit(quaternion, 4) for quaternion in quaternions], dtype=float)
+        cameras[:, 7] = np.array(fovs, dtype=float)
+        cameras[:, 8] = np.array(distances, dtype=float)
+        cameras[:, 9:15] = np.array([_fit(constants, 6) for constants in clip_constants], dtype=float)
+        statuses[:] = np.array([_fit(clip_status, 6) for clip_status in clip_statuses], dtype=bool)
+    status_bits = (statuses.astype(np.uint8) << np.arange(6, dtype=np.uint8)).sum(axis=1, dtype=np.uint8)
+    header = HEADER.pack(MAGIC, VERSION, count, CAMERA_STRIDE)
+    return b''.join((header, pks.tobytes(), cameras.tobytes(), status_bits.tobytes()))
+
+
+def _fit(values, size: int) -> list:
+    """
+    Returns values of an array of a view point, or Nones if the array is missing or has a wrong length,
+    so one malformed row doesn't break the feed of the whole model
+    """
+    return values if values is not None and len(values) == size else [None] * size
+
+
+def invalidate_view_points_feed(model_pk: int):
+    """Drops cached binary feed of a model"""
+    cache.delete(VIEW_POINTS_FEED_KEY.format(model_pk))
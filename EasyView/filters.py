@@ -0,0 +1,50 @@
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+
+
+class QueryParamsFilterMixin:
+    """
+    A mixin for view sets that filters their querysets by query parameters.
+    Filters are described by 'filter_fields' - a dict with query parameters as keys and tuples of a lookup and
+    a serializer field that validates a value of the parameter as values.
+    """
+    filter_fields = {}
+
+    def get_queryset(self):
+        queryset = super(QueryParamsFilterMixin, self).get_queryset()
+        lookups = {}
+        for param, (lookup, field) in self.filter_fields.items():
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+            try:
+                lookups[lookup] = field.to_internal_value(value)
+            except ValidationError as error:
+                raise ValidationError({param: error.detail})
+        return queryset.filter(**lookups)
+
+
+def pk_filter(lookup: str) -> tuple:
+    """Describes a filter by a primary key of a related object"""
+    return lookup, serializers.IntegerField(min_value=1)
+
+
+def choice_filter(lookup: str, choices: list) -> tuple:
+    """Describes a filter by a field with choices"""
+    return lookup, serializers.ChoiceField(choices=choices)
+
+
+def datetime_range_filters(param: str, lookup: str) -> dict:
+    """Describes two filters '<param>_after' and '<param>_before' by a datetime range, both ends are included"""
+    return {
+        f'{param}_after': (f'{lookup}__gte', serializers.DateTimeField()),
+        f'{param}_before': (f'{lookup}__lte', serializers.DateTimeField()),
+    }
+
+
+def date_range_filters(param: str, lookup: str) -> dict:
+    """Describes two filters '<param>_after' and '<param>_before' by a date range, both ends are included"""
+    return {
+        f'{param}_after': (f'{lookup}__gte', serializers.DateField()),
+        f'{param}_before': (f'{lookup}__lte', serializers.DateField()),
+    }
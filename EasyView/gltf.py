@@ -0,0 +1,256 @@
+import base64
+import json
+import struct
+
+import numpy as np
+
+GLB_MAGIC = b'glTF'
+GLB_HEADER = struct.Struct('<4sII')
+CHUNK_HEADER = struct.Struct('<II')
+JSON_CHUNK = 0x4E4F534A
+BIN_CHUNK = 0x004E4942
+
+ARRAY_BUFFER = 34962
+ELEMENT_ARRAY_BUFFER = 34963
+TRIANGLES = 4
+
+COMPONENT_TYPES = {
+    5120: np.int8,
+    5121: np.uint8,
+    5122: np.int16,
+    5123: np.uint16,
+    5125: np.uint32,
+    5126: np.float32,
+}
+COMPONENT_CODES = {np.dtype(dtype): code for code, dtype in COMPONENT_TYPES.items()}
+TYPE_SIZES = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4, 'MAT2': 4, 'MAT3': 9, 'MAT4': 16}
+SIZE_TYPES = {1: 'SCALAR', 2: 'VEC2', 3: 'VEC3', 4: 'VEC4', 16: 'MAT4'}
+# Extensions that keep geometry in a way this module can't read
+UNSUPPORTED_EXTENSIONS = ('KHR_draco_mesh_compression', 'EXT_meshopt_compression', 'EXT_mesh_gpu_instancing')
+
+
+class Gltf:
+    """A parsed glTF 2.0 file: its JSON document and contents of its buffers"""
+    def __init__(self, document: dict, buffers: list):
+        self.document = document
+        self.buffers = buffers
+
+    @classmethod
+    def load(cls, data: bytes, open_resource=None):
+        """
+        Parses a .glb or a .gltf file.
+
+        :param data: contents of a file.
+        :param open_resource: function that returns contents of an external buffer by its relative URI.
+        :return: parsed file.
+        """
+        binary_chunk = None
+        if data[:4] == GLB_MAGIC:
+            _, _, length = GLB_HEADER.unpack_from(data)
+            offset, chunks = GLB_HEADER.size, {}
+            while offset < length:
+                chunk_length, chunk_type = CHUNK_HEADER.unpack_from(data, offset)
+                offset += CHUNK_HEADER.size
+                chunks.setdefault(chunk_type, data[offset:offset + chunk_length])
+                offset += chunk_length
+            document = json.loads(chunks[JSON_CHUNK])
+            binary_chunk = chunks.get(BIN_CHUNK)
+        else:
+            document = json.loads(data)
+        unsupported = set(document.get('extensionsUsed', [])) & set(UNSUPPORTED_EXTENSIONS)
+        if unsupported:
+            raise ValueError(f'glTF extensions are not supported: {", ".join(sorted(unsupported))}')
+        buffers = []
+        for buffer in document.get('buffers', []):
+            uri = buffer.get('uri')
+            if uri is None:
+                buffers.append(binary_chunk)
+            elif uri.startswith('data:'):
+                buffers.append(base64.b64decode(uri.split(',', 1)[1]))
+            else:
+                buffers.append(open_resource(uri))
+        return cls(document, buffers)
+
+    def read_accessor(self, index: int) -> np.ndarray:
+        """
+        Reads an accessor into a two-dimensional array, one row for every element.
+        Normalized integers are converted to floats, other values keep their component type.
+        """
+        accessor = self.document['accessors'][index]
+        dtype = np.dtype(COMPONENT_TYPES[accessor['componentType']])
+        size, count = TYPE_SIZES[accessor['type']], accessor['count']
+        if 'bufferView' in accessor:
+            view = self.document['bufferViews'][accessor['bufferView']]
+            offset = view.get('byteOffset', 0) + accessor.get('byteOffset', 0)
+            stride = view.get('byteStride') or dtype.itemsize * size
+            values = np.ndarray(
+                (count, size), dtype, self.buffers[view['buffer']], offset, (stride, dtype.itemsize),
+            ).copy()
+        else:
+            values = np.zeros((count, size), dtype)
+        if 'sparse' in accessor:
+            sparse = accessor['sparse']
+            indices = self._read_sparse_part(sparse['indices'], sparse['count'], 1, sparse['indices']['componentType'])
+            values[indices[:, 0]] = self._read_sparse_part(
+                sparse['values'], sparse['count'], size, accessor['componentType'],
+            )
+        if accessor.get('normalized'):
+            values = normalized_to_float(values)
+        return values
+
+    def _read_sparse_part(self, part: dict, count: int, size: int, component_type: int) -> np.ndarray:
+        """Reads indices or values of a sparse accessor"""
+        dtype = np.dtype(COMPONENT_TYPES[component_type])
+        view = self.document['bufferViews'][part['bufferView']]
+        offset = view.get('byteOffset', 0) + part.get('byteOffset', 0)
+        return np.frombuffer(self.buffers[view['buffer']], dtype, count * size, offset).reshape(count, size)
+
+    def read_view(self, index: int) -> bytes:
+        """Returns raw bytes of a buffer view"""
+        view = self.document['bufferViews'][index]
+        offset = view.get('byteOffset', 0)
+        return self.buffers[view['buffer']][offset:offset + view['byteLength']]
+
+    def iterate_scene_nodes(self):
+        """
+        Walks through nodes of the default scene.
+
+        :return: generator of tuples of a node index and its world matrix.
+        """
+        nodes = self.document.get('nodes', [])
+        scenes = self.document.get('scenes')
+        if scenes:
+            roots = scenes[self.document.get('scene', 0)].get('nodes', [])
+        else:
+            children = {child for node in nodes for child in node.get('children', [])}
+            roots = [index for index in range(len(nodes)) if index not in children]
+        stack = [(index, np.identity(4)) for index in reversed(roots)]
+        while stack:
+            index, parent_matrix = stack.pop()
+            matrix = parent_matrix @ get_node_matrix(nodes[index])
+            yield index, matrix
+            stack.extend((child, matrix) for child in reversed(nodes[index].get('children', [])))
+
+
+class GltfWriter:
+    """Collects binary data of a new glTF file with one buffer and packs it into a .glb file"""
+    def __init__(self, document: dict):
+        self.document = document
+        self.document['buffers'] = [{'byteLength': 0}]
+        self.document['bufferViews'] = []
+        self.document['accessors'] = []
+        self._chunks = []
+        self._length = 0
+
+    def add_view(self, data: bytes, target: int = None, stride: int = None) -> int:
+        """Adds a buffer view aligned to 4 bytes and returns its index"""
+        padding = -self._length % 4
+        self._chunks.append(b'\0' * padding + data)
+        view = {'buffer': 0, 'byteOffset': self._length + padding, 'byteLength': len(data)}
+        if target:
+            view['target'] = target
+        if stride:
+            view['byteStride'] = stride
+        self._length += padding + len(data)
+        self.document['bufferViews'].append(view)
+        return len(self.document['bufferViews']) - 1
+
+    def add_accessor(self, values: np.ndarray, target: int = None, normalized: bool = False,
+                     bounds: bool = False, accessor_type: str = None) -> int:
+        """
+        Adds an accessor with its own buffer view and returns its index. Rows of vertex attributes
+        are padded to 4 bytes, as the specification requires.
+
+        :param values: array with one row for every element, or a flat array of scalars.
+        :param target: target of the buffer view, if it holds vertex attributes or indices.
+        :param normalized: whether integer values are normalized.
+        :param bounds: whether min and max values should be written.
+        :param accessor_type: type of elements, by default it is found by the number of columns.
+        :return: index of the accessor.
+        """
+        values = values.reshape(len(values), -1)
+        size = values.shape[1]
+        data, stride = values, None
+        if target == ARRAY_BUFFER and values.itemsize * size % 4:
+            padded_size = size + (-values.itemsize * size % 4) // values.itemsize
+            data = np.zeros((len(values), padded_size), values.dtype)
+            data[:, :size] = values
+            stride = data.itemsize * padded_size
+        accessor = {
+            'bufferView': self.add_view(np.ascontiguousarray(data).tobytes(), target, stride),
+            'componentType': COMPONENT_CODES[values.dtype],
+            'count': len(values),
+            'type': accessor_type or SIZE_TYPES[size],
+        }
+        if normalized:
+            accessor['normalized'] = True
+        if bounds and len(values):
+            accessor['min'] = values.min(axis=0).tolist()
+            accessor['max'] = values.max(axis=0).tolist()
+        self.document['accessors'].append(accessor)
+        return len(self.document['accessors']) - 1
+
+    def copy_accessor(self, gltf: Gltf, index: int, target: int = None) -> int:
+        """Copies an accessor of another file as it is, sparse accessors become dense"""
+        accessor = gltf.document['accessors'][index]
+        values = gltf.read_accessor(index)
+        if accessor.get('normalized'):
+            values = float_to_normalized(values, np.dtype(COMPONENT_TYPES[accessor['componentType']]))
+        new_index = self.add_accessor(
+            values, target, accessor.get('normalized', False), 'min' in accessor, accessor['type'],
+        )
+        for key in ('min', 'max', 'name'):
+            if key in accessor:
+                self.document['accessors'][new_index][key] = accessor[key]
+        return new_index
+
+    def to_glb(self) -> bytes:
+        """Packs the document and the buffer into a .glb file"""
+        self.document['buffers'][0]['byteLength'] = self._length
+        json_chunk = json.dumps(self.document, separators=(',', ':')).encode()
+        json_chunk += b' ' * (-len(json_chunk) % 4)
+        binary_chunk = b''.join(self._chunks)
+        binary_chunk += b'\0' * (-len(binary_chunk) % 4)
+        length = GLB_HEADER.size + 2 * CHUNK_HEADER.size + len(json_chunk) + len(binary_chunk)
+        return b''.join([
+            GLB_HEADER.pack(GLB_MAGIC, 2, length),
+            CHUNK_HEADER.pack(len(json_chunk), JSON_CHUNK),
+            json_chunk,
+            CHUNK_HEADER.pack(len(binary_chunk), BIN_CHUNK),
+            binary_chunk,
+        ])
+
+
+def get_node_matrix(node: dict) -> np.ndarray:
+    """Returns a local transformation matrix of a node"""
+    if 'matrix' in node:
+        return np.array(node['matrix'], dtype=np.float64).reshape(4, 4).T
+    x, y, z, w = node.get('rotation', [0, 0, 0, 1])
+    rotation = np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+    matrix = np.identity(4)
+    matrix[:3, :3] = rotation * np.array(node.get('scale', [1, 1, 1]))
+    matrix[:3, 3] = node.get('translation', [0, 0, 0])
+    return matrix
+
+
+def transform_points(matrix: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Applies a transformation matrix to points"""
+    return points @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+def normalized_to_float(values: np.ndarray) -> np.ndarray:
+    """Converts normalized integers to floats as the specification defines"""
+    if values.dtype.kind == 'f':
+        return values
+    maximum = np.iinfo(values.dtype).max
+    return np.maximum(values.astype(np.float32) / maximum, -1.0)
+
+
+def float_to_normalized(values: np.ndarray, dtype: np.dtype) -> np.ndarray:
+    """Converts floats to normalized integers of a given type"""
+    info = np.iinfo(dtype)
+    return np.clip(np.round(values * info.max), info.min, info.max).astype(dtype)
@@ -1,39 +1,134 @@
 import os
+import copy
 import uuid
 import math
+import time
+import logging
+from functools import lru_cache
 import defusedxml.ElementTree as ET
-from xml.etree.ElementTree import Element
+from typing import Callable, Iterator, Optional
+from xml.etree.ElementTree import Element, ElementTree, SubElement, tostring
 
-from django.core.exceptions import ObjectDoesNotExist
+from django.contrib.postgres.fields import ArrayField
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
 from django.core.files.uploadedfile import InMemoryUploadedFile
 
+from django.db import transaction
+from django.db.models import F, Func, Value, BigIntegerField
+
 from AtomREST.settings import BASE_DIR
-from EasyView.models import ViewPoint, Model3D, Remark
+from AtomproektBase.versions import bump_version
+from EasyView.models import ViewPoint, Model3D
+from EasyView.feed import invalidate_view_points_feed
+
+logger = logging.getLogger(__name__)
+
+EXPORT_TEMPLATES_DIR = os.path.join(BASE_DIR, 'EasyView', 'static', 'EasyView', 'export')
+EXPORT_ENCODING = 'us-ascii'
+EXPORT_CHUNK_SIZE = 500
+IMPORT_BATCH_SIZE = 500
+
+
+@lru_cache(maxsize=None)
+def _load_export_template(name: str) -> Element:
+    """
+    Parses an export template once and keeps its root in memory. Callers must never change the returned element,
+    they should work with a deep copy of it instead.
+
+    :param name: file name of a template inside the export templates directory.
+    :return: root element of the parsed template.
+    """
+    return ET.parse(os.path.join(EXPORT_TEMPLATES_DIR, name)).getroot()
 
 
-def create_exported_viewpoints_xml(pk_list: list) -> ET:
+def get_viewpoint_template() -> Element:
+    """Returns a fresh copy of Navisworks view point template"""
+    return copy.deepcopy(_load_export_template('view_point_template.xml'))
+
+
+def get_general_template() -> ElementTree:
+    """Returns a fresh copy of Navisworks exchange file template"""
+    return ElementTree(copy.deepcopy(_load_export_template('general_template.xml')))
+
+
+def create_exported_viewpoints_xml(pk_list: list) -> ElementTree:
     """
     Function that makes XML files with view points, which can be used in Autodesk Navisworks.
+    All requested view points are fetched by a single query together with their remarks.
 
     :param pk_list: list that contents primary keys of saved view points that should be exported.
-    Keys can be str or int.
+    Keys can be str or int, every view point is exported once.
 
     :return: Element Tree with inserted view points
     """
-    path_to_template = os.path.join(BASE_DIR, 'EasyView', 'static', 'EasyView', 'export', 'general_template.xml')
-    general_template = ET.parse(path_to_template)
+    pk_list = list(dict.fromkeys(int(pk) for pk in pk_list))
+    general_template = get_general_template()
     exchange = general_template.getroot()
     viewpoints = exchange[0]
+    view_points_by_pk = ViewPoint.objects.select_related('remark').in_bulk(pk_list)
+    started = time.perf_counter()
+    exported = 0
     for pk in pk_list:
-        try:
-            view_point = ViewPoint.objects.get(pk=int(pk))
-            view = export_viewpoint_to_nw(view_point)
-            viewpoints.append(view)
-        except ObjectDoesNotExist:
-            pass
+        view_point = view_points_by_pk.get(pk)
+        if view_point is not None:
+            viewpoints.append(export_viewpoint_to_nw(view_point))
+            exported += 1
+    if exported:
+        logger.debug(
+            'Exported %d view points, %.3f ms per view point',
+            exported, (time.perf_counter() - started) * 1000 / exported,
+        )
     return general_template
 
 
+def stream_exported_viewpoints_xml(pk_list: list, progress_callback: Optional[Callable] = None) -> Iterator[bytes]:
+    """
+    Generator that yields the same XML as create_exported_viewpoints_xml does, but piece by piece: a header of the
+    exchange file, then every view point as soon as it is built, then a footer. View points are read through
+    a server-side cursor, so memory usage doesn't depend on how many of them are exported.
+
+    :param pk_list: list that contents primary keys of saved view points that should be exported.
+    Keys can be str or int, every view point is exported once.
+    :param progress_callback: optional function that is called with a number of exported view points after
+    every chunk of them.
+
+    :return: iterator over encoded chunks of the XML file.
+    """
+    pk_list = [int(pk) for pk in pk_list]
+    header, footer = _get_exchange_header_and_footer()
+    yield header
+    view_points = ViewPoint.objects.filter(pk__in=pk_list).select_related('remark').annotate(
+        # keeps the order in which view points were requested
+        requested_position=Func(
+            Value(pk_list, output_field=ArrayField(BigIntegerField())), F('pk'),
+            function='array_position', output_field=BigIntegerField(),
+        ),
+    ).order_by('requested_position')
+    exported = 0
+    for view_point in view_points.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        yield tostring(export_viewpoint_to_nw(view_point), encoding=EXPORT_ENCODING)
+        exported += 1
+        if progress_callback and not exported % EXPORT_CHUNK_SIZE:
+            progress_callback(exported)
+    if progress_callback:
+        progress_callback(exported)
+    yield footer
+
+
+@lru_cache(maxsize=None)
+def _get_exchange_header_and_footer() -> tuple:
+    """
+    Splits serialized exchange file template into a part that goes before view points and a part after them.
+
+    :return: tuple with encoded header and footer.
+    """
+    exchange = get_general_template().getroot()
+    splitter = SubElement(exchange[0], 'splitter')
+    encoded_splitter = tostring(splitter, encoding=EXPORT_ENCODING)
+    header, footer = tostring(exchange, encoding=EXPORT_ENCODING).split(encoded_splitter)
+    return header, footer
+
+
 def export_viewpoint_to_nw(view_point: ViewPoint) -> Element:
     """
     Represents current view point as a NavisWorks view point XML structure
@@ -42,10 +137,7 @@ def export_viewpoint_to_nw(view_point: ViewPoint) -> Element:
     :return: XML Element instance with inserted view point
     """
 
-    path_to_viewpoint_template = os.path.join(
-        BASE_DIR, 'EasyView', 'static', 'EasyView', 'export', 'view_point_template.xml')
-    viewpoint_template = ET.parse(path_to_viewpoint_template)
-    view = viewpoint_template.getroot()
+    view = get_viewpoint_template()
     # View point - fov, position and rotation
     camera = view[0][0]
     pos3f = camera[0][0]
@@ -58,9 +150,10 @@ def export_viewpoint_to_nw(view_point: ViewPoint) -> Element:
     description = view_point.description
     if not view_point.description:
         description = f'Точка обзора {view_point.pk}'
-    related_remark = Remark.objects.filter(view_point=view_point)
-    if related_remark:
+    try:
         description = view_point.remark.description
+    except ObjectDoesNotExist:
+        pass
     view_attributes = (
         ('guid', str(uuid.uuid4())),
         ('name', description),
@@ -99,25 +192,72 @@ def export_viewpoint_to_nw(view_point: ViewPoint) -> Element:
     return view
 
 
-def import_navisworks_viewpoints(xml_file: InMemoryUploadedFile, model_pk: int) -> list:
+def import_navisworks_viewpoints(
+        xml_file: InMemoryUploadedFile,
+        model_pk: int,
+        batch_size: int = IMPORT_BATCH_SIZE,
+        progress_callback: Optional[Callable] = None) -> list:
     """
     The function parses an uploaded file with Navisworks view points and tries to save them.
+    The file is parsed incrementally, every view element is dropped as soon as it is converted, and view points are
+    inserted by batches inside one transaction, so either all of them are saved or none.
     :param xml_file: an XML file with viewpoints, opened to read.
     :param model_pk: PK of a model the viewpoints should be saved to.
+    :param batch_size: how many view points are inserted by one query.
+    :param progress_callback: optional function that is called with a number of saved view points after every batch.
     :return: list of successfully saved viewpoints' PKs.
     """
+    model = Model3D.objects.get(pk=model_pk)
     viewpoints_pks_list = []
-    with xml_file.open('r') as xml:  # ValueError
-        viewpoints_tree = ET.parse(xml)  # ParseError
-        view_points = viewpoints_tree.getroot()[0]  # IndexError
-        for view_point in view_points:
+    batch = []
+    with transaction.atomic(), xml_file.open('r') as xml:  # ValueError
+        for view_point in iterate_navisworks_views(xml):  # ParseError, IndexError
             viewpoint_object = import_viewpoint(view_point)  # can throw a lot of things
-            viewpoint_object.model = Model3D.objects.get(pk=model_pk)
-            viewpoint_object.save()
-            viewpoints_pks_list.append(viewpoint_object.pk)
+            viewpoint_object.model = model
+            batch.append(viewpoint_object)
+            if len(batch) >= batch_size:
+                viewpoints_pks_list.extend(_save_viewpoints(batch))
+                batch = []
+                if progress_callback:
+                    progress_callback(len(viewpoints_pks_list))
+        viewpoints_pks_list.extend(_save_viewpoints(batch))
+        if progress_callback:
+            progress_callback(len(viewpoints_pks_list))
+    # bulk inserts don't send signals, so cached data of the model is dropped here
+    invalidate_view_points_feed(model.pk)
+    bump_version(ViewPoint)
     return viewpoints_pks_list
 
 
+def _save_viewpoints(viewpoints: list) -> list:
+    """Inserts given view points by one query and returns their PKs"""
+    return [viewpoint_object.pk for viewpoint_object in ViewPoint.objects.bulk_create(viewpoints)]
+
+
+def iterate_navisworks_views(xml) -> Iterator[Element]:
+    """
+    Generator that parses Navisworks exchange file incrementally and yields every view element of the first
+    child of the root (that is <viewpoints>) once it is parsed completely. A yielded element is removed from
+    the tree after it is processed, so the tree never grows.
+    :param xml: an XML file with viewpoints, opened to read.
+    :return: iterator over view elements.
+    """
+    depth = 0
+    view_points = None
+    for event, element in ET.iterparse(xml, events=('start', 'end')):
+        if event == 'start':
+            depth += 1
+            if depth == 2 and view_points is None:
+                view_points = element
+            continue
+        depth -= 1
+        if depth == 2 and view_points is not None and element in view_points:
+            yield element
+            view_points.remove(element)
+    if view_points is None:
+        raise IndexError('There are no view points in a file')
+
+
 def import_viewpoint(view_point: Element) -> ViewPoint:
     """
     The function tries to parse single view point off given element
@@ -151,4 +291,12 @@ def import_viewpoint(view_point: Element) -> ViewPoint:
         clip_constants_status=clip_constants_status,
         clip_constants=clip_constants,
     )
+    # view points are saved by bulk inserts which don't validate lengths of arrays
+    for field in ViewPoint.ARRAY_FIELDS:
+        value = getattr(viewpoint_object, field)
+        try:
+            if value is not None:
+                ViewPoint._meta.get_field(field).run_validators(value)
+        except ValidationError as error:
+            raise ValueError(f'{field}: {" ".join(error.messages)}')
     return viewpoint_object
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from EasyView import remark_counters
+
+
+class Command(BaseCommand):
+    """Counts all remarks again and replaces counters of remarks that statistics of remarks are summed up of"""
+    help = 'Rebuilds counters of remarks by models, specialities, statuses and deadlines'
+
+    def handle(self, *args, **options):
+        count = remark_counters.rebuild_counters()
+        self.stdout.write(self.style.SUCCESS(f'{count} counters of remarks are rebuilt'))
@@ -0,0 +1,25 @@
+# Generated by Django 3.2.2 on 2026-10-17 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EasyView', '0011_alter_viewpoint_fov'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['-creation_time', '-id'], name='EasyView_no_creatio_72f5bc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='remark',
+            index=models.Index(fields=['-creation_time', '-id'], name='EasyView_re_creatio_7ff0e8_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='viewpoint',
+            index=models.Index(fields=['-creation_time', '-id'], name='EasyView_vi_creatio_46257e_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.2 on 2026-10-17 14:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EasyView', '0012_creation_time_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=models.Index(fields=['view_point', '-creation_time', '-id'], name='EasyView_no_view_po_9b40f1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='remark',
+            index=models.Index(fields=['speciality', 'status', 'deadline'], name='EasyView_re_special_3b1b79_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='remark',
+            index=models.Index(fields=['status', 'deadline'], name='EasyView_re_status_495b4a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='remark',
+            index=models.Index(fields=['deadline'], name='EasyView_re_deadlin_5c39a4_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='viewpoint',
+            index=models.Index(fields=['model', '-creation_time', '-id'], name='EasyView_vi_model_i_0cad51_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.2 on 2026-10-17 14:22
+
+import EasyView.spatial
+import django.contrib.postgres.indexes
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EasyView', '0013_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='note',
+            index=django.contrib.postgres.indexes.GistIndex(EasyView.spatial.PlanPoint('position'), name='easyview_note_plan_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='viewpoint',
+            index=django.contrib.postgres.indexes.GistIndex(EasyView.spatial.PlanPoint('position'), name='easyview_viewpoint_plan_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 3.2.2 on 2026-10-17 14:32
+
+import EasyView.models
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EasyView', '0014_position_plan_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelArtefact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('lod', 'Уровень детализации')], max_length=10)),
+                ('level', models.PositiveSmallIntegerField(default=0)),
+                ('file', models.FileField(upload_to=EasyView.models.get_artefact_upload_path)),
+                ('source', models.CharField(max_length=255)),
+                ('creation_time', models.DateTimeField(auto_now_add=True)),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='artefacts', to='EasyView.model3d')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='modelartefact',
+            constraint=models.UniqueConstraint(fields=('model', 'kind', 'level'), name='easyview_unique_model_artefact'),
+        ),
+    ]
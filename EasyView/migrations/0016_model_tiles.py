@@ -0,0 +1,24 @@
+# Generated by Django 3.2.2 on 2026-10-17 14:34
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EasyView', '0015_model_artefacts'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modelartefact',
+            name='bounds',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), blank=True, null=True, size=6),
+        ),
+        migrations.AlterField(
+            model_name='modelartefact',
+            name='kind',
+            field=models.CharField(choices=[('lod', 'Уровень детализации'), ('tileset', 'Индекс тайлов'), ('tile', 'Тайл')], max_length=10),
+        ),
+    ]
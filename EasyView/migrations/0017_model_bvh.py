@@ -0,0 +1,23 @@
+# Generated by Django 3.2.2 on 2026-10-17 14:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EasyView', '0016_model_tiles'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='model3d',
+            name='last_updated',
+            field=models.DateTimeField(auto_now=True, verbose_name='Время последнего обновления'),
+        ),
+        migrations.AlterField(
+            model_name='modelartefact',
+            name='kind',
+            field=models.CharField(choices=[('lod', 'Уровень детализации'), ('tileset', 'Индекс тайлов'), ('tile', 'Тайл'), ('bvh', 'Иерархия ограничивающих объёмов')], max_length=10),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.2 on 2026-10-17 14:44
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EasyView', '0017_model_bvh'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('kind', models.CharField(choices=[('gltf', 'gltf'), ('nwd', 'nwd')], max_length=4)),
+                ('file_name', models.CharField(max_length=255)),
+                ('size', models.PositiveBigIntegerField()),
+                ('chunk_size', models.PositiveIntegerField()),
+                ('checksum', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('uploading', 'Загружается'), ('completed', 'Загружен')], default='uploading', max_length=10)),
+                ('creation_time', models.DateTimeField(auto_now_add=True)),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='uploads', to='EasyView.model3d')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ModelUploadChunk',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('checksum', models.CharField(max_length=64)),
+                ('upload', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='chunks', to='EasyView.modelupload')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='modeluploadchunk',
+            constraint=models.UniqueConstraint(fields=('upload', 'number'), name='easyview_unique_upload_chunk'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 3.2.2 on 2026-10-17 14:46
+
+import EasyView.blobs
+import django.contrib.postgres.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EasyView', '0018_model_uploads'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='modeluploadchunk',
+            name='blocks',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.CharField(max_length=64), default=list, size=None),
+        ),
+        migrations.AlterField(
+            model_name='model3d',
+            name='gltf',
+            field=EasyView.blobs.ContentAddressedFileField(blank=True, null=True, upload_to='', verbose_name='Модель здания (формат .gltf или .glb)'),
+        ),
+        migrations.AlterField(
+            model_name='model3d',
+            name='nwd',
+            field=EasyView.blobs.ContentAddressedFileField(blank=True, null=True, upload_to='', verbose_name='Модель здания (формат .nwd)'),
+        ),
+    ]
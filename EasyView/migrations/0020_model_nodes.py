@@ -0,0 +1,37 @@
+# Generated by Django 3.2.2 on 2026-10-17 14:50
+
+import django.contrib.postgres.fields
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EasyView', '0019_content_addressed_files'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelNode',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('index', models.PositiveIntegerField()),
+                ('parent', models.PositiveIntegerField(blank=True, null=True)),
+                ('name', models.CharField(blank=True, max_length=255)),
+                ('kks', models.CharField(blank=True, max_length=50)),
+                ('extras', models.JSONField(blank=True, null=True)),
+                ('bounds', django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), blank=True, null=True, size=6)),
+                ('source', models.CharField(max_length=255)),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nodes', to='EasyView.model3d')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='modelnode',
+            index=models.Index(fields=['model', 'kks'], name='easyview_node_kks_idx', opclasses=['int8_ops', 'varchar_pattern_ops']),
+        ),
+        migrations.AddConstraint(
+            model_name='modelnode',
+            constraint=models.UniqueConstraint(fields=('model', 'index'), name='easyview_unique_model_node'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.2 on 2026-10-17 15:01
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EasyView', '0020_model_nodes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RemarkCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('speciality', models.CharField(max_length=11)),
+                ('status', models.CharField(max_length=11)),
+                ('deadline', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+                ('model', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='remark_counters', to='EasyView.model3d')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='remarkcounter',
+            constraint=models.UniqueConstraint(fields=('model', 'speciality', 'status', 'deadline'), name='easyview_unique_remark_counter'),
+        ),
+    ]
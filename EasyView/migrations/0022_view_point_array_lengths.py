@@ -0,0 +1,35 @@
+# Generated by Django 3.2.2 on 2026-10-17 15:37
+
+import django.contrib.postgres.fields
+import django.contrib.postgres.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('EasyView', '0021_remark_counters'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='viewpoint',
+            name='clip_constants',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), blank=True, null=True, size=6, validators=[django.contrib.postgres.validators.ArrayMinLengthValidator(6)]),
+        ),
+        migrations.AlterField(
+            model_name='viewpoint',
+            name='clip_constants_status',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.BooleanField(), blank=True, default=[False, False, False, False, False, False], size=6, validators=[django.contrib.postgres.validators.ArrayMinLengthValidator(6)]),
+        ),
+        migrations.AlterField(
+            model_name='viewpoint',
+            name='position',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), size=3, validators=[django.contrib.postgres.validators.ArrayMinLengthValidator(3)]),
+        ),
+        migrations.AlterField(
+            model_name='viewpoint',
+            name='quaternion',
+            field=django.contrib.postgres.fields.ArrayField(base_field=models.FloatField(), size=4, validators=[django.contrib.postgres.validators.ArrayMinLengthValidator(4)]),
+        ),
+    ]
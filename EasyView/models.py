@@ -1,15 +1,21 @@
-from django.db import models
+import uuid
+
+from django.db import models, router, transaction
 from django.urls import reverse
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.contrib.postgres.fields import ArrayField
+from django.contrib.postgres.validators import ArrayMinLengthValidator
+from django.contrib.postgres.indexes import GistIndex
 
 from AtomREST.settings import CURRENT_URL
 from AtomproektBase import models as base_models
+from EasyView.blobs import ContentAddressedFileField
+from EasyView.spatial import PlanPoint
 
 
 # Model
 def get_upload_path(instance, filename):
-    """Returns uploading path for a file here"""
+    """Returns uploading path of files of models before they became content-addressed, old migrations refer to it"""
     return f'models/{instance.building.slug}/{filename}'
 
 
@@ -21,44 +27,168 @@ class Model3D(models.Model):
         verbose_name='Здание',
         on_delete=models.CASCADE,
         related_name='model')
-    nwd = models.FileField(
+    nwd = ContentAddressedFileField(
         verbose_name='Модель здания (формат .nwd)',
-        upload_to=get_upload_path,
         blank=True,
         null=True,
     )
-    gltf = models.FileField(
+    gltf = ContentAddressedFileField(
         verbose_name='Модель здания (формат .gltf или .glb)',
-        upload_to=get_upload_path,
         blank=True,
         null=True,
     )
-    last_updated = models.DateTimeField(auto_now_add=True, verbose_name='Время последнего обновления')
+    last_updated = models.DateTimeField(auto_now=True, verbose_name='Время последнего обновления')
+
+    FILE_FIELDS = ('gltf', 'nwd')
 
     def __str__(self):
         return f'Model of {self.building} building'  # pragma: no cover
 
+    def get_file_url(self, kind: str):
+        """Returns URL of a view that delivers a file of the model, or None if there is no such file"""
+        if getattr(self, kind):
+            return reverse('model_file', kwargs={'pk': self.pk, 'kind': kind})
+
+
+def get_artefact_upload_path(instance, filename):
+    """Returns uploading path for a file derived from a model, it is kept next to files of the model"""
+    return f'models/{instance.model.building.slug}/{filename}'
+
+
+class ModelArtefact(models.Model):
+    """A file that is built of a glTF file of a model, like a level of detail, a spatial tile or a BVH"""
+    LOD = 'lod'
+    TILESET = 'tileset'
+    TILE = 'tile'
+    BVH = 'bvh'
+    KINDS = [
+        (LOD, 'Уровень детализации'),
+        (TILESET, 'Индекс тайлов'),
+        (TILE, 'Тайл'),
+        (BVH, 'Иерархия ограничивающих объёмов'),
+    ]
+
+    model = models.ForeignKey(Model3D, on_delete=models.CASCADE, related_name='artefacts')
+    kind = models.CharField(max_length=10, choices=KINDS)
+    level = models.PositiveSmallIntegerField(default=0)  # level of detail or number of a tile
+    file = models.FileField(upload_to=get_artefact_upload_path)
+    source = models.CharField(max_length=255)  # signature of a file the artefact was built of
+    bounds = ArrayField(  # min x, min y, min z, max x, max y, max z in glTF coordinates
+        models.FloatField(), size=6, blank=True, null=True
+    )
+    creation_time = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'kind', 'level'], name='easyview_unique_model_artefact'),
+        ]
+
+    def get_file_url(self):
+        """Returns URL of a view that delivers the file"""
+        return reverse('model_artefact', kwargs={'pk': self.pk})
+
+
+class ModelNode(models.Model):
+    """
+    A node of a scene of a glTF file of a model. Nodes are indexed by KKS codes they are named with,
+    so geometry of a system is found without loading the file.
+    """
+    model = models.ForeignKey(Model3D, on_delete=models.CASCADE, related_name='nodes')
+    index = models.PositiveIntegerField()  # index of the node in the glTF file
+    parent = models.PositiveIntegerField(blank=True, null=True)  # index of a parent node
+    name = models.CharField(max_length=255, blank=True)
+    kks = models.CharField(max_length=50, blank=True)  # code that is found in a name or extras of the node
+    extras = models.JSONField(blank=True, null=True)
+    bounds = ArrayField(  # min x, min y, min z, max x, max y, max z of the node with children in glTF coordinates
+        models.FloatField(), size=6, blank=True, null=True
+    )
+    source = models.CharField(max_length=255)  # content key of a file the node was taken from
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['model', 'index'], name='easyview_unique_model_node'),
+        ]
+        indexes = [
+            # codes are searched by prefixes
+            models.Index(
+                fields=['model', 'kks'], name='easyview_node_kks_idx', opclasses=['int8_ops', 'varchar_pattern_ops'],
+            ),
+        ]
+
+
+class ModelUpload(models.Model):
+    """A session of a chunked upload of a file of a model, chunks are kept on a local disk until it is finished"""
+    UPLOADING = 'uploading'
+    COMPLETED = 'completed'
+    STATUSES = [
+        (UPLOADING, 'Загружается'),
+        (COMPLETED, 'Загружен'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    model = models.ForeignKey(Model3D, on_delete=models.CASCADE, related_name='uploads')
+    kind = models.CharField(max_length=4, choices=[(kind, kind) for kind in Model3D.FILE_FIELDS])
+    file_name = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    # hex SHA-256 of concatenated binary SHA-256 digests of all chunks in order
+    checksum = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUSES, default=UPLOADING)
+    creation_time = models.DateTimeField(auto_now_add=True)
+
+    @property
+    def chunks_count(self) -> int:
+        return max(-(-self.size // self.chunk_size), 1)
+
+    def get_chunk_size(self, number: int) -> int:
+        """Returns an expected size of a chunk, only the last one may be smaller than others"""
+        return min(self.chunk_size, self.size - number * self.chunk_size)
+
+
+class ModelUploadChunk(models.Model):
+    """A received chunk of a chunked upload"""
+    upload = models.ForeignKey(ModelUpload, on_delete=models.CASCADE, related_name='chunks')
+    number = models.PositiveIntegerField()
+    checksum = models.CharField(max_length=64)  # hex SHA-256 of the chunk
+    # hex digests of blocks of the chunk, a content hash of the file is found of them
+    blocks = ArrayField(models.CharField(max_length=64), default=list)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['upload', 'number'], name='easyview_unique_upload_chunk'),
+        ]
+
 
 class ViewPoint(models.Model):
     """A model to describe a viewpoint inside a building model"""
+    ARRAY_FIELDS = ('position', 'quaternion', 'clip_constants_status', 'clip_constants')
+
     model = models.ForeignKey(Model3D, on_delete=models.CASCADE, related_name='view_points')
     description = models.TextField(blank=True, null=True)
-    position = ArrayField(models.FloatField(), size=3)  # x, y, z
-    quaternion = ArrayField(models.FloatField(), size=4)  # x, y, z, w
+    # sizes of arrays limit only their maximum lengths, so minimum ones are validated too
+    position = ArrayField(models.FloatField(), size=3, validators=[ArrayMinLengthValidator(3)])  # x, y, z
+    quaternion = ArrayField(models.FloatField(), size=4, validators=[ArrayMinLengthValidator(4)])  # x, y, z, w
     fov = models.FloatField(
         validators=[MinValueValidator(0.1), MaxValueValidator(179)],
         default=60.0,
         blank=True
     )  # FOV angle
     distance_to_target = models.FloatField(blank=True, null=True)
-    clip_constants_status = ArrayField(models.BooleanField(), size=6, blank=True, default=[False] * 6)
+    clip_constants_status = ArrayField(
+        models.BooleanField(), size=6, blank=True, default=[False] * 6, validators=[ArrayMinLengthValidator(6)],
+    )
     clip_constants = ArrayField(  # x, x negative, y, y negative, z, z negative
-        models.FloatField(), size=6, blank=True, null=True
+        models.FloatField(), size=6, blank=True, null=True, validators=[ArrayMinLengthValidator(6)],
     )
     creation_time = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['-creation_time']
+        indexes = [
+            models.Index(fields=['-creation_time', '-id']),
+            models.Index(fields=['model', '-creation_time', '-id']),
+            GistIndex(PlanPoint('position'), name='easyview_viewpoint_plan_idx'),
+        ]
 
     def get_absolute_url(self):
         return CURRENT_URL + reverse(
@@ -83,6 +213,11 @@ class Note(models.Model):
 
     class Meta:
         ordering = ['-creation_time']
+        indexes = [
+            models.Index(fields=['-creation_time', '-id']),
+            models.Index(fields=['view_point', '-creation_time', '-id']),
+            GistIndex(PlanPoint('position'), name='easyview_note_plan_idx'),
+        ]
 
 
 class Remark(models.Model):
@@ -111,3 +246,33 @@ class Remark(models.Model):
 
     class Meta:
         ordering = ['-creation_time']
+        indexes = [
+            models.Index(fields=['-creation_time', '-id']),
+            models.Index(fields=['speciality', 'status', 'deadline']),
+            models.Index(fields=['status', 'deadline']),
+            models.Index(fields=['deadline']),
+        ]
+
+    def save(self, *args, **kwargs):
+        # counters of remarks are changed by signals of the save, so they are saved in the same transaction
+        with transaction.atomic(using=kwargs.get('using') or router.db_for_write(Remark, instance=self)):
+            super(Remark, self).save(*args, **kwargs)
+
+
+class RemarkCounter(models.Model):
+    """
+    Number of remarks to view points of a model with the same speciality, status and deadline. Counters are changed
+    together with remarks, so statistics of remarks are summed up of them instead of scanning all remarks.
+    """
+    model = models.ForeignKey(Model3D, on_delete=models.CASCADE, related_name='remark_counters')
+    speciality = models.CharField(max_length=11)
+    status = models.CharField(max_length=11)
+    deadline = models.DateField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['model', 'speciality', 'status', 'deadline'], name='easyview_unique_remark_counter',
+            ),
+        ]
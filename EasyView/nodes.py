@@ -0,0 +1,142 @@
+import logging
+import re
+import time
+
+import numpy as np
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Length
+
+from AtomproektBase.models import System
+from EasyView import blobs
+from EasyView.gltf import Gltf, transform_points
+from EasyView.models import Model3D, ModelNode
+from EasyView.optimization import load_model_gltf
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 1000
+# Keys of extras of a node that Navisworks and other exporters put a KKS code into
+KKS_EXTRAS_KEYS = ('kks', 'kks_code', 'kks-code', 'code')
+KKS_RE = re.compile(r'[0-9A-Z]+')
+
+
+def get_node_kks(name: str, extras) -> str:
+    """
+    Finds a KKS code of a node: either a value of a known key of its extras or a beginning of its name.
+    Codes are normalized, spaces and a leading '=' sign are dropped.
+    """
+    code = ''
+    if isinstance(extras, dict):
+        code = next((str(value) for key, value in extras.items() if key.lower() in KKS_EXTRAS_KEYS and value), '')
+    code = re.sub(r'\s+', '', code or name or '').upper().lstrip('=')
+    match = KKS_RE.match(code)
+    return match.group()[:ModelNode._meta.get_field('kks').max_length] if match else ''
+
+
+def get_mesh_bounds(source: Gltf, mesh: dict, matrix: np.ndarray):
+    """Returns world bounds of a mesh as an array of min and max corners, or None if it has no positions"""
+    corners = []
+    for primitive in mesh['primitives']:
+        index = primitive['attributes'].get('POSITION')
+        if index is None:
+            continue
+        accessor = source.document['accessors'][index]
+        if 'min' in accessor and 'max' in accessor and not accessor.get('normalized') and 'sparse' not in accessor:
+            # all corners of a box are transformed, so a rotated box is still inside bounds
+            points = np.array(np.meshgrid(*zip(accessor['min'], accessor['max'])), dtype=np.float64).reshape(3, -1).T
+        else:
+            points = source.read_accessor(index).astype(np.float64)
+        if len(points):
+            corners.append(transform_points(matrix, points))
+    if not corners:
+        return None
+    corners = np.concatenate(corners)
+    return np.array([corners.min(axis=0), corners.max(axis=0)])
+
+
+def extract_nodes(source: Gltf) -> list:
+    """
+    Collects nodes of the default scene of a parsed glTF file with their names, extras, KKS codes and bounds.
+    Bounds of a node include bounds of all its children.
+
+    :param source: a parsed glTF file.
+    :return: list of dicts with fields of ModelNode, parents go before their children.
+    """
+    nodes = source.document.get('nodes', [])
+    meshes = source.document.get('meshes', [])
+    parents = {child: index for index, node in enumerate(nodes) for child in node.get('children', [])}
+    collected = []
+    for index, matrix in source.iterate_scene_nodes():
+        node = nodes[index]
+        extras = node.get('extras')
+        collected.append({
+            'index': index,
+            'parent': parents.get(index),
+            'name': str(node.get('name', ''))[:ModelNode._meta.get_field('name').max_length],
+            'kks': get_node_kks(node.get('name', ''), extras),
+            'extras': extras,
+            'bounds': get_mesh_bounds(source, meshes[node['mesh']], matrix) if 'mesh' in node else None,
+        })
+    # children follow their parents, so bounds are merged up in the reversed order
+    by_index = {node['index']: node for node in collected}
+    for node in reversed(collected):
+        parent = by_index.get(node['parent'])
+        if parent is None or node['bounds'] is None:
+            continue
+        if parent['bounds'] is None:
+            parent['bounds'] = node['bounds'].copy()
+        else:
+            parent['bounds'] = np.array([
+                np.minimum(parent['bounds'][0], node['bounds'][0]), np.maximum(parent['bounds'][1], node['bounds'][1]),
+            ])
+    return collected
+
+
+def build_node_index(model: Model3D) -> int:
+    """
+    Replaces indexed nodes of a model with nodes of its glTF file. Nodes that were taken of the same contents
+    are not indexed again.
+
+    :param model: a model with a glTF file.
+    :return: number of indexed nodes.
+    """
+    signature = blobs.get_content_key(model.gltf)
+    if model.nodes.filter(source=signature).exists():
+        return 0
+    started = time.perf_counter()
+    nodes = [ModelNode(
+        model=model,
+        source=signature,
+        **{**node, 'bounds': node['bounds'].ravel().tolist() if node['bounds'] is not None else None},
+    ) for node in extract_nodes(load_model_gltf(model.gltf))]
+    with transaction.atomic():
+        model.nodes.all().delete()
+        ModelNode.objects.bulk_create(nodes, batch_size=BATCH_SIZE)
+    logger.debug(f'{len(nodes)} nodes of {model.gltf.name} are indexed in {time.perf_counter() - started:.2f} s')
+    return len(nodes)
+
+
+def find_nodes(model: Model3D, code: str) -> dict:
+    """
+    Finds nodes of a model which KKS codes start with a given code. Only the topmost found nodes are returned,
+    since their children are found with them.
+
+    :param model: a model with indexed nodes.
+    :param code: KKS code of a system or of any part of it.
+    :return: dict with indices of nodes, merged bounds as 'min' and 'max' in glTF coordinates (or None if found nodes
+    have no geometry), and a system of the building of the model with the longest code the given code starts with.
+    """
+    code = get_node_kks(code, None)
+    found = list(model.nodes.filter(kks__startswith=code).order_by('index').values_list('index', 'parent', 'bounds'))
+    indices = {index for index, _, _ in found}
+    bounds = np.array([bounds for _, _, bounds in found if bounds is not None], dtype=np.float64).reshape(-1, 6)
+    system = System.objects.filter(buildings=model.building_id).annotate(code=Value(code)).filter(
+        code__startswith=F('kks'),
+    ).order_by(Length('kks').desc()).first()
+    return {
+        'nodes': [index for index, parent, _ in found if parent not in indices],
+        'min': bounds[:, :3].min(axis=0).tolist() if len(bounds) else None,
+        'max': bounds[:, 3:].max(axis=0).tolist() if len(bounds) else None,
+        'system': system,
+    }
@@ -0,0 +1,310 @@
+import logging
+import posixpath
+import time
+from copy import deepcopy
+from urllib.parse import unquote
+
+import numpy as np
+from django.core.files.base import ContentFile
+from django.db.models.fields.files import FieldFile
+
+from EasyView import blobs, delivery
+from EasyView.gltf import Gltf, GltfWriter, ARRAY_BUFFER, ELEMENT_ARRAY_BUFFER, TRIANGLES, float_to_normalized
+from EasyView.models import Model3D, ModelArtefact
+
+logger = logging.getLogger(__name__)
+
+# Levels of detail. Level 0 keeps every vertex, on other levels vertices are clustered into cells,
+# the number is how many cells fit along the longest side of a model
+LOD_CELLS = (None, 1024, 256, 64)
+QUANTIZATION_EXTENSION = 'KHR_mesh_quantization'
+POSITION_STEPS = 65535
+
+
+def load_model_gltf(field_file: FieldFile) -> Gltf:
+    """Parses a glTF file of a model, external buffers are read from the same storage"""
+    storage, directory = field_file.storage, posixpath.dirname(field_file.name)
+
+    def open_resource(uri: str) -> bytes:
+        with storage.open(posixpath.join(directory, unquote(uri)), 'rb') as resource:
+            return resource.read()
+
+    with storage.open(field_file.name, 'rb') as file:
+        return Gltf.load(file.read(), open_resource)
+
+
+def build_lods(model: Model3D) -> list:
+    """
+    Builds optimized levels of detail of a glTF file of a model and saves them next to it.
+    Levels that were built of the same contents of the file are not rebuilt.
+
+    :param model: a model with a glTF file.
+    :return: list of built artefacts.
+    """
+    signature = blobs.get_content_key(model.gltf)
+    lods = {artefact.level: artefact for artefact in model.artefacts.filter(kind=ModelArtefact.LOD)}
+    for level in [level for level in lods if level >= len(LOD_CELLS)]:
+        delivery.delete_model_file(lods[level].file)
+        lods.pop(level).delete()
+    if len(lods) == len(LOD_CELLS) and all(artefact.source == signature for artefact in lods.values()):
+        return []
+    source = load_model_gltf(model.gltf)
+    stem = posixpath.splitext(posixpath.basename(model.gltf.name))[0]
+    built = []
+    for level, cells in enumerate(LOD_CELLS):
+        started = time.perf_counter()
+        artefact = lods.get(level) or ModelArtefact(model=model, kind=ModelArtefact.LOD, level=level)
+        if artefact.file:
+            delivery.delete_model_file(artefact.file)
+        artefact.source = signature
+        artefact.file.save(f'{stem}.lod{level}.glb', ContentFile(optimize_gltf(source, cells)), save=False)
+        artefact.save()
+        delivery.compress_model_file(artefact.file)
+        built.append(artefact)
+        logger.debug(f'LOD {level} of {model.gltf.name} is built in {time.perf_counter() - started:.2f} s')
+    return built
+
+
+def optimize_gltf(source: Gltf, cells: int = None) -> bytes:
+    """
+    Builds a .glb file with welded vertices and quantized attributes of triangles (KHR_mesh_quantization).
+    Positions of a mesh are moved to a grid of unsigned shorts, a node with the mesh gets a child node
+    that transforms the grid back.
+
+    :param source: a parsed glTF file.
+    :param cells: number of cells along the longest side of a model that vertices are clustered in,
+    None keeps every vertex.
+    :return: contents of a new file.
+    """
+    document = deepcopy({
+        key: value for key, value in source.document.items() if key not in ('buffers', 'bufferViews', 'accessors')
+    })
+    writer = GltfWriter(document)
+    _copy_data(source, writer)
+    nodes = document.get('nodes', [])
+    instances = get_mesh_instances(source)
+    cell_size = get_model_extent(source, instances) / cells if cells else None
+    skinned = {node['mesh'] for node in nodes if 'mesh' in node and 'skin' in node}
+    grids = {}
+    for mesh_index, mesh in enumerate(document.get('meshes', [])):
+        grid = None
+        if mesh_index not in skinned and not any('targets' in primitive for primitive in mesh['primitives']):
+            grid = get_mesh_grid(source, mesh)
+        local_cell_size = None
+        if cell_size and mesh_index in instances:
+            local_cell_size = cell_size / abs(np.linalg.det(instances[mesh_index][0][:3, :3])) ** (1 / 3)
+        primitives = [_write_primitive(source, writer, primitive, grid, local_cell_size)
+                      for primitive in mesh['primitives']]
+        mesh['primitives'] = [primitive for primitive in primitives if primitive]
+        if grid:
+            grids[mesh_index] = grid
+    for node_index in range(len(nodes)):
+        grid = grids.get(nodes[node_index].get('mesh'))
+        if grid:
+            origin, step = grid
+            nodes.append({'mesh': nodes[node_index].pop('mesh'), 'translation': origin.tolist(), 'scale': [step] * 3})
+            nodes[node_index].setdefault('children', []).append(len(nodes) - 1)
+    _drop_empty_meshes(document)
+    if grids:
+        for key in ('extensionsUsed', 'extensionsRequired'):
+            document[key] = sorted(set(document.get(key, [])) | {QUANTIZATION_EXTENSION})
+    return writer.to_glb()
+
+
+def get_mesh_instances(source: Gltf) -> dict:
+    """Returns world matrices of nodes of the default scene by indices of their meshes"""
+    nodes = source.document.get('nodes', [])
+    instances = {}
+    for node_index, matrix in source.iterate_scene_nodes():
+        if 'mesh' in nodes[node_index]:
+            instances.setdefault(nodes[node_index]['mesh'], []).append(matrix)
+    return instances
+
+
+def get_model_extent(source: Gltf, instances: dict) -> float:
+    """Returns the longest side of an axis-aligned box around all meshes of the default scene"""
+    lower, upper = np.full(3, np.inf), np.full(3, -np.inf)
+    for mesh_index, matrices in instances.items():
+        positions = [source.read_accessor(primitive['attributes']['POSITION'])
+                     for primitive in source.document['meshes'][mesh_index]['primitives']
+                     if 'POSITION' in primitive['attributes']]
+        if not positions:
+            continue
+        positions = np.concatenate(positions).astype(np.float64)
+        corners = np.array(np.meshgrid(*zip(positions.min(axis=0), positions.max(axis=0)))).reshape(3, -1).T
+        for matrix in matrices:
+            world = corners @ matrix[:3, :3].T + matrix[:3, 3]
+            lower, upper = np.minimum(lower, world.min(axis=0)), np.maximum(upper, world.max(axis=0))
+    extent = (upper - lower).max()
+    return float(extent) if np.isfinite(extent) and extent > 0 else 1.0
+
+
+def get_mesh_grid(source: Gltf, mesh: dict):
+    """
+    Returns a grid that positions of all primitives of a mesh are quantized to.
+
+    :return: tuple of an origin and a step of the grid, or None if the mesh has no positions.
+    """
+    positions = [source.read_accessor(primitive['attributes']['POSITION'])
+                 for primitive in mesh['primitives'] if 'POSITION' in primitive['attributes']]
+    if len(positions) != len(mesh['primitives']):
+        return None
+    positions = np.concatenate(positions).astype(np.float64)
+    if not len(positions):
+        return None
+    origin = positions.min(axis=0)
+    extent = (positions.max(axis=0) - origin).max()
+    return origin, float(extent / POSITION_STEPS) if extent > 0 else 1.0
+
+
+def quantize_attributes(attributes: dict, grid: tuple) -> dict:
+    """
+    Quantizes vertex attributes as KHR_mesh_quantization allows: positions to unsigned shorts of a grid,
+    normals to normalized bytes and texture coordinates to normalized unsigned shorts if they are within [0, 1].
+    Other attributes are kept as floats.
+
+    :return: dict with tuples of quantized values and their normalized flag by names of attributes.
+    """
+    origin, step = grid
+    quantized = {}
+    for name, values in attributes.items():
+        values = values.astype(np.float64)
+        if name == 'POSITION':
+            positions = np.clip(np.round((values - origin) / step), 0, POSITION_STEPS)
+            quantized[name] = positions.astype(np.uint16), False
+        elif name == 'NORMAL':
+            lengths = np.linalg.norm(values, axis=1, keepdims=True)
+            normals = np.divide(values, lengths, out=np.zeros_like(values), where=lengths > 0)
+            quantized[name] = float_to_normalized(normals, np.dtype(np.int8)), True
+        elif name.startswith('TEXCOORD_') and len(values) and values.min() >= 0 and values.max() <= 1:
+            quantized[name] = float_to_normalized(values, np.dtype(np.uint16)), True
+        else:
+            quantized[name] = values.astype(np.float32), False
+    return quantized
+
+
+def weld_vertices(attributes: dict, indices: np.ndarray) -> tuple:
+    """
+    Merges vertices that have equal values of all attributes, drops degenerate triangles and unused vertices.
+
+    :param attributes: dict with tuples of values and their normalized flag by names of attributes.
+    :param indices: flat array of indices of triangles.
+    :return: tuple of welded attributes and indices.
+    """
+    columns = [np.ascontiguousarray(values).view(np.uint8).reshape(len(values), -1)
+               for values, _ in attributes.values()]
+    rows = np.ascontiguousarray(np.hstack(columns))
+    keys = rows.view(np.dtype((np.void, rows.shape[1])))[:, 0]
+    _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    triangles = first[inverse.ravel()][indices].reshape(-1, 3)
+    triangles = _drop_degenerate(triangles)
+    used, triangles = np.unique(triangles, return_inverse=True)
+    welded = {name: (values[used], normalized) for name, (values, normalized) in attributes.items()}
+    return welded, triangles.ravel()
+
+
+def cluster_vertices(attributes: dict, indices: np.ndarray, cell_size: float) -> tuple:
+    """
+    Simplifies triangles by merging all vertices within a cell of a grid into one vertex with averaged attributes.
+    Triangles that collapse or repeat others are dropped.
+
+    :param attributes: dict with values of attributes by their names.
+    :param indices: flat array of indices of triangles.
+    :param cell_size: size of a cell.
+    :return: tuple of attributes and indices of simplified triangles.
+    """
+    cells = np.floor(attributes['POSITION'].astype(np.float64) / cell_size).astype(np.int64)
+    _, inverse = np.unique(cells, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    counts = np.bincount(inverse)
+    clustered = {}
+    for name, values in attributes.items():
+        values = values.astype(np.float64)
+        clustered[name] = np.column_stack([
+            np.bincount(inverse, weights=values[:, column], minlength=len(counts)) for column in range(values.shape[1])
+        ]) / counts[:, None]
+    triangles = _drop_degenerate(inverse[indices].reshape(-1, 3))
+    _, unique = np.unique(np.sort(triangles, axis=1), axis=0, return_index=True)
+    return clustered, triangles[np.sort(unique)].ravel()
+
+
+def _drop_degenerate(triangles: np.ndarray) -> np.ndarray:
+    """Drops triangles that have repeated vertices"""
+    first, second, third = triangles.T
+    return triangles[(first != second) & (second != third) & (first != third)]
+
+
+def _write_primitive(source: Gltf, writer: GltfWriter, primitive: dict, grid: tuple, cell_size: float):
+    """
+    Writes a primitive to a new file. Triangles are simplified and welded, all primitives of meshes
+    with a grid are quantized, others are copied as they are.
+
+    :return: a new primitive, or None if nothing is left of it.
+    """
+    if not grid:
+        primitive['attributes'] = {
+            name: writer.copy_accessor(source, index, ARRAY_BUFFER) for name, index in primitive['attributes'].items()
+        }
+        for target in primitive.get('targets', []):
+            for name, index in target.items():
+                target[name] = writer.copy_accessor(source, index, ARRAY_BUFFER)
+        if 'indices' in primitive:
+            primitive['indices'] = writer.copy_accessor(source, primitive['indices'], ELEMENT_ARRAY_BUFFER)
+        return primitive
+    attributes = {name: source.read_accessor(index) for name, index in primitive['attributes'].items()}
+    indices = None
+    if 'indices' in primitive:
+        indices = source.read_accessor(primitive['indices'])[:, 0].astype(np.int64)
+    if primitive.get('mode', TRIANGLES) == TRIANGLES:
+        if indices is None:
+            indices = np.arange(len(attributes['POSITION']))
+        if cell_size:
+            attributes, indices = cluster_vertices(attributes, indices, cell_size)
+        quantized, indices = weld_vertices(quantize_attributes(attributes, grid), indices)
+        if not len(indices):
+            return None
+    else:
+        quantized = quantize_attributes(attributes, grid)
+    primitive['attributes'] = {
+        name: writer.add_accessor(values, ARRAY_BUFFER, normalized, bounds=name == 'POSITION')
+        for name, (values, normalized) in quantized.items()
+    }
+    if indices is not None:
+        index_type = np.uint16 if len(quantized['POSITION'][0]) < 65535 else np.uint32
+        primitive['indices'] = writer.add_accessor(indices.astype(index_type), ELEMENT_ARRAY_BUFFER)
+    return primitive
+
+
+def _copy_data(source: Gltf, writer: GltfWriter):
+    """Copies binary data that doesn't belong to meshes: embedded images, skins and animations"""
+    document = writer.document
+    for image in document.get('images', []):
+        if 'bufferView' in image:
+            image['bufferView'] = writer.add_view(source.read_view(image['bufferView']))
+    for skin in document.get('skins', []):
+        if 'inverseBindMatrices' in skin:
+            skin['inverseBindMatrices'] = writer.copy_accessor(source, skin['inverseBindMatrices'])
+    for animation in document.get('animations', []):
+        for sampler in animation.get('samplers', []):
+            sampler['input'] = writer.copy_accessor(source, sampler['input'])
+            sampler['output'] = writer.copy_accessor(source, sampler['output'])
+
+
+def _drop_empty_meshes(document: dict):
+    """Removes meshes that have no primitives left and references to them"""
+    meshes = document.get('meshes', [])
+    new_indices, kept = {}, []
+    for index, mesh in enumerate(meshes):
+        if mesh['primitives']:
+            new_indices[index] = len(kept)
+            kept.append(mesh)
+    if len(kept) == len(meshes):
+        return
+    document['meshes'] = kept
+    for node in document.get('nodes', []):
+        if 'mesh' in node:
+            mesh_index = node.pop('mesh')
+            if mesh_index in new_indices:
+                node['mesh'] = new_indices[mesh_index]
+            else:
+                node.pop('weights', None)
@@ -0,0 +1,12 @@
+from rest_framework.pagination import CursorPagination
+
+
+class CreationTimeCursorPagination(CursorPagination):
+    """
+    Keyset pagination over creation time, newest objects first. A page is fetched by an indexed range scan,
+    so deep pages cost the same as the first one.
+    """
+    ordering = ('-creation_time', '-pk')
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
@@ -0,0 +1,192 @@
+"""
+Register of remarks for spreadsheets. Remarks are read through a server-side cursor with their view points,
+buildings and projects joined, and rows are written as CSV or XLSX while they are sent, so memory use
+doesn't depend on how many remarks are exported.
+
+An XLSX file is a zip archive of XML parts. It is written by zipfile into a buffer that is emptied after
+every chunk of rows, cells keep their strings inline, so no part of the file has to be kept until the end.
+"""
+import csv
+import re
+import zipfile
+from typing import Iterator
+from xml.sax.saxutils import escape
+
+from django.db.models import QuerySet
+from django.urls import reverse
+from django.utils import timezone
+
+from AtomREST.settings import CURRENT_URL
+from EasyView.models import Remark
+
+EXPORT_CHUNK_SIZE = 2000
+STREAM_BUFFER_SIZE = 64 * 1024
+COLUMNS = [
+    'Номер', 'Проект', 'Здание', 'Описание', 'Специальность', 'Проверяющий', 'Ответственный', 'Комментарий',
+    'Срок', 'Статус', 'Создано', 'Точка обзора',
+]
+FIELDS = [
+    'pk', 'view_point__model__building__project__name', 'view_point__model__building__kks', 'description',
+    'speciality', 'reviewer', 'responsible_person', 'comment', 'deadline', 'status', 'creation_time',
+    'view_point', 'view_point__model__building__project__slug', 'view_point__model__building__slug',
+]
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Замечания" sheetId="1" r:id="rId1"/></sheets>'
+        '</workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+SHEET_NAME = 'xl/worksheets/sheet1.xml'
+SHEET_HEADER = (
+    b'<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    b'<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+SHEET_FOOTER = b'</sheetData></worksheet>'
+# characters that are not allowed in XML 1.0
+ILLEGAL_XML_CHARS_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]')
+# first characters of texts that spreadsheets take for formulas
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+def iterate_register_rows(remarks: QuerySet) -> Iterator[list]:
+    """
+    Reads remarks through a server-side cursor and yields rows of a register, the first one is a header.
+    Choices are replaced by their names and every row has a URL that opens a view point of a remark in the viewer.
+
+    :param remarks: filtered remarks.
+    :return: iterator over lists of values of cells.
+    """
+    specialities, statuses = dict(Remark.SPECIALITIES), dict(Remark.STATUSES)
+    yield COLUMNS
+    rows = remarks.order_by(
+        'view_point__model__building__project__name', 'view_point__model__building__kks', 'deadline', 'pk',
+    ).values_list(*FIELDS)
+    for row in rows.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        *values, view_point_pk, project_slug, building_slug = row
+        values[4] = specialities.get(values[4], values[4])
+        values[9] = statuses.get(values[9], values[9])
+        values[8] = values[8].isoformat()
+        values[10] = timezone.localtime(values[10]).strftime('%Y-%m-%d %H:%M')
+        viewer_url = None
+        if view_point_pk is not None:
+            viewer_url = CURRENT_URL + reverse('view_point', kwargs={
+                'project': project_slug, 'building': building_slug, 'pk': view_point_pk,
+            })
+        yield values + [viewer_url]
+
+
+class _Echo:
+    """A file-like object that returns what is written into it, so csv writer gives lines to a generator"""
+    def write(self, value: str) -> str:
+        return value
+
+
+def stream_register_csv(rows: Iterator[list]) -> Iterator[bytes]:
+    """
+    Writes rows of a register as CSV in UTF-8 with BOM, so spreadsheets find out its encoding.
+    Texts that look like formulas are prefixed with an apostrophe, so spreadsheets don't run them.
+    """
+    writer = csv.writer(_Echo())
+    yield '\ufeff'.encode()
+    for row in rows:
+        yield writer.writerow([_get_csv_value(value) for value in row]).encode()
+
+
+def _get_csv_value(value):
+    """Returns a value of a CSV cell, texts which start like formulas are kept as texts"""
+    if value is None:
+        return ''
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+class _StreamBuffer:
+    """A file-like object that keeps written data until it is taken, zipfile writes into it as into a socket"""
+    def __init__(self):
+        self.chunks = []
+        self.size = 0
+        self.position = 0
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        self.size += len(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b''.join(self.chunks)
+        self.chunks, self.size = [], 0
+        return data
+
+
+def _get_xlsx_row(row: list) -> bytes:
+    """Returns XML of a row of a worksheet, numbers are kept as numbers, everything else as inline strings"""
+    cells = []
+    for value in row:
+        if value is None:
+            cells.append('<c/>')
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            cells.append(f'<c><v>{value}</v></c>')
+        else:
+            text = escape(ILLEGAL_XML_CHARS_RE.sub('', str(value)))
+            cells.append(f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>')
+    return f'<row>{"".join(cells)}</row>'.encode()
+
+
+def stream_register_xlsx(rows: Iterator[list]) -> Iterator[bytes]:
+    """Writes rows of a register as an XLSX workbook with one worksheet"""
+    buffer = _StreamBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in XLSX_PARTS.items():
+            archive.writestr(name, content)
+        with archive.open(SHEET_NAME, 'w') as sheet:
+            sheet.write(SHEET_HEADER)
+            for row in rows:
+                sheet.write(_get_xlsx_row(row))
+                if buffer.size >= STREAM_BUFFER_SIZE:
+                    yield buffer.take()
+            sheet.write(SHEET_FOOTER)
+    yield buffer.take()
+
+
+# writers of a register and content types of their files by file types
+FILE_TYPES = {
+    'csv': (stream_register_csv, 'text/csv; charset=utf-8'),
+    'xlsx': (stream_register_xlsx, XLSX_CONTENT_TYPE),
+}
@@ -0,0 +1,157 @@
+"""
+Counters of remarks by models of their view points, specialities, statuses and deadlines. Counters are changed
+by signals in the same transaction a remark is saved or deleted in, so statistics of remarks are summed up
+of a few rows per building instead of all remarks. Deadlines are kept in counters, so overdue remarks are counted
+for any day without changing counters every night.
+
+Remarks that are changed around signals, by raw SQL or by moving their view points to another model, are counted
+again by 'rebuild_remark_counters' command.
+"""
+from collections import Counter
+from typing import Iterable
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from EasyView.models import Remark, RemarkCounter, ViewPoint
+
+KEY_FIELDS = ('model_id', 'speciality', 'status', 'deadline')
+BATCH_SIZE = 1000
+COMPLETED = 'Completed'
+
+
+def get_counter_keys(remarks: Iterable[Remark]) -> Counter:
+    """
+    Counts remarks by keys of their counters. Models of view points are taken of cached view points,
+    the rest of them are found by one query. Remarks without view points are not counted.
+
+    :param remarks: remarks with their current values.
+    :return: Counter of numbers of remarks by tuples of values of KEY_FIELDS.
+    """
+    remarks = list(remarks)
+    model_pks = {}
+    for remark in remarks:
+        view_point = remark.view_point if Remark.view_point.is_cached(remark) else None
+        if view_point is not None and view_point.pk == remark.view_point_id:
+            model_pks[view_point.pk] = view_point.model_id
+    missing = {remark.view_point_id for remark in remarks} - set(model_pks) - {None}
+    if missing:
+        model_pks.update(ViewPoint.objects.filter(pk__in=missing).values_list('pk', 'model'))
+    deadline_field = Remark._meta.get_field('deadline')
+    keys = Counter()
+    for remark in remarks:
+        model_pk = model_pks.get(remark.view_point_id)
+        if model_pk is not None:
+            keys[(model_pk, remark.speciality, remark.status, deadline_field.to_python(remark.deadline))] += 1
+    return keys
+
+
+def change_counters(removed: Counter, added: Counter):
+    """
+    Subtracts numbers of removed remarks from their counters and adds numbers of added ones, counters
+    that reach zero are deleted. Should be called in a transaction remarks are changed in.
+
+    :param removed: numbers of remarks by keys of counters, as returned by get_counter_keys.
+    :param added: the same for added remarks.
+    """
+    changes = Counter(added)
+    changes.subtract(removed)
+    for key, delta in changes.items():
+        if delta:
+            _add_to_counter(dict(zip(KEY_FIELDS, key)), delta)
+
+
+def _add_to_counter(lookup: dict, delta: int):
+    """Adds a number to a counter, a counter that is not found is created"""
+    counters = RemarkCounter.objects.filter(**lookup)
+    if not counters.update(count=F('count') + delta):
+        try:
+            with transaction.atomic():
+                RemarkCounter.objects.create(count=delta, **lookup)
+        except IntegrityError:
+            # the same counter was created by a concurrent transaction
+            counters.update(count=F('count') + delta)
+    if delta < 0:
+        counters.filter(count__lte=0).delete()
+
+
+def rebuild_counters() -> int:
+    """
+    Counts all remarks again by one query and replaces all counters.
+
+    :return: number of counters.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        # counters can't be changed by other transactions until they are replaced, so changes of remarks that
+        # are not committed yet wait and are added to new counters
+        cursor.execute(
+            f'LOCK TABLE {connection.ops.quote_name(RemarkCounter._meta.db_table)} IN SHARE ROW EXCLUSIVE MODE'
+        )
+        counted = Remark.objects.filter(view_point__isnull=False).values(
+            'view_point__model', 'speciality', 'status', 'deadline',
+        ).annotate(count=Count('pk')).order_by()
+        counters = [RemarkCounter(
+            model_id=row['view_point__model'],
+            speciality=row['speciality'],
+            status=row['status'],
+            deadline=row['deadline'],
+            count=row['count'],
+        ) for row in counted]
+        RemarkCounter.objects.all().delete()
+        RemarkCounter.objects.bulk_create(counters, batch_size=BATCH_SIZE)
+    return len(counters)
+
+
+def get_remark_statistics(project_pk: int = None, today=None) -> list:
+    """
+    Sums up counters of remarks by buildings, by one query over counters of all buildings.
+
+    :param project_pk: PK of a project to get statistics of, all projects if None.
+    :param today: a day remarks with earlier deadlines are overdue after, the current day if None.
+    :return: list of dicts of projects with their numbers of remarks 'total', 'overdue', 'by_status'
+    and 'by_speciality', and 'buildings' with the same numbers.
+    """
+    today = today or timezone.localdate()
+    counters = RemarkCounter.objects.all()
+    if project_pk is not None:
+        counters = counters.filter(model__building__project=project_pk)
+    rows = counters.values(
+        'model__building', 'model__building__kks', 'model__building__name',
+        'model__building__project', 'model__building__project__name', 'speciality', 'status',
+    ).annotate(
+        total=Sum('count'),
+        overdue=Sum('count', filter=Q(deadline__lt=today) & ~Q(status=COMPLETED)),
+    ).order_by('model__building__project__name', 'model__building__kks')
+    projects, buildings = {}, {}
+    for row in rows:
+        project = row['model__building__project']
+        if project not in projects:
+            projects[project] = dict(
+                pk=project, name=row['model__building__project__name'], buildings=[], **_get_empty_numbers(),
+            )
+        building = row['model__building']
+        if building not in buildings:
+            buildings[building] = dict(
+                pk=building, kks=row['model__building__kks'], name=row['model__building__name'],
+                **_get_empty_numbers(),
+            )
+            projects[project]['buildings'].append(buildings[building])
+        for numbers in (projects[project], buildings[building]):
+            numbers['total'] += row['total']
+            numbers['overdue'] += row['overdue'] or 0
+            numbers['by_status'][row['status']] = numbers['by_status'].get(row['status'], 0) + row['total']
+            numbers['by_speciality'][row['speciality']] = (
+                numbers['by_speciality'].get(row['speciality'], 0) + row['total']
+            )
+    return list(projects.values())
+
+
+def _get_empty_numbers() -> dict:
+    """Returns zero numbers of remarks of a building or a project"""
+    return {
+        'total': 0,
+        'overdue': 0,
+        'by_status': {status: 0 for status, _ in Remark.STATUSES},
+        'by_speciality': {speciality: 0 for speciality, _ in Remark.SPECIALITIES},
+    }
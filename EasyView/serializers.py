@@ -1,20 +1,102 @@
+import os
+
 from rest_framework import serializers
 
-from EasyView import models
+from AtomREST.settings import MODEL_UPLOAD_CHUNK_SIZE, MODEL_UPLOAD_MAX_CHUNK_SIZE
+from EasyView import batch, blobs, models
 
 
 class Model3DSerializer(serializers.HyperlinkedModelSerializer):
     """Serializer class for a building model"""
     class Meta:
         model = models.Model3D
-        fields = ['url', 'pk', 'building', 'nwd', 'gltf', 'view_points']
+        fields = ['url', 'pk', 'building', 'nwd', 'gltf', 'nwd_url', 'gltf_url', 'gltf_lods', 'gltf_tileset',
+                  'gltf_bvh', 'view_points']
         read_only_fields = ['pk', 'url']
 
+    nwd_url = serializers.SerializerMethodField()
+    gltf_url = serializers.SerializerMethodField()
+    gltf_lods = serializers.SerializerMethodField()
+    gltf_tileset = serializers.SerializerMethodField()
+    gltf_bvh = serializers.SerializerMethodField()
+
+    def get_nwd_url(self, obj: models.Model3D):
+        """Returns URL to download .nwd file with range requests"""
+        return self._build_url(obj.get_file_url('nwd'))
+
+    def get_gltf_url(self, obj: models.Model3D):
+        """Returns URL to load .gltf/.glb file with range requests and compression"""
+        return self._build_url(obj.get_file_url('gltf'))
+
+    def get_gltf_lods(self, obj: models.Model3D):
+        """Returns optimized levels of detail of glTF file, level 0 is the most detailed one"""
+        lods = sorted(
+            (artefact for artefact in obj.artefacts.all() if artefact.kind == models.ModelArtefact.LOD),
+            key=lambda artefact: artefact.level,
+        )
+        return [{'level': lod.level, 'url': self._build_url(lod.get_file_url())} for lod in lods]
+
+    def get_gltf_tileset(self, obj: models.Model3D):
+        """Returns URL of a tileset index of glTF file, or None if the file is not split into tiles yet"""
+        return self._get_artefact_url(obj, models.ModelArtefact.TILESET)
+
+    def get_gltf_bvh(self, obj: models.Model3D):
+        """Returns URL of serialized BVH of level 0 of glTF file, or None if it is not built yet"""
+        return self._get_artefact_url(obj, models.ModelArtefact.BVH)
+
+    def _get_artefact_url(self, obj: models.Model3D, kind: str):
+        for artefact in obj.artefacts.all():
+            if artefact.kind == kind:
+                return self._build_url(artefact.get_file_url())
+
+    def _build_url(self, url: str):
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if url and request else url
+
+
+class ModelUploadSerializer(serializers.HyperlinkedModelSerializer):
+    """Serializer for sessions of chunked uploads of model files"""
+    EXTENSIONS = {'nwd': ('.nwd',), 'gltf': ('.gltf', '.glb')}
+
+    class Meta:
+        model = models.ModelUpload
+        fields = ['url', 'id', 'model', 'kind', 'file_name', 'size', 'chunk_size', 'chunks_count', 'checksum',
+                  'status', 'received_chunks', 'creation_time']
+        read_only_fields = ['url', 'id', 'status', 'creation_time']
+
+    chunk_size = serializers.IntegerField(
+        min_value=1, max_value=MODEL_UPLOAD_MAX_CHUNK_SIZE, default=MODEL_UPLOAD_CHUNK_SIZE,
+    )
+    checksum = serializers.RegexField(r'^[0-9a-fA-F]{64}$')
+    chunks_count = serializers.IntegerField(read_only=True)
+    received_chunks = serializers.SerializerMethodField()
+
+    def get_received_chunks(self, obj: models.ModelUpload):
+        """Returns sorted numbers of received chunks, so a client can resume an upload"""
+        return sorted(chunk.number for chunk in obj.chunks.all())
+
+    def validate_file_name(self, value: str):
+        return os.path.basename(value)
+
+    def validate_checksum(self, value: str):
+        return value.lower()
+
+    def validate(self, attrs):
+        if not attrs['file_name'].lower().endswith(self.EXTENSIONS[attrs['kind']]):
+            raise serializers.ValidationError({'file_name': f'File should be one of {self.EXTENSIONS[attrs["kind"]]}'})
+        # a content hash of a file is found of hashes of its chunks, so they should be made of whole blocks
+        if attrs['chunk_size'] < attrs['size'] and attrs['chunk_size'] % blobs.BLOCK_SIZE:
+            raise serializers.ValidationError({'chunk_size': f'Chunk size should be a multiple of {blobs.BLOCK_SIZE}'})
+        return attrs
+
 
 class ViewPointSerializer(serializers.HyperlinkedModelSerializer):
     """Serializer for view points"""
+    serializer_related_field = batch.BatchHyperlinkedRelatedField
+
     class Meta:
         model = models.ViewPoint
+        list_serializer_class = batch.BatchListSerializer
         fields = ['pk', 'url', 'viewer_url', 'position', 'quaternion', 'fov', 'description', 'distance_to_target',
                   'clip_constants_status', 'clip_constants', 'creation_time', 'model', 'notes', 'remark']
         read_only_fields = ['pk', 'url', 'viewer_url', 'creation_time', 'notes', 'remark']
@@ -24,15 +106,21 @@ class ViewPointSerializer(serializers.HyperlinkedModelSerializer):
 
 class NoteSerializer(serializers.HyperlinkedModelSerializer):
     """Serializer for notes"""
+    serializer_related_field = batch.BatchHyperlinkedRelatedField
+
     class Meta:
         model = models.Note
+        list_serializer_class = batch.BatchListSerializer
         exclude = ['creation_time']
 
 
 class RemarkSerializer(serializers.HyperlinkedModelSerializer):
     """Serializer for remarks"""
+    serializer_related_field = batch.BatchHyperlinkedRelatedField
+
     class Meta:
         model = models.Remark
+        list_serializer_class = batch.BatchListSerializer
         fields = ['pk', 'url', 'view_point', 'description', 'speciality', 'reviewer', 'responsible_person',
                   'comment', 'deadline', 'status', 'creation_time']
         read_only_fields = ['pk', 'url', 'creation_time']
@@ -0,0 +1,129 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from AtomproektBase import context, versions
+from EasyView import models, batch, cache, feed, tasks, remark_counters
+
+
+@receiver([post_save, post_delete], sender=models.Model3D)
+def on_model_change(sender, **kwargs):
+    """Drops cached navigation tree when a model is changed, since the tree shows only buildings with models"""
+    context.invalidate_projects_tree()
+
+
+@receiver(post_save, sender=models.Model3D)
+def on_model_save(sender, instance: models.Model3D, **kwargs):
+    """
+    Starts precompression, optimization, tiling, building of BVH and indexing of nodes of files of a model,
+    fresh results are not rebuilt. Indexed nodes are dropped when a glTF file is cleared.
+    """
+    if any(getattr(instance, kind) for kind in models.Model3D.FILE_FIELDS):
+        transaction.on_commit(lambda: tasks.compress_model_files_task.delay(instance.pk))
+    if instance.gltf:
+        # hierarchies are built of the most detailed optimized level, so they wait for it
+        transaction.on_commit(
+            lambda: (tasks.optimize_model_task.si(instance.pk) | tasks.build_bvh_task.si(instance.pk)).delay()
+        )
+        transaction.on_commit(lambda: tasks.tile_model_task.delay(instance.pk))
+        transaction.on_commit(lambda: tasks.index_model_nodes_task.delay(instance.pk))
+    else:
+        # nodes of a cleared file are not found anymore
+        instance.nodes.all().delete()
+
+
+@receiver(pre_save, sender=models.ViewPoint)
+def on_view_point_pre_save(sender, instance: models.ViewPoint, raw: bool, **kwargs):
+    """Finds a model of a view point before it is updated, since the view point may be moved to another model"""
+    previous_model_pk = None
+    if instance.pk is not None and not raw:
+        previous_model_pk = models.ViewPoint.objects.filter(pk=instance.pk).values_list('model', flat=True).first()
+    instance._previous_model_pk = previous_model_pk
+
+
+@receiver([post_save, post_delete], sender=models.ViewPoint)
+def on_view_point_change(sender, instance: models.ViewPoint, **kwargs):
+    """
+    Drops cached remarks sidebar and binary feed of a model when one of its view points is changed,
+    and the ones of a previous model of a moved view point
+    """
+    for model_pk in {instance.model_id, getattr(instance, '_previous_model_pk', None)} - {None}:
+        cache.invalidate_remarks_sidebar(model_pk)
+        feed.invalidate_view_points_feed(model_pk)
+
+
+@receiver([post_save, post_delete], sender=models.Remark)
+def on_remark_change(sender, instance: models.Remark, **kwargs):
+    """
+    Drops cached remarks sidebar of a model when a remark to one of its view points is changed,
+    and the one of a previous model of a moved remark
+    """
+    if models.Remark.view_point.is_cached(instance):
+        model_pk = instance.view_point.model_id if instance.view_point else None
+    else:
+        model_pk = models.ViewPoint.objects.filter(pk=instance.view_point_id).values_list('model', flat=True).first()
+    for model_pk in {model_pk, getattr(instance, '_previous_model_pk', None)} - {None}:
+        cache.invalidate_remarks_sidebar(model_pk)
+
+
+@receiver(batch.rows_changed, sender=models.ViewPoint)
+def on_view_points_batch_change(sender, rows: list, previous_rows: list, **kwargs):
+    """Drops cached remarks sidebars and binary feeds of models of view points that are written by a batch"""
+    for model_pk in {row.model_id for row in rows + previous_rows}:
+        cache.invalidate_remarks_sidebar(model_pk)
+        feed.invalidate_view_points_feed(model_pk)
+
+
+@receiver(batch.rows_changed, sender=models.Remark)
+def on_remarks_batch_change(sender, rows: list, previous_rows: list, **kwargs):
+    """
+    Drops cached remarks sidebars of models of view points of remarks that are written by a batch
+    and changes counters of the remarks
+    """
+    removed, added = remark_counters.get_counter_keys(previous_rows), remark_counters.get_counter_keys(rows)
+    for model_pk in {model_pk for model_pk, *_ in removed + added}:
+        cache.invalidate_remarks_sidebar(model_pk)
+    remark_counters.change_counters(removed, added)
+
+
+@receiver(pre_save, sender=models.Remark)
+def on_remark_pre_save(sender, instance: models.Remark, raw: bool, **kwargs):
+    """
+    Finds a counter and a model of a remark before it is updated, the remark is locked until the end of its save
+    """
+    previous = []
+    if instance.pk is not None and not raw:
+        previous = list(models.Remark.objects.select_related('view_point').select_for_update(of=('self',)).filter(
+            pk=instance.pk,
+        ).only('speciality', 'status', 'deadline', 'view_point__model'))
+    instance._previous_counter_keys = remark_counters.get_counter_keys(previous)
+    instance._previous_model_pk = previous[0].view_point.model_id if previous and previous[0].view_point else None
+
+
+@receiver(post_save, sender=models.Remark)
+def on_remark_save(sender, instance: models.Remark, raw: bool, **kwargs):
+    """Moves a saved remark from its previous counter to its current one"""
+    if not raw:
+        remark_counters.change_counters(
+            getattr(instance, '_previous_counter_keys', Counter()),
+            remark_counters.get_counter_keys([instance]),
+        )
+
+
+@receiver(post_delete, sender=models.Remark)
+def on_remark_delete(sender, instance: models.Remark, **kwargs):
+    """Subtracts a deleted remark from its counter, remarks are deleted in a transaction with their signals"""
+    remark_counters.change_counters(remark_counters.get_counter_keys([instance]), Counter())
+
+
+@receiver(batch.rows_changed)
+@receiver([post_save, post_delete], sender=models.Model3D)
+@receiver([post_save, post_delete], sender=models.ModelArtefact)
+@receiver([post_save, post_delete], sender=models.ViewPoint)
+@receiver([post_save, post_delete], sender=models.Note)
+@receiver([post_save, post_delete], sender=models.Remark)
+def on_version_change(sender, **kwargs):
+    """Starts a new version of rows of a changed model, so conditional requests to its API get fresh data"""
+    versions.bump_version(sender)
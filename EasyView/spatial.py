@@ -0,0 +1,73 @@
+from django.db import models
+from django.db.models import F, Func, ExpressionWrapper
+from django.db.models.expressions import RawSQL
+from django.db.models.query import QuerySet
+
+
+class PointField(models.Field):
+    """Output field of expressions that produce Postgres geometric points"""
+    def db_type(self, connection):
+        return 'point'
+
+
+class PlanPoint(Func):
+    """
+    Projection of a position array [x, y, z] onto XY plane as a Postgres point. GiST indexes are built over
+    this expression, so range queries are answered by an index scan instead of reading all positions.
+    """
+    function = 'point'
+    output_field = PointField()
+
+    def __init__(self, field_name: str, **extra):
+        super(PlanPoint, self).__init__(F(f'{field_name}__0'), F(f'{field_name}__1'), **extra)
+
+
+class ContainedIn(Func):
+    """Postgres '<@' operator, checks if the first geometric object is contained in the second one"""
+    arg_joiner = ' <@ '
+    template = '(%(expressions)s)'
+    output_field = models.BooleanField()
+
+
+def filter_in_box(queryset: QuerySet, field_name: str, lower: list, upper: list) -> QuerySet:
+    """
+    Filters objects whose position lies inside an axis-aligned box, borders included.
+
+    :param queryset: queryset of objects with a position array field.
+    :param field_name: name of the position field.
+    :param lower: one corner of the box [x, y, z].
+    :param upper: the opposite corner of the box [x, y, z].
+    :return: filtered queryset.
+    """
+    lower, upper = [min(pair) for pair in zip(lower, upper)], [max(pair) for pair in zip(lower, upper)]
+    plan_box = RawSQL('box(point(%s, %s), point(%s, %s))', (lower[0], lower[1], upper[0], upper[1]))
+    return queryset.filter(
+        ContainedIn(PlanPoint(field_name), plan_box),
+        **{f'{field_name}__2__gte': lower[2], f'{field_name}__2__lte': upper[2]},
+    )
+
+
+def filter_in_sphere(queryset: QuerySet, field_name: str, center: list, radius: float) -> QuerySet:
+    """
+    Filters objects whose position lies within a radius of a point, nearest objects go first.
+    Candidates are found by the index in a circle on XY plane, then the exact distance is checked.
+
+    :param queryset: queryset of objects with a position array field.
+    :param field_name: name of the position field.
+    :param center: the point [x, y, z].
+    :param radius: the radius.
+    :return: filtered queryset, annotated with 'distance_squared'.
+    """
+    plan_circle = RawSQL('circle(point(%s, %s), %s)', (center[0], center[1], radius))
+    distance_squared = ExpressionWrapper(
+        sum((F(f'{field_name}__{i}') - value) * (F(f'{field_name}__{i}') - value) for i, value in enumerate(center)),
+        output_field=models.FloatField(),
+    )
+    return queryset.filter(
+        ContainedIn(PlanPoint(field_name), plan_circle),
+        **{f'{field_name}__2__gte': center[2] - radius, f'{field_name}__2__lte': center[2] + radius},
+    ).annotate(
+        distance_squared=distance_squared,
+    ).filter(
+        distance_squared__lte=radius * radius,
+    ).order_by('distance_squared')
@@ -21,9 +21,25 @@
  * @property { Building } building Building to which this model belongs.
  * @property { String|Object } nwd API URL to an NWD file of the model. Can be null.
  * @property { String|Object } gltf API URL to an glTF file of the model. Can be null.
+ * @property { String } nwd_url URL to download an NWD file of the model with resuming. Can be null.
+ * @property { String } gltf_url URL to load a glTF file of the model with resuming and compression. Can be null.
+ * @property { Object[] } gltf_lods Optimized levels of detail of the glTF file, objects with 'level' and 'url'.
+ * Level 0 is the most detailed one.
+ * @property { String } gltf_tileset URL of an index of spatial tiles of the glTF file. Can be null.
+ * @property { String } gltf_bvh URL of bounding volume hierarchies of level 0 of the glTF file. Can be null.
  * @property { String[] } view_points List of API URLs of view points that are related to the model.
  */
 
+/**
+ * A type that describes everything the viewer needs to open a building, it is fetched by one request.
+ *
+ * @typedef { Object } Bundle A bundle of a building.
+ * @property { Object } project Project of the building with its 'url', 'name' and 'slug'.
+ * @property { Building } building The building, with its 'url', 'kks', 'name' and 'slug' only.
+ * @property { Model } model Model of the building.
+ * @property { ViewPoint[] } view_points All view points of the model, with their notes and remarks as objects.
+ */
+
 /**
  * A type that describes a view point inside specific model that is used by the API.
  *
@@ -105,6 +121,17 @@ export default class APIService {
         });
     }
 
+    /**
+     * A method that gets a bundle of a building. A browser keeps the bundle and revalidates it, so it is sent again
+     * only if something in it was changed.
+     *
+     * @param { String } url URL of the bundle.
+     * @return { Promise<Bundle> } Promise that fulfills with the bundle.
+     */
+    getBuildingBundle(url) {
+        return axios.get(url).then( (response) => response.data );
+    }
+
     /**
      * A method that gets a view point by its primary key.
      *
@@ -116,12 +143,8 @@ export default class APIService {
         let viewPoint;
         const response = await axios.get(url);
         viewPoint = response.data;
-        // A viewpoint contains only URLs to notes, so load all those notes here
-        const notes = [];
-        for (const noteURL of viewPoint.notes) {
-            notes.push( await this.getObject(noteURL) );
-        }
-        viewPoint.notes = notes;
+        // A viewpoint contains only URLs to notes, so load all those notes here by one request
+        viewPoint.notes = await this.getObjectsByURLs('notes', viewPoint.notes);
         //The same is with remark if it exists
         if (viewPoint.remark) {
             viewPoint.remark = await this.getObject(viewPoint.remark);
@@ -129,6 +152,83 @@ export default class APIService {
         return viewPoint;
     }
 
+    /**
+     * A method that gets camera states of all view points of a model packed into one binary buffer.
+     * Typed arrays are views over the buffer, so nothing is copied or parsed.
+     *
+     * @param { String } pk Primary key of a model.
+     * @return { Promise<{pks: BigInt64Array, cameras: Float32Array, clipStatuses: Uint8Array}> } Promise that
+     * fulfills with primary keys of view points, their camera states (15 numbers per view point: position, quaternion,
+     * fov, distance to target and clip constants, NaN means null) and clip statuses as bit masks.
+     */
+    getViewPointsFeed(pk) {
+        const url = `${this.APIRootURL}/models/${pk}/view_points_feed/`;
+        return axios.get(url, { responseType: 'arraybuffer' }).then( (response) => {
+            const buffer = response.data;
+            const header = new DataView(buffer, 0, 16);
+            const count = header.getUint32(8, true);
+            const stride = header.getUint32(12, true);
+            let offset = 16;
+            const pks = new BigInt64Array(buffer, offset, count);
+            offset += pks.byteLength;
+            const cameras = new Float32Array(buffer, offset, count * stride);
+            offset += cameras.byteLength;
+            const clipStatuses = new Uint8Array(buffer, offset, count);
+            return { pks, cameras, clipStatuses };
+        });
+    }
+
+    /**
+     * A method that gets tiles of a model that a camera sees.
+     *
+     * @param { String } pk Primary key of a model.
+     * @param { ViewPoint } viewPoint Current view point of the camera.
+     * @param { Number } aspect Aspect ratio of the camera.
+     * @param { Number } far Distance to a far plane of the camera.
+     * @return { Promise<Object[]> } Promise that fulfills with tiles in order they should be loaded. A tile has
+     * its number in 'tile', 'url' of a file and corners of its bound box in 'min' and 'max'.
+     */
+    getVisibleTiles(pk, viewPoint, aspect, far) {
+        const url = `${this.APIRootURL}/models/${pk}/tiles/`;
+        const params = {
+            position: viewPoint.position.join(','),
+            quaternion: viewPoint.quaternion.join(','),
+            fov: viewPoint.fov,
+            aspect: aspect,
+            far: far,
+        };
+        return axios.get(url, { params: params }).then( (response) => response.data.tiles );
+    }
+
+    /**
+     * A method that finds nodes of a model which KKS codes start with a given code, for example of a system.
+     *
+     * @param { Number } pk PK of a model.
+     * @param { String } kks KKS code of a system or of any part of it.
+     * @return { Promise<Object> } Promise that fulfills with indices of glTF 'nodes', corners of their bound box
+     * in 'min' and 'max' (null if nodes have no geometry) and an API URL of a found 'system' (can be null).
+     */
+    getModelNodes(pk, kks) {
+        const url = `${this.APIRootURL}/models/${pk}/nodes/`;
+        return axios.get(url, { params: { kks: kks } }).then( (response) => response.data );
+    }
+
+    /**
+     * A method used to get several objects of the same kind by their API URLs with one request.
+     *
+     * @param { String } resource Name of API resource of objects, like 'notes'.
+     * @param { String[] } links API URLs of objects that should be fetched.
+     * @return { Promise<Object[]> } Promise that is fulfilled with found objects in the same order.
+     */
+    getObjectsByURLs(resource, links) {
+        if (!links.length) {
+            return Promise.resolve([]);
+        }
+        const url = `${this.APIRootURL}/${resource}/batch/`;
+        const ids = links.map( link => link.split('/').filter(Boolean).pop() );
+        return axios.get(url, { params: { ids: ids.join(',') } }).then( (response) => response.data );
+    }
+
     /**
      * A method used to get any object by its API URL.
      *
@@ -160,6 +260,17 @@ export default class APIService {
         return axios.post(url, viewPoint).then(result => result.data);
     }
 
+    /**
+     * A method used to add several new notes to database by one request.
+     *
+     * @param { Note[] } notes Note objects that should be saved.
+     * @return { Promise<Note[]> } Promise that is fulfilled with saved notes.
+     */
+    addNotes(notes) {
+        const url = `${this.APIRootURL}/notes/batch/`;
+        return axios.post(url, notes).then(result => result.data);
+    }
+
     /**
      * A method used to add a new note to database.
      *
@@ -182,6 +293,7 @@ export default class APIService {
         return axios.get(url, {
             params: {
                 viewpoints_pk_list: pk_string,
+                stream: 1,
             },
             responseType: 'blob',
         }).then( (response) => {
@@ -5,6 +5,7 @@ import {MeshoptDecoder} from '../../threejs/examples/jsm/libs/meshopt_decoder.mo
 import {OrbitControls} from '../../threejs/examples/jsm/controls/OrbitControls.js';
 import {RoomEnvironment} from '../../threejs/examples/jsm/environments/RoomEnvironment.js';
 import SpriteText from "../../three-spritetext/src/index.js";
+import {MeshBVH, acceleratedRaycast} from "../../three-mesh-bvh/src/index.js";
 
 import ControlPanel from "./ControlPanel.js";
 import {prettify} from "./Utils.js";
@@ -29,6 +30,10 @@ export default class Engine {
      * @param { Number } defaultDistanceToTarget If a view point doesn't contain distance to target, this value will
      * be used.
      * @property { Model } model Current loaded model.
+     * @property { THREE.Group } modelScene Scene of a currently shown level of detail of the model.
+     * @property { Function } getTiles Function that returns a promise of tiles that a camera sees, it gets a view
+     * point, an aspect ratio and a far distance of the camera. Tiles are not used without it.
+     * @property { Map } tiles Scenes of loaded tiles by their numbers, null for tiles that are being loaded.
      * @property { ViewPoint } viewPoint Current view point.
      */
     constructor(
@@ -95,9 +100,15 @@ export default class Engine {
         // Loading manager to define actions after model's load
         this.loadingManager = new THREE.LoadingManager();
         this.loader = new GLTFLoader(this.loadingManager);
+        // Loader of details that are loaded after the app is started
+        this.detailLoader = new GLTFLoader();
 
         this.rootElement = rootElement;
         this.model = undefined;
+        this.modelScene = undefined;
+        this.getTiles = undefined;
+        this.tiles = new Map();
+        this.tilesTimeout = undefined;
         this.viewPoint = undefined;
 
         this.boundBox = new THREE.Box3();
@@ -120,18 +131,113 @@ export default class Engine {
     }
 
     /**
-     * Method that loads current model into current scene.
+     * Method that loads current model into current scene. If the model has optimized levels of detail,
+     * the coarsest one is shown first. Then it is replaced by more detailed levels as soon as they are loaded,
+     * or, if the model is split into tiles and tiles can be requested, by visible tiles.
      *
      */
     loadModel() {
         const ktx2Loader = new KTX2Loader()
             .setTranscoderPath('../../threejs/examples/js/libs/basis')
             .detectSupport(this.renderer);
-        this.loader.setKTX2Loader(ktx2Loader);
-        this.loader.setMeshoptDecoder(MeshoptDecoder);
-        this.loader.load( this.model.gltf, ( gltf ) => {
+        for (const loader of [this.loader, this.detailLoader]) {
+            loader.setKTX2Loader(ktx2Loader);
+            loader.setMeshoptDecoder(MeshoptDecoder);
+        }
+        const lods = this.model.gltf_lods.slice().sort((a, b) => b.level - a.level);
+        const urls = lods.length ? lods.map((lod) => lod.url) : [this.model.gltf_url];
+        if (lods.length && this.model.gltf_tileset && this.getTiles) {
+            this.loadModelLevel(urls.slice(0, 1), 0, () => {
+                this.controls.addEventListener('change', this.onCameraChange.bind(this));
+                this.updateTiles();
+            });
+        }
+        else if (lods.length && this.model.gltf_bvh) {
+            this.loadModelLevel(urls, 0, (gltf) => { this.loadBVH(gltf); });
+        }
+        else {
+            this.loadModelLevel(urls, 0);
+        }
+    }
+
+    /**
+     * Method that loads precomputed bounding volume hierarchies of the most detailed level of current model
+     * and assigns them to its meshes, so picking doesn't test every triangle.
+     *
+     * @param { Object } gltf Loaded most detailed level of detail.
+     */
+    loadBVH( gltf ) {
+        new THREE.FileLoader().setResponseType('arraybuffer').load(this.model.gltf_bvh, (buffer) => {
+            const primitives = parseBVH(buffer);
+            const geometries = new Set();
+            for (const [object, association] of gltf.parser.associations) {
+                if (association.type !== 'nodes') {
+                    continue;
+                }
+                const meshIndex = gltf.parser.json.nodes[association.index].mesh;
+                const meshes = object.isMesh ? [object] : object.children.filter((o) => o.isMesh);
+                for (const primitive of primitives.filter((p) => p.mesh === meshIndex)) {
+                    const mesh = meshes[primitive.primitive];
+                    if (!mesh || geometries.has(mesh.geometry)) {
+                        continue;
+                    }
+                    geometries.add(mesh.geometry);
+                    deinterleavePosition(mesh.geometry);
+                    mesh.geometry.boundsTree = MeshBVH.deserialize(primitive, mesh.geometry);
+                }
+            }
+            THREE.Mesh.prototype.raycast = acceleratedRaycast;
+        },
+        undefined,
+        (error) => { console.log('An error happened' + error); }
+        );
+    }
+
+    /**
+     * Method that loads one level of detail of current model and replaces a previous one with it.
+     * Only the first level is loaded by the loading manager, so the app starts as soon as it is shown.
+     *
+     * @param { String[] } urls URLs of levels of detail, from the coarsest one to the most detailed one.
+     * @param { Number } index Index of a level that should be loaded.
+     * @param { Function } onLastLevel Called with the last level when it is shown.
+     */
+    loadModelLevel(urls, index, onLastLevel = undefined) {
+        const loader = index === 0 ? this.loader : this.detailLoader;
+        loader.load( urls[index], ( gltf ) => {
 
-        gltf.scene.traverse((o) => { // Walk through all elements of scene
+        this.prepareModelScene( gltf.scene );
+        if (this.modelScene) {
+            this.scene.remove( this.modelScene );
+        }
+        else {
+            // Set bound box and model center here off the scene to use it later.
+            this.boundBox.setFromObject(gltf.scene).getCenter(this.modelCenter);
+        }
+        this.modelScene = gltf.scene;
+        this.scene.add( gltf.scene );
+        this.render();
+        if (index + 1 < urls.length) {
+            this.loadModelLevel(urls, index + 1, onLastLevel);
+        }
+        else if (onLastLevel) {
+            onLastLevel(gltf);
+        }
+        },
+
+        // Callback on loading process.
+        (xhr) => { console.log((xhr.loaded / xhr.total * 100) + '% loaded'); },
+        // Called when loading has errors.
+        (error) => { console.log('An error happened' + error); }
+        );
+    }
+
+    /**
+     * Method that sets materials of a loaded scene of a model.
+     *
+     * @param { THREE.Group } scene Loaded scene.
+     */
+    prepareModelScene( scene ) {
+        scene.traverse((o) => { // Walk through all elements of scene
             if (o.isMesh) {
                 if ( ( o.material.color.r >= 0.64 && o.material.color.r <= 0.65 )
                     && ( o.material.color.g >= 0.819 && o.material.color.g <= 0.82 )
@@ -146,17 +252,41 @@ export default class Engine {
                 }
             }
         });
+    }
 
-        // Set bound box and model center here off the scene to use it later.
-        this.boundBox.setFromObject(gltf.scene).getCenter(this.modelCenter);
-        this.scene.add( gltf.scene );
-        },
+    /**
+     * Method called on every camera move. Tiles are requested only when the camera stops for a moment.
+     */
+    onCameraChange() {
+        clearTimeout(this.tilesTimeout);
+        this.tilesTimeout = setTimeout(this.updateTiles.bind(this), 300);
+    }
 
-        // Callback on loading process.
-        (xhr) => { console.log((xhr.loaded / xhr.total * 100) + '% loaded'); },
-        // Called when loading has errors.
-        (error) => { console.log('An error happened' + error); }
-        );
+    /**
+     * Method that requests tiles that the camera sees and loads missing ones, the most important first.
+     * The coarse level of detail is shown until all visible tiles are loaded.
+     */
+    updateTiles() {
+        const viewPoint = this.getCurrentViewPoint();
+        this.getTiles( viewPoint, this.camera.aspect, this.camera.far ).then( async (tiles) => {
+            const missing = tiles.filter((tile) => !this.tiles.has(tile.tile));
+            if (!missing.length) {
+                return;
+            }
+            this.modelScene.visible = true;
+            for (const tile of missing) {
+                this.tiles.set(tile.tile, null);
+                const gltf = await this.detailLoader.loadAsync(tile.url);
+                this.prepareModelScene( gltf.scene );
+                this.tiles.set(tile.tile, gltf.scene);
+                this.scene.add( gltf.scene );
+                this.render();
+            }
+            if (tiles.every((tile) => this.tiles.get(tile.tile))) {
+                this.modelScene.visible = false;
+                this.render();
+            }
+        });
     }
 
     /**
@@ -213,6 +343,26 @@ export default class Engine {
         this.controls.update();
     }
 
+    /**
+     * Method used to fly to a box, for example to nodes of a system. It sets view the same way as default view,
+     * but looks on a center of the box.
+     *
+     * @param { Number[] } min Minimal corner of the box in glTF coordinates.
+     * @param { Number[] } max Maximal corner of the box in glTF coordinates.
+     */
+    flyToBox( min, max ) {
+        const box = new THREE.Box3( new THREE.Vector3( ...min ), new THREE.Vector3( ...max ) );
+        this.controls.target.copy( box.getCenter( new THREE.Vector3() ) );
+        const multiplier = 1 + this.initialDistance;
+        this.camera.position.set(
+            box.min.x + multiplier * (box.max.x - box.min.x),
+            box.min.y + multiplier * (box.max.y - box.min.y),
+            box.min.z + multiplier * (box.max.z - box.min.z),
+        );
+        this.render();
+        this.controls.update();
+    }
+
     /**
      * Method used to catch intersection position via ray casting. It catches click of a user and returns first
      * intersection, taking into consideration current clipping.
@@ -445,4 +595,52 @@ class GuideSphere {
         this.sphere.scale.setScalar( newScale );
         this.sphere.position.set( target.x, target.y, target.z );
     }
-}
\ No newline at end of file
+}
+
+/**
+ * Parses a file with bounding volume hierarchies of primitives of a glTF file, as EasyView/bvh.py writes it.
+ *
+ * @param { ArrayBuffer } buffer Contents of a file.
+ * @returns { Object[] } Objects with 'mesh', 'primitive', 'roots' and 'index' for MeshBVH.deserialize.
+ */
+function parseBVH( buffer ) {
+    const view = new DataView(buffer);
+    const count = view.getUint32(8, true);
+    const primitives = [];
+    let offset = 12;
+    for (let i = 0; i < count; i++) {
+        const indexCount = view.getUint32(offset + 8, true);
+        const indexSize = view.getUint32(offset + 12, true);
+        const nodesLength = view.getUint32(offset + 16, true) * 32;
+        const IndexArray = indexSize === 2 ? Uint16Array : Uint32Array;
+        const nodesOffset = offset + 20;
+        const indexOffset = nodesOffset + nodesLength;
+        primitives.push({
+            mesh: view.getUint32(offset, true),
+            primitive: view.getUint32(offset + 4, true),
+            roots: [buffer.slice(nodesOffset, indexOffset)],
+            index: new IndexArray(buffer.slice(indexOffset, indexOffset + indexCount * indexSize)),
+        });
+        offset = indexOffset + Math.ceil(indexCount * indexSize / 4) * 4;
+    }
+    return primitives;
+}
+
+/**
+ * Replaces an interleaved position attribute of a geometry with a plain one, as MeshBVH requires.
+ *
+ * @param { THREE.BufferGeometry } geometry Geometry of a mesh.
+ */
+function deinterleavePosition( geometry ) {
+    const position = geometry.attributes.position;
+    if (!position.isInterleavedBufferAttribute) {
+        return;
+    }
+    const array = new position.array.constructor(position.count * 3);
+    for (let i = 0; i < position.count; i++) {
+        array[i * 3] = position.getX(i);
+        array[i * 3 + 1] = position.getY(i);
+        array[i * 3 + 2] = position.getZ(i);
+    }
+    geometry.setAttribute('position', new THREE.BufferAttribute(array, 3, position.normalized));
+}
@@ -20,6 +20,7 @@ export default class ViewpointManager {
 
         this.currentNotes = [];
         this.viewPointsList = [];
+        this.bundledViewPoints = new Map();
         this.isWaitingForNote = false;
         this.remarkButtons = this.interface.viewPointsMenu.querySelectorAll('.remark');
 
@@ -52,13 +53,20 @@ export default class ViewpointManager {
      */
     async launch() {
         const settings = this.interface.settingsElement;
-        const model = await this.apiService.getModelByPK(settings.getAttribute('model_pk'));
+        // The model, its building and all its view points come in one bundle
+        const bundle = await this.apiService.getBuildingBundle(settings.getAttribute('bundle_url'));
+        const model = bundle.model;
+        model.building = bundle.building;
+        this.bundledViewPoints = new Map( bundle.view_points.map( viewPoint => [String(viewPoint.pk), viewPoint] ) );
         const initialViewPointPK = settings.getAttribute('view_point_pk');
         let initialViewPoint;
         if (initialViewPointPK) {
-            initialViewPoint = await this.apiService.getViewPointByPK(initialViewPointPK);
+            initialViewPoint = await this.getViewPoint(initialViewPointPK);
         }
         this.engine.model = model;
+        this.engine.getTiles = (viewPoint, aspect, far) => this.apiService.getVisibleTiles(
+            model.pk, viewPoint, aspect, far,
+        );
         this.engine.loadingManager.onLoad = () => {
             if (initialViewPoint && !initialViewPoint.remark) { //Ignore remarks and don't save them locally.
                 this.storage.addViewPoint( initialViewPointPK );
@@ -94,11 +102,11 @@ export default class ViewpointManager {
                 this.storage.addViewPoint( savedViewPoint.pk );
                 savedViewPoint.notes = [...this.currentNotes];
                 this.viewPointsList.push( savedViewPoint );
-                for (const note of savedViewPoint.notes) {
-                    if (note) { // because it can contain undefined values after note deletion
-                        note.view_point = savedViewPoint.url;
-                        await this.apiService.addNote( note );
-                    }
+                // the list can contain undefined values after note deletion
+                const notes = savedViewPoint.notes.filter( note => note );
+                notes.forEach( note => { note.view_point = savedViewPoint.url } );
+                if (notes.length) {
+                    await this.apiService.addNotes( notes );
                 }
                 await this.renderViewpointsList();
                 this.setViewPoint( savedViewPoint, false, false );
@@ -474,10 +482,21 @@ export default class ViewpointManager {
      */
     async getSavedViewpoints() {
         const pkList = this.storage.getList();
-        const promises = pkList.map( pk => this.apiService.getViewPointByPK( pk ) );
+        const promises = pkList.map( pk => this.getViewPoint( pk ) );
         this.viewPointsList = await Promise.all(promises);
     }
 
+    /**
+     * Method that gets a view point from the bundle of the building, or from the API if it is of another model.
+     *
+     * @param { String } pk Primary key of a view point.
+     * @return {Promise<ViewPoint>} Promise that is fulfilled with the view point.
+     */
+    async getViewPoint( pk ) {
+        const viewPoint = this.bundledViewPoints.get( String(pk) );
+        return viewPoint ? viewPoint : await this.apiService.getViewPointByPK( pk );
+    }
+
     /**
      * Method used to save current view point with given description. Does not manage with notes.
      *
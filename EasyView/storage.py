@@ -0,0 +1,214 @@
+import fcntl
+import hashlib
+import logging
+import os
+from datetime import datetime, timezone
+from tempfile import NamedTemporaryFile
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files import File
+from django.core.files.storage import Storage, get_storage_class
+from django.utils.deconstruct import deconstructible
+
+logger = logging.getLogger(__name__)
+
+METADATA_KEY = 'easyview_storage_metadata_{}'
+COUNTER_KEY = 'easyview_storage_{}'
+COUNTERS = ('hits', 'misses', 'evictions')
+# Marks files that are known not to exist, so missing precompressed variants are not looked up remotely every time
+MISSING = 'missing'
+LOCK_SUFFIX = '.lock'
+PART_SUFFIX = '.part'
+CHUNK_SIZE = 1024 * 1024
+
+
+@deconstructible
+class CachedStorage(Storage):
+    """
+    Storage that keeps recently read files of a remote storage on a local disk. Local copies are named by
+    a signature of a remote file (its size and modification time), so a replaced file is never read from cache.
+    Signatures and existence of files are kept in the shared cache and are updated by every write through
+    this storage, so reading a hot file takes no requests to the remote storage at all.
+    The least recently used copies are deleted when the size of the local cache exceeds its limit.
+    """
+    def __init__(self, backend: str = None, location: str = None, max_size: int = None):
+        self.remote = get_storage_class(backend or settings.CACHED_STORAGE_BACKEND)()
+        self.location = location or settings.CACHED_STORAGE_ROOT
+        self.max_size = max_size if max_size is not None else settings.CACHED_STORAGE_MAX_SIZE
+        os.makedirs(self.location, exist_ok=True)
+
+    def _open(self, name: str, mode: str = 'rb'):
+        if any(flag in mode for flag in 'wa+'):
+            return self.remote.open(name, mode)
+        return File(open(self._get_local_path(name), mode), name)
+
+    def _save(self, name: str, content) -> str:
+        name = self.remote.save(name, content)
+        metadata = self._fetch_metadata(name)
+        # the file is most probably read soon, e.g. to precompress it, so it is put into the cache right away
+        self._write_local_copy(name, metadata, content.chunks())
+        return name
+
+    def delete(self, name: str):
+        self.remote.delete(name)
+        self._remove_local_copies(name)
+        cache.set(self._get_metadata_key(name), MISSING, None)
+
+    def exists(self, name: str) -> bool:
+        return self._get_metadata(name) != MISSING
+
+    def size(self, name: str) -> int:
+        return self._get_existing_metadata(name)[0]
+
+    def get_modified_time(self, name: str) -> datetime:
+        return datetime.fromtimestamp(self._get_existing_metadata(name)[1], timezone.utc)
+
+    def listdir(self, path: str):
+        return self.remote.listdir(path)
+
+    def url(self, name: str) -> str:
+        return self.remote.url(name)
+
+    def get_available_name(self, name: str, max_length: int = None) -> str:
+        return self.remote.get_available_name(name, max_length)
+
+    def get_stats(self) -> dict:
+        """Returns numbers of hits, misses and evictions of all processes, and the size of the local cache"""
+        stats = cache.get_many([COUNTER_KEY.format(counter) for counter in COUNTERS])
+        return {
+            **{counter: stats.get(COUNTER_KEY.format(counter), 0) for counter in COUNTERS},
+            'size': sum(size for _, size, _ in self._list_local_copies()),
+        }
+
+    def _get_local_path(self, name: str) -> str:
+        """
+        Returns a path of a fresh local copy of a file, the file is downloaded if there is no such copy.
+        Concurrent reads of the same file wait for one download instead of downloading it several times.
+        """
+        metadata = self._get_existing_metadata(name)
+        path = self._get_copy_path(name, metadata)
+        if self._touch(path):
+            return path
+        with open(self._get_copy_prefix(name) + LOCK_SUFFIX, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                if self._touch(path):
+                    return path
+                self._count('misses')
+                with self.remote.open(name, 'rb') as remote_file:
+                    self._write_local_copy(name, metadata, remote_file.chunks(CHUNK_SIZE))
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+        return path
+
+    def _touch(self, path: str) -> bool:
+        """Marks a local copy as recently used, returns False if there is no such copy"""
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        self._count('hits')
+        return True
+
+    def _write_local_copy(self, name: str, metadata: tuple, chunks):
+        """Writes a new local copy of a file, drops its outdated copies and evicts old files if needed"""
+        self._remove_local_copies(name)
+        with NamedTemporaryFile(dir=self.location, suffix=PART_SUFFIX, delete=False) as tf:
+            try:
+                for chunk in chunks:
+                    tf.write(chunk)
+            except Exception:
+                os.remove(tf.name)
+                raise
+        path = self._get_copy_path(name, metadata)
+        os.replace(tf.name, path)
+        self._evict(path)
+
+    def _remove_local_copies(self, name: str):
+        prefix = os.path.basename(self._get_copy_prefix(name))
+        for entry in os.scandir(self.location):
+            if entry.name.startswith(prefix) and not entry.name.endswith(LOCK_SUFFIX):
+                os.remove(entry.path)
+
+    def _list_local_copies(self) -> list:
+        """Returns tuples of a path, a size and a time of the last use of every local copy"""
+        copies = []
+        for entry in os.scandir(self.location):
+            if entry.is_file() and not entry.name.endswith((LOCK_SUFFIX, PART_SUFFIX)):
+                stat = entry.stat()
+                copies.append((entry.path, stat.st_size, stat.st_mtime))
+        return copies
+
+    def _evict(self, keep_path: str):
+        """Deletes the least recently used local copies, except a given one, until the cache fits its size limit"""
+        copies = sorted(self._list_local_copies(), key=lambda item: item[2])
+        total = sum(size for _, size, _ in copies)
+        for path, size, _ in copies:
+            if total <= self.max_size:
+                break
+            if path == keep_path:
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            total -= size
+            self._count('evictions')
+            logger.debug(f'{path} is evicted from storage cache')
+
+    def _get_copy_prefix(self, name: str) -> str:
+        return os.path.join(self.location, hashlib.sha1(name.encode()).hexdigest())
+
+    def _get_copy_path(self, name: str, metadata: tuple) -> str:
+        signature = hashlib.sha1(f'{metadata[0]}:{metadata[1]}'.encode()).hexdigest()[:16]
+        extension = os.path.splitext(name)[1]
+        return f'{self._get_copy_prefix(name)}-{signature}{extension}'
+
+    def _get_metadata_key(self, name: str) -> str:
+        return METADATA_KEY.format(hashlib.sha1(name.encode()).hexdigest())
+
+    def _get_metadata(self, name: str):
+        """Returns a tuple of a size and a modification timestamp of a file, or MISSING if it doesn't exist"""
+        metadata = cache.get(self._get_metadata_key(name))
+        if metadata is None:
+            metadata = self._fetch_metadata(name)
+        return metadata
+
+    def _get_existing_metadata(self, name: str) -> tuple:
+        metadata = self._get_metadata(name)
+        if metadata == MISSING:
+            raise FileNotFoundError(f'{name} does not exist')
+        return metadata
+
+    def _fetch_metadata(self, name: str):
+        """Requests metadata of a file from the remote storage and keeps it in the shared cache"""
+        if self.remote.exists(name):
+            metadata = (self.remote.size(name), self._get_remote_modified_time(name).timestamp())
+        else:
+            metadata = MISSING
+        cache.set(self._get_metadata_key(name), metadata, None)
+        return metadata
+
+    def _get_remote_modified_time(self, name: str) -> datetime:
+        """
+        Returns a modification time of a remote file. Storages like Dropbox of django-storages 1.11 implement
+        only the old 'modified_time' which gives naive UTC time.
+        """
+        try:
+            return self.remote.get_modified_time(name)
+        except NotImplementedError:
+            modified_time = self.remote.modified_time(name)
+        if modified_time.tzinfo is None:
+            modified_time = modified_time.replace(tzinfo=timezone.utc)
+        return modified_time
+
+    @staticmethod
+    def _count(counter: str):
+        key = COUNTER_KEY.format(counter)
+        cache.add(key, 0, None)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # the counter is evicted from the shared cache in between
+            cache.add(key, 1, None)
@@ -0,0 +1,160 @@
+import posixpath
+from datetime import timedelta
+from tempfile import TemporaryFile
+
+from celery import shared_task
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from AtomREST.settings import EXPORT_FILES_MAX_AGE, JOBS_DATABASE
+from EasyView import import_export, delivery, models, optimization, tiling, bvh, nodes
+
+IMPORT_JOBS_DIR = 'jobs/imports'
+EXPORT_JOBS_DIR = 'jobs/exports'
+PROGRESS = 'PROGRESS'
+
+
+def report_progress(task, processed: int):
+    """Stores a number of processed view points as a state of a running task"""
+    task.update_state(state=PROGRESS, meta={'processed': processed}, using=JOBS_DATABASE)
+
+
+@shared_task(bind=True)
+def import_viewpoints_task(self, file_name: str, model_pk: int) -> dict:
+    """
+    Background job that imports view points off a Navisworks file saved to the default storage.
+    The file is deleted when the job is finished.
+
+    :param file_name: name of the file in the default storage.
+    :param model_pk: PK of a model the viewpoints should be saved to.
+    :return: dict with a number of processed view points and a list of saved viewpoints' PKs.
+    """
+    try:
+        pks_list = import_export.import_navisworks_viewpoints(
+            default_storage.open(file_name, 'rb'),
+            model_pk,
+            progress_callback=lambda processed: report_progress(self, processed),
+        )
+    finally:
+        default_storage.delete(file_name)
+    return {'processed': len(pks_list), 'list': pks_list}
+
+
+@shared_task(bind=True)
+def export_viewpoints_task(self, pk_list: list) -> dict:
+    """
+    Background job that exports view points to a Navisworks file and saves it to the default storage.
+
+    :param pk_list: list that contents primary keys of saved view points that should be exported.
+    :return: dict with a number of processed view points and a name of the file in the default storage,
+    links of some storages expire, so a link is made when a status of the job is requested.
+    """
+    processed = 0
+
+    def on_progress(exported: int):
+        nonlocal processed
+        processed = exported
+        report_progress(self, processed)
+
+    with TemporaryFile() as tf:
+        for chunk in import_export.stream_exported_viewpoints_xml(pk_list, progress_callback=on_progress):
+            tf.write(chunk)
+        tf.seek(0)
+        file_name = default_storage.save(f'{EXPORT_JOBS_DIR}/{self.request.id}.xml', File(tf))
+    return {'processed': processed, 'file': file_name}
+
+
+@shared_task
+def delete_old_export_files_task() -> list:
+    """
+    Periodic job that deletes files of export jobs that are older than EXPORT_FILES_MAX_AGE seconds.
+
+    :return: list of names of deleted files.
+    """
+    try:
+        file_names = default_storage.listdir(EXPORT_JOBS_DIR)[1]
+    except FileNotFoundError:  # nothing is exported yet
+        return []
+    oldest = timezone.now() - timedelta(seconds=EXPORT_FILES_MAX_AGE)
+    deleted = []
+    for file_name in file_names:
+        name = posixpath.join(EXPORT_JOBS_DIR, file_name)
+        if default_storage.get_modified_time(name) < oldest:
+            default_storage.delete(name)
+            deleted.append(name)
+    return deleted
+
+
+@shared_task
+def compress_model_files_task(model_pk: int) -> list:
+    """
+    Background job that saves precompressed variants of files of a model, so they are sent to clients faster.
+
+    :param model_pk: PK of a model.
+    :return: list of names of saved variants.
+    """
+    model = models.Model3D.objects.get(pk=model_pk)
+    saved = []
+    for kind in models.Model3D.FILE_FIELDS:
+        field_file = getattr(model, kind)
+        if field_file:
+            saved += delivery.compress_model_file(field_file)
+    return saved
+
+
+@shared_task
+def optimize_model_task(model_pk: int) -> list:
+    """
+    Background job that builds optimized levels of detail of a glTF file of a model.
+
+    :param model_pk: PK of a model.
+    :return: list of names of files of built levels.
+    """
+    model = models.Model3D.objects.select_related('building').get(pk=model_pk)
+    if not model.gltf:
+        return []
+    return [artefact.file.name for artefact in optimization.build_lods(model)]
+
+
+@shared_task
+def tile_model_task(model_pk: int) -> list:
+    """
+    Background job that splits a glTF file of a model into spatial tiles.
+
+    :param model_pk: PK of a model.
+    :return: list of names of files of built tiles and a tileset index.
+    """
+    model = models.Model3D.objects.select_related('building').get(pk=model_pk)
+    if not model.gltf:
+        return []
+    return [artefact.file.name for artefact in tiling.build_tiles(model)]
+
+
+@shared_task
+def build_bvh_task(model_pk: int):
+    """
+    Background job that builds bounding volume hierarchies of the most detailed level of a model.
+
+    :param model_pk: PK of a model.
+    :return: name of a built file, or None if hierarchies are up to date.
+    """
+    model = models.Model3D.objects.select_related('building').get(pk=model_pk)
+    artefact = bvh.build_bvh(model)
+    return artefact.file.name if artefact else None
+
+
+@shared_task
+def index_model_nodes_task(model_pk: int) -> int:
+    """
+    Background job that indexes nodes of a glTF file of a model by their KKS codes.
+
+    :param model_pk: PK of a model.
+    :return: number of indexed nodes, 0 if the index is up to date or the model has no glTF file.
+    """
+    model = models.Model3D.objects.get(pk=model_pk)
+    if not model.gltf:
+        # nodes of a cleared file are not found anymore
+        model.nodes.all().delete()
+        return 0
+    return nodes.build_node_index(model)
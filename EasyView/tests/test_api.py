@@ -0,0 +1,370 @@
+import csv
+import datetime
+import io
+import zipfile
+from xml.etree import ElementTree
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from AtomproektBase import models as base_models
+from AtomproektBase.test.test_api import QueriesBudgetTestCase
+
+from EasyView import models, register, remark_counters
+
+
+class APISetUp(QueriesBudgetTestCase):
+    """Setup with a model that has view points with notes and remarks"""
+    def setUp(self) -> None:
+        super(APISetUp, self).setUp()
+        self.model1 = models.Model3D.objects.create(building=self.building1_1)
+        self.add_rows(self.model1)
+
+    def add_rows(self, model: models.Model3D):
+        """Adds view points with notes and remarks to a model"""
+        for i in range(3):
+            view_point = models.ViewPoint.objects.create(model=model, position=[i, i, i], quaternion=[0, 0, 0, 1])
+            models.Note.objects.create(view_point=view_point, text='Note', position=[i, i, i])
+            models.Note.objects.create(view_point=view_point, text='Another note', position=[i, i, i])
+            models.Remark.objects.create(
+                view_point=view_point,
+                description='Remark',
+                speciality='HVAC',
+                reviewer='Reviewer',
+                deadline='2030-01-01',
+                status='Uncompleted',
+            )
+
+    def add_models(self):
+        """Adds a model with view points to a new building"""
+        building = base_models.Building.objects.create(kks='20UJA', name='Reactor building', project=self.project2)
+        self.add_rows(models.Model3D.objects.create(building=building))
+
+
+class EasyViewAPIQueriesTest(APISetUp):
+    """Tests for numbers of queries of EasyView API endpoints"""
+    def test_list_queries(self):
+        """Checks that list endpoints make a fixed number of queries"""
+        cases = [
+            ('/api/v1/view_points/', 2),
+            ('/api/v1/notes/', 1),
+            ('/api/v1/remarks/', 1),
+        ]
+        for url, budget in cases:
+            with self.subTest(msg=url):
+                self.assertQueriesDoNotGrow(url, lambda: self.add_rows(self.model1), budget)
+        with self.subTest(msg='/api/v1/models/'):
+            self.assertQueriesDoNotGrow('/api/v1/models/', self.add_models, 3)
+
+
+class PaginationTest(APISetUp):
+    """Tests for cursor pagination of view points, notes and remarks"""
+    def test_pages(self):
+        """Checks that walking through pages returns all objects, newest first"""
+        cases = [
+            ('/api/v1/view_points/', models.ViewPoint),
+            ('/api/v1/notes/', models.Note),
+            ('/api/v1/remarks/', models.Remark),
+        ]
+        for url, model in cases:
+            with self.subTest(msg=url):
+                pks = []
+                page = self.client.get(url, {'page_size': 2}).json()
+                while True:
+                    self.assertLessEqual(len(page['results']), 2)
+                    pks.extend(item['url'].rstrip('/').rsplit('/', 1)[1] for item in page['results'])
+                    if not page['next']:
+                        break
+                    page = self.client.get(page['next']).json()
+                expected = model.objects.order_by('-creation_time', '-pk').values_list('pk', flat=True)
+                self.assertEqual(pks, [str(pk) for pk in expected])
+
+
+class FiltersTest(APISetUp):
+    """Tests for server-side filters of view points, notes and remarks"""
+    def setUp(self) -> None:
+        super(FiltersTest, self).setUp()
+        self.add_models()
+        self.model2 = models.Model3D.objects.exclude(pk=self.model1.pk).get()
+        models.Remark.objects.filter(view_point__model=self.model2).update(speciality='Process')
+        self.view_point = self.model1.view_points.first()
+
+    def get_count(self, url: str, params: dict) -> int:
+        """Returns a number of objects returned by an endpoint with given query parameters"""
+        response = self.client.get(url, {'page_size': 1000, **params})
+        self.assertEqual(response.status_code, 200)
+        return len(response.json()['results'])
+
+    def test_filters(self):
+        """Checks that filters return only matching objects"""
+        cases = [
+            ('/api/v1/view_points/', {'model': self.model1.pk}, 3),
+            ('/api/v1/view_points/', {'created_after': self.view_point.creation_time.isoformat()}, 4),
+            ('/api/v1/view_points/', {'created_before': '2000-01-01T00:00:00Z'}, 0),
+            ('/api/v1/notes/', {'view_point': self.view_point.pk}, 2),
+            ('/api/v1/remarks/', {'speciality': 'HVAC'}, 3),
+            ('/api/v1/remarks/', {'speciality': 'HVAC', 'model': self.model2.pk}, 0),
+            ('/api/v1/remarks/', {'status': 'Uncompleted', 'model': self.model2.pk}, 3),
+            ('/api/v1/remarks/', {'deadline_after': '2030-01-01', 'deadline_before': '2030-01-01'}, 6),
+            ('/api/v1/remarks/', {'deadline_after': '2030-01-02'}, 0),
+        ]
+        for url, params, count in cases:
+            with self.subTest(msg=f'{url} {params}'):
+                self.assertEqual(self.get_count(url, params), count)
+
+    def test_wrong_values(self):
+        """Checks that wrong values of filters are rejected"""
+        cases = [
+            ('/api/v1/view_points/', {'model': 'first'}),
+            ('/api/v1/view_points/', {'created_after': 'yesterday'}),
+            ('/api/v1/remarks/', {'speciality': 'Civil'}),
+        ]
+        for url, params in cases:
+            with self.subTest(msg=f'{url} {params}'):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(list(params)[0], response.json())
+
+
+class ConditionalGetTest(APISetUp):
+    """Tests for conditional requests to EasyView API endpoints"""
+    def test_not_modified(self):
+        """Checks that unchanged data is answered with 304 without queries"""
+        for url in ('/api/v1/view_points/', f'/api/v1/view_points/{self.model1.view_points.first().pk}/'):
+            with self.subTest(msg=url):
+                etag = self.client.get(url)['ETag']
+                with self.assertNumQueries(0):
+                    response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+
+    def test_modified(self):
+        """Checks that changes of related rows and different queries give new validators"""
+        url = '/api/v1/view_points/'
+        etag = self.client.get(url)['ETag']
+        self.assertNotEqual(self.client.get(url, {'model': self.model1.pk})['ETag'], etag)
+        note = models.Note.objects.first()
+        note.text = 'Changed note'
+        note.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_modified_since(self):
+        """Checks that Last-Modified can be used for revalidation"""
+        response = self.client.get('/api/v1/remarks/')
+        response = self.client.get('/api/v1/remarks/', HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+
+class BatchTest(APISetUp):
+    """Tests for batch endpoints of view points, notes and remarks"""
+    def setUp(self) -> None:
+        super(BatchTest, self).setUp()
+        self.client.force_login(User.objects.create_user('reviewer'))
+        self.view_points = list(models.ViewPoint.objects.order_by('pk'))
+
+    def count_queries(self, method: str, url: str, data=None) -> int:
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, content_type='application/json')
+        self.assertLess(response.status_code, 300, response.content)
+        return len(queries.captured_queries)
+
+    def get_notes(self, view_point: models.ViewPoint, count: int) -> list:
+        url = f'http://testserver/api/v1/view_points/{view_point.pk}/'
+        return [{'view_point': url, 'text': f'Batch note {i}', 'position': [i, i, i]} for i in range(count)]
+
+    def test_fetch(self):
+        """Checks that rows are fetched in requested order by a fixed number of queries"""
+        pks = [view_point.pk for view_point in reversed(self.view_points)]
+        response = self.client.get('/api/v1/view_points/batch/', {'ids': f'{pks[0]},999999,{pks[1]}'})
+        self.assertEqual([view_point['pk'] for view_point in response.json()], pks[:2])
+        url = '/api/v1/view_points/batch/?ids='
+        self.assertEqual(
+            self.count_queries('get', url + str(pks[0])), self.count_queries('get', url + ','.join(map(str, pks))),
+        )
+        self.assertIn('ids', self.client.get('/api/v1/notes/batch/', {'ids': 'a'}).json())
+
+    def test_create(self):
+        """Checks that rows are created by a fixed number of queries and a batch with an invalid row is refused"""
+        url = '/api/v1/notes/batch/'
+        etag = self.client.get('/api/v1/notes/')['ETag']
+        self.assertEqual(
+            self.count_queries('post', url, self.get_notes(self.view_points[0], 2)),
+            self.count_queries('post', url, self.get_notes(self.view_points[1], 20)),
+        )
+        self.assertEqual(self.view_points[1].notes.filter(text__startswith='Batch').count(), 20)
+        self.assertNotEqual(self.client.get('/api/v1/notes/')['ETag'], etag)
+        count = models.Note.objects.count()
+        notes = self.get_notes(self.view_points[0], 2) + [{'view_point': 'http://testserver/api/v1/view_points/0/'}]
+        response = self.client.post(url, notes, content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()[:2], [{}, {}])
+        self.assertEqual(models.Note.objects.count(), count)
+
+    def test_update(self):
+        """Checks that rows given by PKs or URLs are updated at once and a conflicting batch changes nothing"""
+        notes = self.client.get('/api/v1/notes/batch/', {
+            'ids': ','.join(str(note.pk) for note in models.Note.objects.all()),
+        }).json()
+        changes = [{'url': note['url'], 'text': f'Changed {i}'} for i, note in enumerate(notes)]
+        self.assertEqual(
+            self.count_queries('patch', '/api/v1/notes/batch/', changes[:1]),
+            self.count_queries('patch', '/api/v1/notes/batch/', changes),
+        )
+        self.assertEqual(models.Note.objects.filter(text__startswith='Changed').count(), len(notes))
+        remarks = list(models.Remark.objects.order_by('pk'))
+        response = self.client.patch('/api/v1/remarks/batch/', [
+            {'pk': remarks[0].pk, 'status': 'Completed'},
+            {'pk': remarks[1].pk, 'view_point': f'http://testserver/api/v1/view_points/{self.view_points[0].pk}/'},
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('non_field_errors', response.json())
+        self.assertFalse(models.Remark.objects.filter(status='Completed').exists())
+        response = self.client.patch('/api/v1/remarks/batch/', [
+            {'pk': remarks[0].pk, 'status': 'Completed'}, {'pk': 999999, 'status': 'Completed'},
+        ], content_type='application/json')
+        self.assertIn('ids', response.json())
+
+    def test_delete(self):
+        """Checks that rows are deleted with related ones and nothing is deleted if some rows are missing"""
+        pks = [view_point.pk for view_point in self.view_points]
+        response = self.client.delete(f'/api/v1/view_points/batch/?ids={pks[0]},999999')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(models.ViewPoint.objects.count(), 3)
+        remark = models.Remark.objects.get(view_point=self.view_points[2])
+        self.assertEqual(self.client.delete(f'/api/v1/remarks/batch/?ids={remark.pk}').status_code, 204)
+        self.assertEqual(self.client.delete(f'/api/v1/view_points/batch/?ids={pks[0]},{pks[1]}').status_code, 204)
+        self.assertEqual(list(models.ViewPoint.objects.values_list('pk', flat=True)), [pks[2]])
+        self.assertEqual(models.Note.objects.count(), 2)
+        self.assertFalse(models.Remark.objects.exists())
+
+
+class RemarksRegisterTest(APISetUp):
+    """Tests for a streamed register of remarks"""
+    def get_rows(self, **params) -> list:
+        response = self.client.get('/api/v1/remarks/register/', params)
+        self.assertEqual(response.status_code, 200)
+        if params.get('file_type') != 'xlsx':
+            return list(csv.reader(b''.join(response.streaming_content).decode('utf-8-sig').splitlines()))
+        with zipfile.ZipFile(io.BytesIO(b''.join(response.streaming_content))) as archive:
+            sheet = ElementTree.fromstring(archive.read(register.SHEET_NAME))
+        namespace = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+        return [
+            [''.join(cell.itertext()) for cell in row.iter(f'{namespace}c')]
+            for row in sheet.iter(f'{namespace}row')
+        ]
+
+    def test_csv(self):
+        """Checks that remarks are exported with names of choices and URLs of their view points"""
+        self.add_models()
+        rows = self.get_rows()
+        self.assertEqual(rows[0], register.COLUMNS)
+        self.assertEqual(len(rows), 7)
+        remark = models.Remark.objects.select_related('view_point').get(pk=rows[1][0])
+        self.assertEqual(rows[1][4], 'Вентиляция')
+        self.assertEqual(rows[1][-1], remark.view_point.get_absolute_url())
+        rows = self.get_rows(project=self.project2.pk)
+        self.assertEqual({row[2] for row in rows[1:]}, {'20UJA'})
+        self.assertEqual(len(self.get_rows(building=self.building1_1.pk, speciality='Process')), 1)
+
+    def test_csv_formulas(self):
+        """Checks that texts of remarks are not taken for formulas by spreadsheets"""
+        remark = models.Remark.objects.first()
+        remark.description = '=HYPERLINK("http://example.com")'
+        remark.comment = '-1'
+        remark.save()
+        row = next(row for row in self.get_rows() if row[0] == str(remark.pk))
+        self.assertEqual((row[3], row[7]), ('\'=HYPERLINK("http://example.com")', "'-1"))
+        self.assertEqual(row[8], '2030-01-01')
+
+    def test_xlsx(self):
+        """Checks that a workbook keeps numbers as numbers and texts that are not safe for XML"""
+        remark = models.Remark.objects.first()
+        remark.description = '<Remark> & "quotes"\x0b'
+        remark.save()
+        rows = self.get_rows(file_type='xlsx')
+        self.assertEqual(rows[0], register.COLUMNS)
+        self.assertEqual(len(rows), 4)
+        self.assertIn(['<Remark> & "quotes"', str(remark.pk)], [[row[3], row[0]] for row in rows])
+        self.assertIn('file_type', self.client.get('/api/v1/remarks/register/', {'file_type': 'pdf'}).json())
+
+
+class RemarkCountersTest(APISetUp):
+    """Tests for counters of remarks and statistics of remarks that are summed up of them"""
+    def setUp(self) -> None:
+        super(RemarkCountersTest, self).setUp()
+        self.client.force_login(User.objects.create_user('reviewer'))
+
+    def assertCountersMatch(self):
+        """Checks that counters are equal to numbers of remarks counted again"""
+        counters = {
+            (counter.model_id, counter.speciality, counter.status, counter.deadline): counter.count
+            for counter in models.RemarkCounter.objects.all()
+        }
+        self.assertEqual(counters, dict(remark_counters.get_counter_keys(models.Remark.objects.all())))
+
+    def test_counters(self):
+        """Checks that counters follow remarks that are created, updated and deleted one by one and by batches"""
+        self.assertEqual(list(models.RemarkCounter.objects.values_list('count', flat=True)), [3])
+        remarks = list(models.Remark.objects.order_by('pk'))
+        response = self.client.patch(
+            f'/api/v1/remarks/{remarks[0].pk}/', {'status': 'Completed', 'deadline': '2020-01-01'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertCountersMatch()
+        self.add_models()
+        view_point = models.ViewPoint.objects.create(model=self.model1, position=[0, 0, 0], quaternion=[0, 0, 0, 1])
+        remarks[1].view_point = view_point
+        remarks[1].speciality = 'Process'
+        remarks[1].save()
+        self.assertCountersMatch()
+        response = self.client.patch('/api/v1/remarks/batch/', [
+            {'pk': remarks[1].pk, 'status': 'Completed'}, {'pk': remarks[2].pk, 'deadline': '2020-01-01'},
+        ], content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertCountersMatch()
+        self.assertEqual(self.client.delete(f'/api/v1/remarks/{remarks[0].pk}/').status_code, 204)
+        self.assertEqual(self.client.delete(f'/api/v1/remarks/batch/?ids={remarks[1].pk}').status_code, 204)
+        self.assertCountersMatch()
+        remarks[2].view_point.delete()
+        self.assertCountersMatch()
+        self.assertEqual(models.RemarkCounter.objects.count(), 1)
+
+    def test_rebuild(self):
+        """Checks that the command replaces wrong counters with numbers of remarks"""
+        self.add_models()
+        models.RemarkCounter.objects.update(count=100)
+        models.RemarkCounter.objects.create(
+            model=self.model1, speciality='Process', status='Completed', deadline=datetime.date(2020, 1, 1), count=1,
+        )
+        output = io.StringIO()
+        call_command('rebuild_remark_counters', stdout=output)
+        self.assertIn('2 counters', output.getvalue())
+        self.assertCountersMatch()
+
+    def test_statistics(self):
+        """Checks that numbers of remarks of buildings and projects are summed up by one query"""
+        self.add_models()
+        remark = models.Remark.objects.filter(view_point__model=self.model1).first()
+        remark.deadline = datetime.date(2020, 1, 1)
+        remark.save()
+        with self.assertNumQueries(1):
+            projects = remark_counters.get_remark_statistics()
+        self.assertEqual({project['pk']: (project['total'], project['overdue']) for project in projects}, {
+            self.project1.pk: (3, 1), self.project2.pk: (3, 0),
+        })
+        response = self.client.get('/api/v1/remarks/statistics/', {'project': self.project1.pk})
+        self.assertEqual(response.status_code, 200)
+        project, = response.json()
+        self.assertEqual(project['url'], f'http://testserver/api/v1/projects/{self.project1.pk}/')
+        building, = project['buildings']
+        self.assertEqual(building['kks'], self.building1_1.kks)
+        self.assertEqual(building['by_speciality']['HVAC'], 3)
+        self.assertEqual(building['by_status'], {'Uncompleted': 3, 'Completed': 0})
+        response = self.client.get('/api/v1/remarks/statistics/', {'date': '2019-01-01'})
+        self.assertEqual([project['overdue'] for project in response.json()], [0, 0])
+        self.assertIn('date', self.client.get('/api/v1/remarks/statistics/', {'date': 'today'}).json())
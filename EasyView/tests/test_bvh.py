@@ -0,0 +1,93 @@
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from django.core.files.base import ContentFile
+
+from EasyView import bvh, models, optimization, tasks
+from EasyView.gltf import Gltf
+from EasyView.tests.test_import_export import ViewPointsSetUp
+from EasyView.tests.test_optimization import make_plate_gltf
+
+
+def read_bvh(data: bytes) -> list:
+    """Parses a packed file into a list of tuples of a mesh index, nodes and indices of every primitive"""
+    magic, version, count = bvh.HEADER.unpack_from(data)
+    assert magic == bvh.MAGIC and version == bvh.VERSION
+    offset, primitives = bvh.HEADER.size, []
+    for _ in range(count):
+        mesh, _, index_count, index_size, node_count = bvh.PRIMITIVE_HEADER.unpack_from(data, offset)
+        offset += bvh.PRIMITIVE_HEADER.size
+        nodes = np.frombuffer(data, bvh.NODE, node_count, offset)
+        offset += nodes.nbytes
+        indices = np.frombuffer(data, f'<u{index_size}', index_count, offset)
+        offset += indices.nbytes + (-indices.nbytes % 4)
+        primitives.append((mesh, nodes, indices))
+    assert offset == len(data)
+    return primitives
+
+
+class BVHTest(ViewPointsSetUp):
+    """Tests for building of bounding volume hierarchies"""
+    def test_tree(self):
+        """Checks that every triangle gets into exactly one leaf that contains it"""
+        source = Gltf.load(optimization.optimize_gltf(Gltf.load(make_plate_gltf())))
+        primitive = source.document['meshes'][0]['primitives'][0]
+        positions = source.read_accessor(primitive['attributes']['POSITION']).astype(np.float64)
+        indices = source.read_accessor(primitive['indices'])[:, 0]
+        nodes, reordered = bvh.build_tree(positions, indices)
+        triangles = reordered.reshape(-1, 3)
+        self.assertEqual(
+            sorted(map(tuple, triangles.tolist())), sorted(map(tuple, indices.reshape(-1, 3).tolist())),
+        )
+        leaves = nodes[nodes['flag'] == bvh.LEAF_FLAG]
+        self.assertTrue(all(leaf['count'] <= bvh.MAX_LEAF_TRIANGLES for leaf in leaves))
+        covered = np.zeros(len(triangles), dtype=int)
+        for leaf in leaves:
+            covered[leaf['offset']:leaf['offset'] + leaf['count']] += 1
+            corners = positions[triangles[leaf['offset']:leaf['offset'] + leaf['count']]].reshape(-1, 3)
+            self.assertTrue(np.all(corners >= leaf['bounds'][:3]) and np.all(corners <= leaf['bounds'][3:]))
+        self.assertTrue(np.all(covered == 1))
+        # the left child follows its parent, the right one is found by its offset
+        inner = nodes.view(bvh.INNER_NODE)
+        for position in np.flatnonzero(nodes['flag'] != bvh.LEAF_FLAG):
+            right = inner[position]['right'] * 4 // bvh.NODE.itemsize
+            for child in (position + 1, right):
+                self.assertTrue(np.all(nodes[child]['bounds'][:3] >= nodes[position]['bounds'][:3]))
+                self.assertTrue(np.all(nodes[child]['bounds'][3:] <= nodes[position]['bounds'][3:]))
+
+    def test_coincident_triangles(self):
+        """Checks that triangles with the same centroid are split into small leaves instead of one huge leaf"""
+        positions = np.float64([[0, 0, 0], [1, 0, 0], [0, 1, 0]])
+        for count in (30, 70000):
+            nodes, reordered = bvh.build_tree(positions, np.tile(np.uint32([0, 1, 2]), count))
+            leaves = nodes[nodes['flag'] == bvh.LEAF_FLAG]
+            self.assertEqual(int(leaves['count'].astype(int).sum()), count)
+            self.assertLessEqual(int(leaves['count'].max()), bvh.MAX_LEAF_TRIANGLES)
+            self.assertEqual(len(reordered), count * 3)
+
+    def test_build(self):
+        """Checks that hierarchies are built of level 0 and rebuilt when contents of a model are changed"""
+        with TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root):
+            self.model1.gltf.save('plate.glb', ContentFile(make_plate_gltf()))
+            optimization.build_lods(self.model1)
+            name = tasks.build_bvh_task.apply(args=(self.model1.pk,)).get()
+            self.assertTrue(name.endswith('.lod0.bvh'))
+            self.assertIsNone(bvh.build_bvh(self.model1))
+            artefact = models.ModelArtefact.objects.get(model=self.model1, kind=models.ModelArtefact.BVH)
+            lod = models.ModelArtefact.objects.get(model=self.model1, kind=models.ModelArtefact.LOD, level=0)
+            data = artefact.file.read()
+            primitives = read_bvh(data)
+            lod_meshes = Gltf.load(lod.file.read()).document['meshes']
+            self.assertEqual(len(primitives), sum(len(mesh['primitives']) for mesh in lod_meshes))
+            self.assertEqual(sum(len(indices) for _, _, indices in primitives), 2 * 20 * 20 * 3)
+            model = self.client.get(f'/api/v1/models/{self.model1.pk}/').json()
+            response = self.client.get(model['gltf_bvh'])
+            self.assertEqual(b''.join(response.streaming_content), data)
+            # hierarchies survive updates of the model that keep contents of its file
+            self.model1.save()
+            optimization.build_lods(self.model1)
+            self.assertIsNone(bvh.build_bvh(self.model1))
+            self.model1.gltf.save('plate.glb', ContentFile(make_plate_gltf(size=10)))
+            optimization.build_lods(self.model1)
+            self.assertIsNotNone(bvh.build_bvh(self.model1))
+            self.assertEqual(models.ModelArtefact.objects.filter(kind=models.ModelArtefact.BVH).count(), 1)
@@ -0,0 +1,96 @@
+import gzip
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import brotli
+from django.core.files.base import ContentFile
+from django.test import override_settings
+from django.urls import reverse
+
+from EasyView import delivery, tasks
+from EasyView.tests.test_import_export import ViewPointsSetUp
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class DeliveryTest(ViewPointsSetUp):
+    """Tests for delivery of model files"""
+    def setUp(self) -> None:
+        super(DeliveryTest, self).setUp()
+        self.media_root = TemporaryDirectory()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+        self.content = b'glTF' + bytes(range(256)) * 100
+        self.model1.gltf.save('model.glb', ContentFile(self.content))
+        self.url = reverse('model_file', kwargs={'pk': self.model1.pk, 'kind': 'gltf'})
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        self.media_root.cleanup()
+        super(DeliveryTest, self).tearDown()
+
+    def test_full_file(self):
+        """Checks that a whole file is sent with validators"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Content-Type'], 'model/gltf-binary')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_ranges(self):
+        """Checks that single byte ranges are sent and wrong ones are rejected"""
+        size = len(self.content)
+        cases = [
+            ('bytes=0-3', 206, self.content[:4]),
+            ('bytes=100-', 206, self.content[100:]),
+            ('bytes=-10', 206, self.content[-10:]),
+            ('bytes=10-5000000', 206, self.content[10:]),
+            ('bytes=0-1,5-6', 200, self.content),
+            (f'bytes={size}-', 416, b''),
+        ]
+        for header, status, content in cases:
+            with self.subTest(msg=header):
+                response = self.client.get(self.url, HTTP_RANGE=header)
+                self.assertEqual(response.status_code, status)
+                body = b''.join(response.streaming_content) if response.streaming else response.content
+                self.assertEqual(body, content)
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-3')
+        self.assertEqual(response['Content-Range'], f'bytes 0-3/{size}')
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-3', HTTP_IF_RANGE='"outdated"')
+        self.assertEqual(response.status_code, 200)
+
+    def test_precompressed(self):
+        """Checks that precompressed variants are built once and sent to clients that accept them"""
+        saved = tasks.compress_model_files_task.apply(args=(self.model1.pk,)).get()
+        self.assertEqual(len(saved), 2)
+        self.assertEqual(delivery.compress_model_file(self.model1.gltf), [])
+        identity_etag = self.client.get(self.url)['ETag']
+        decompress = {'br': brotli.decompress, 'gzip': gzip.decompress}
+        for encoding, function in decompress.items():
+            with self.subTest(msg=encoding):
+                response = self.client.get(self.url, HTTP_ACCEPT_ENCODING=f'{encoding}, identity')
+                self.assertEqual(response['Content-Encoding'], encoding)
+                self.assertIn('Accept-Encoding', response['Vary'])
+                self.assertNotEqual(response['ETag'], identity_etag)
+                self.assertEqual(function(b''.join(response.streaming_content)), self.content)
+
+    def test_sendfile(self):
+        """Checks that a proxy is asked to send a file in sendfile mode"""
+        with mock.patch.object(delivery, 'MODEL_FILES_SENDFILE', 'X-Accel-Redirect'):
+            response = self.client.get(self.url)
+        self.assertEqual(response['X-Accel-Redirect'], delivery.MODEL_FILES_ACCEL_LOCATION + self.model1.gltf.name)
+        self.assertEqual(response.content, b'')
+
+    def test_missing_file(self):
+        """Checks that missing files and unknown kinds of files are not found"""
+        for kind in ('nwd', 'building'):
+            with self.subTest(msg=kind):
+                response = self.client.get(reverse('model_file', kwargs={'pk': self.model1.pk, 'kind': kind}))
+                self.assertEqual(response.status_code, 404)
+
+    def test_attachment(self):
+        """Checks that a .nwd file is saved by a browser under a name of a building, not of a blob"""
+        self.model1.nwd.save('model.nwd', ContentFile(b'nwd'))
+        response = self.client.get(reverse('model_file', kwargs={'pk': self.model1.pk, 'kind': 'nwd'}))
+        self.assertEqual(response['Content-Disposition'], f'attachment; filename="{self.building1_1.slug}.nwd"')
@@ -0,0 +1,93 @@
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+
+from EasyView import feed, models
+from EasyView.tests.test_import_export import ViewPointsSetUp
+
+
+class ViewPointsFeedTest(ViewPointsSetUp):
+    """Tests for binary feed of view points"""
+    def setUp(self) -> None:
+        super(ViewPointsFeedTest, self).setUp()
+        cache.clear()
+        self.view_points[2].clip_constants_status = [True, False, True, False, False, False]
+        self.view_points[2].clip_constants = [1, 2, 3, 4, 5, 6]
+        self.view_points[2].distance_to_target = 10
+        self.view_points[2].save()
+        self.url = reverse('model3d-view-points-feed', kwargs={'pk': self.model1.pk})
+
+    def unpack(self, data: bytes) -> tuple:
+        """Unpacks the feed into primary keys, camera states and clip statuses"""
+        magic, version, count, stride = feed.HEADER.unpack_from(data)
+        self.assertEqual((magic, version, stride), (feed.MAGIC, feed.VERSION, feed.CAMERA_STRIDE))
+        offset = feed.HEADER.size
+        pks = np.frombuffer(data, dtype='<i8', count=count, offset=offset)
+        offset += pks.nbytes
+        cameras = np.frombuffer(data, dtype='<f4', count=count * stride, offset=offset).reshape(count, stride)
+        offset += cameras.nbytes
+        statuses = np.frombuffer(data, dtype=np.uint8, count=count, offset=offset)
+        self.assertEqual(offset + statuses.nbytes, len(data))
+        return pks, cameras, statuses
+
+    def test_feed(self):
+        """Checks that all view points are packed correctly"""
+        pks, cameras, statuses = self.unpack(self.client.get(self.url).content)
+        self.assertEqual(list(pks), sorted(view_point.pk for view_point in self.view_points))
+        clipped = list(pks).index(self.view_points[2].pk)
+        self.assertEqual(list(cameras[clipped, :3]), [2, 2, 2])
+        self.assertEqual(list(cameras[clipped, 3:7]), [0, 0, 0, 1])
+        self.assertEqual(list(cameras[clipped, 7:9]), [60, 10])
+        self.assertEqual(list(cameras[clipped, 9:]), [1, 2, 3, 4, 5, 6])
+        self.assertEqual(statuses[clipped], 0b101)
+        self.assertTrue(np.isnan(cameras[0, 8:]).all())
+        self.assertEqual(statuses[0], 0)
+
+    def test_empty_feed(self):
+        """Checks a feed of a model without view points"""
+        models.ViewPoint.objects.all().delete()
+        pks, cameras, statuses = self.unpack(self.client.get(self.url).content)
+        self.assertEqual(len(pks), 0)
+
+    def test_feed_is_cached(self):
+        """Checks that the feed is packed once and repacked when view points are changed"""
+        self.client.get(self.url)
+        with self.assertNumQueries(1):  # the model itself
+            self.client.get(self.url)
+        self.view_points[0].delete()
+        pks, _, _ = self.unpack(self.client.get(self.url).content)
+        self.assertEqual(len(pks), len(self.view_points) - 1)
+
+    def test_malformed_arrays(self):
+        """Checks that short arrays are refused by the API and rows that have them don't break the feed"""
+        self.client.force_login(User.objects.create_user('reviewer'))
+        view_point = self.client.get(f'/api/v1/view_points/{self.view_points[0].pk}/').json()
+        for field, value in [('position', [1, 2]), ('quaternion', [0, 0, 1]), ('clip_constants', [1, 2, 3])]:
+            response = self.client.patch(view_point['url'], {field: value}, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn(field, response.json())
+        models.ViewPoint.objects.filter(pk=self.view_points[2].pk).update(
+            position=[1, 2], clip_constants_status=[True], clip_constants=[1, 2, 3],
+        )
+        pks, cameras, statuses = self.unpack(self.client.get(self.url).content)
+        self.assertEqual(len(pks), len(self.view_points))
+        malformed = list(pks).index(self.view_points[2].pk)
+        self.assertTrue(np.isnan(cameras[malformed, :3]).all())
+        self.assertEqual(list(cameras[malformed, 3:8]), [0, 0, 0, 1, 60])
+        self.assertTrue(np.isnan(cameras[malformed, 9:]).all())
+        self.assertEqual(statuses[malformed], 0)
+
+    def test_moved_view_point(self):
+        """Checks that feeds of both models are repacked when a view point is moved to another model"""
+        model2 = models.Model3D.objects.create(building=self.building1_2)
+        url2 = reverse('model3d-view-points-feed', kwargs={'pk': model2.pk})
+        self.client.get(self.url)
+        self.client.get(url2)
+        self.view_points[0].model = model2
+        self.view_points[0].save()
+        pks, _, _ = self.unpack(self.client.get(self.url).content)
+        self.assertNotIn(self.view_points[0].pk, pks)
+        pks, _, _ = self.unpack(self.client.get(url2).content)
+        self.assertEqual(list(pks), [self.view_points[0].pk])
@@ -0,0 +1,116 @@
+import re
+import datetime
+from tempfile import TemporaryFile
+from xml.etree.ElementTree import ParseError
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from AtomproektBase.test.test_models import SetUp
+
+from EasyView import models, import_export
+
+
+class ViewPointsSetUp(SetUp):
+    """Setup with a model that has some view points"""
+    def setUp(self) -> None:
+        super(ViewPointsSetUp, self).setUp()
+        self.model1 = models.Model3D.objects.create(
+            building=self.building1_1,
+        )
+        self.view_points = [
+            models.ViewPoint.objects.create(
+                description=f'Point {i}',
+                model=self.model1,
+                position=[i, i, i],
+                quaternion=[0, 0, 0, 1],
+            ) for i in range(5)
+        ]
+        self.remark = models.Remark.objects.create(
+            view_point=self.view_points[1],
+            description='Remark',
+            speciality='HVAC',
+            reviewer='Reviewer',
+            deadline=datetime.date(2030, 1, 1),
+            status='Uncompleted',
+        )
+        self.clean_all()
+
+
+class ExportTest(ViewPointsSetUp):
+    """Tests for export of view points to Navisworks"""
+    def test_export_names(self):
+        """Checks that view points are exported in requested order and named after remarks if they have ones"""
+        pk_list = [str(self.view_points[2].pk), self.view_points[1].pk, 0, self.view_points[0].pk]
+        xml = import_export.create_exported_viewpoints_xml(pk_list)
+        names = [view.get('name') for view in xml.getroot()[0]]
+        self.assertEqual(names, ['Point 2', 'Remark', 'Point 0'])
+
+    def test_export_queries(self):
+        """Checks that the number of queries doesn't depend on the number of exported view points"""
+        with self.assertNumQueries(1):
+            import_export.create_exported_viewpoints_xml([view_point.pk for view_point in self.view_points])
+
+    def test_templates_are_not_changed(self):
+        """Checks that cached templates stay clean after export"""
+        import_export.create_exported_viewpoints_xml([self.view_points[0].pk])
+        self.assertEqual(len(import_export.get_general_template().getroot()[0]), 0)
+        self.assertEqual(import_export.get_viewpoint_template().get('name'), '')
+
+    def test_streamed_export(self):
+        """Checks that streamed export gives the same file as the usual one"""
+        pk_list = [self.view_points[3].pk, self.view_points[1].pk, self.view_points[4].pk, self.view_points[3].pk]
+        with TemporaryFile() as tf:
+            import_export.create_exported_viewpoints_xml(pk_list).write(tf)
+            tf.seek(0)
+            expected = tf.read()
+        streamed = b''.join(import_export.stream_exported_viewpoints_xml(pk_list))
+        guid = re.compile(rb'guid="[^"]*"')
+        self.assertEqual(guid.sub(b'', streamed), guid.sub(b'', expected))
+
+    def test_streamed_export_view(self):
+        """Checks that export view streams a file if asked to"""
+        response = self.client.get(
+            reverse('view_points_export'),
+            {'viewpoints_pk_list': f'{self.view_points[0].pk}', 'stream': '1'},
+        )
+        self.assertTrue(response.streaming)
+        self.assertIn(b'Point 0', b''.join(response.streaming_content))
+        for pk_list in ('', f'{self.view_points[0].pk},a'):
+            response = self.client.get(reverse('view_points_export'), {'viewpoints_pk_list': pk_list, 'stream': '1'})
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(reverse('view_points_export')).status_code, 400)
+
+
+class ImportTest(ViewPointsSetUp):
+    """Tests for import of view points from Navisworks"""
+    def get_exported_file(self) -> SimpleUploadedFile:
+        """Returns a file with all view points exported"""
+        content = b''.join(import_export.stream_exported_viewpoints_xml([vp.pk for vp in self.view_points]))
+        return SimpleUploadedFile('export.xml', content)
+
+    def test_import(self):
+        """Checks that imported view points are the same as exported ones"""
+        pks_list = import_export.import_navisworks_viewpoints(self.get_exported_file(), self.model1.pk)
+        imported = models.ViewPoint.objects.in_bulk(pks_list)
+        self.assertEqual(len(pks_list), len(self.view_points))
+        for pk, view_point in zip(pks_list, self.view_points):
+            with self.subTest(msg=view_point.description):
+                self.assertEqual(imported[pk].position, view_point.position)
+                self.assertEqual(imported[pk].model_id, self.model1.pk)
+
+    def test_import_batches(self):
+        """Checks that view points are inserted by batches"""
+        with CaptureQueriesContext(connection) as context:
+            import_export.import_navisworks_viewpoints(self.get_exported_file(), self.model1.pk, batch_size=2)
+        inserts = [query for query in context.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 3)
+
+    def test_broken_import(self):
+        """Checks that nothing is saved if a file is broken"""
+        content = self.get_exported_file().read().replace(b'</exchange>', b'')
+        with self.assertRaises(ParseError):
+            import_export.import_navisworks_viewpoints(SimpleUploadedFile('broken.xml', content), self.model1.pk, 2)
+        self.assertEqual(models.ViewPoint.objects.count(), len(self.view_points))
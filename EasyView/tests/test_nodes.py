@@ -0,0 +1,88 @@
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from django.core.files.base import ContentFile
+
+from EasyView import models, nodes, optimization, tasks
+from EasyView.gltf import ARRAY_BUFFER, Gltf, GltfWriter
+from EasyView.tests.test_import_export import ViewPointsSetUp
+from EasyView.tests.test_optimization import make_plate_gltf
+
+
+def make_system_gltf() -> bytes:
+    """Returns a .glb file with a group of a system with three unit boxes, codes are given by names and extras"""
+    document = {
+        'asset': {'version': '2.0'},
+        'scene': 0,
+        'scenes': [{'nodes': [0, 3]}],
+        'nodes': [
+            {'name': '10JRT', 'children': [1, 2], 'translation': [10, 0, 0]},
+            {'name': '10JRT10 BR001', 'mesh': 0},
+            {'name': 'Pipe', 'mesh': 0, 'extras': {'KKS': '10 JRT 20 BR001'}, 'translation': [0, 5, 0]},
+            {'name': '10KAA10', 'mesh': 0, 'scale': [2, 2, 2]},
+        ],
+        'meshes': [{'primitives': [{'attributes': {}}]}],
+    }
+    writer = GltfWriter(document)
+    triangles = np.float32([[0, 0, 0], [1, 0, 0], [1, 1, 1], [0, 0, 0], [1, 1, 1], [0, 1, 1]])
+    document['meshes'][0]['primitives'][0]['attributes']['POSITION'] = writer.add_accessor(
+        triangles, ARRAY_BUFFER, bounds=True,
+    )
+    return writer.to_glb()
+
+
+class NodeIndexTest(ViewPointsSetUp):
+    """Tests for an index of nodes of glTF files by KKS codes"""
+    def test_extract(self):
+        """Checks that codes are found in names and extras, and bounds of groups include their children"""
+        extracted = {node['index']: node for node in nodes.extract_nodes(Gltf.load(make_system_gltf()))}
+        self.assertEqual(
+            [extracted[index]['kks'] for index in range(4)], ['10JRT', '10JRT10BR001', '10JRT20BR001', '10KAA10'],
+        )
+        self.assertEqual(extracted[2]['parent'], 0)
+        np.testing.assert_allclose(extracted[1]['bounds'], [[10, 0, 0], [11, 1, 1]])
+        np.testing.assert_allclose(extracted[0]['bounds'], [[10, 0, 0], [11, 6, 1]])
+        np.testing.assert_allclose(extracted[3]['bounds'], [[0, 0, 0], [2, 2, 2]])
+        self.assertEqual(nodes.get_node_kks('=10 jrt', None), '10JRT')
+
+    def test_find(self):
+        """Checks that nodes are found by prefixes of codes with their system and are indexed once"""
+        with TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root):
+            self.model1.gltf.save('system.glb', ContentFile(make_system_gltf()))
+            self.assertEqual(tasks.index_model_nodes_task.apply(args=(self.model1.pk,)).get(), 4)
+            self.assertEqual(nodes.build_node_index(self.model1), 0)
+            response = self.client.get(f'/api/v1/models/{self.model1.pk}/nodes/', {'kks': '10jrt'})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), {
+                'kks': '10JRT',
+                'nodes': [0],
+                'min': [10, 0, 0],
+                'max': [11, 6, 1],
+                'system': f'http://testserver/api/v1/systems/{self.system1_1.pk}/',
+            })
+            found = nodes.find_nodes(self.model1, '10JRT20')
+            self.assertEqual((found['nodes'], found['system']), ([2], self.system1_1))
+            found = nodes.find_nodes(self.model1, '10UJA')
+            self.assertEqual((found['nodes'], found['min'], found['system']), ([], None, None))
+            response = self.client.get(f'/api/v1/models/{self.model1.pk}/nodes/', {'kks': '='})
+            self.assertIn('kks', response.json())
+            # the index is replaced when contents of the file are changed
+            self.model1.gltf.save('plate.glb', ContentFile(make_plate_gltf()))
+            self.assertEqual(nodes.build_node_index(self.model1), 2)
+            self.assertEqual(models.ModelNode.objects.filter(model=self.model1).count(), 2)
+            # nodes are dropped when the file is cleared, also by a job that was started before
+            models.Model3D.objects.filter(pk=self.model1.pk).update(gltf=None)
+            self.assertEqual(tasks.index_model_nodes_task.apply(args=(self.model1.pk,)).get(), 0)
+            self.assertFalse(models.ModelNode.objects.filter(model=self.model1).exists())
+            self.model1.gltf.save('plate.glb', ContentFile(make_plate_gltf()))
+            self.assertEqual(nodes.build_node_index(self.model1), 2)
+            self.model1.gltf = None
+            self.model1.save()
+            self.assertFalse(models.ModelNode.objects.filter(model=self.model1).exists())
+
+    def test_optimized_indices(self):
+        """Checks that indices of nodes point to the same nodes in optimized levels of detail"""
+        source = Gltf.load(make_system_gltf())
+        optimized = Gltf.load(optimization.optimize_gltf(source))
+        for index, node in enumerate(source.document['nodes']):
+            self.assertEqual(optimized.document['nodes'][index].get('name'), node['name'])
@@ -0,0 +1,88 @@
+from tempfile import TemporaryDirectory
+
+import numpy as np
+from django.core.files.base import ContentFile
+
+from EasyView import models, tasks, optimization
+from EasyView.gltf import Gltf, GltfWriter, ARRAY_BUFFER, transform_points
+from EasyView.tests.test_import_export import ViewPointsSetUp
+
+
+def make_plate_gltf(size: int = 20) -> bytes:
+    """
+    Returns a .glb file with a square plate of 2 * size * size triangles that don't share vertices,
+    placed twice into a scene.
+    """
+    x, z = np.meshgrid(np.arange(size), np.arange(size))
+    corners = np.column_stack([x.ravel(), z.ravel()]).astype(np.float32)
+    quads = np.stack([corners, corners + [1, 0], corners + [1, 1], corners + [0, 1]], axis=1)
+    triangles = np.concatenate([quads[:, [0, 2, 1]], quads[:, [0, 3, 2]]]).reshape(-1, 2)
+    positions = np.column_stack([triangles[:, 0], np.zeros(len(triangles)), triangles[:, 1]]).astype(np.float32)
+    document = {
+        'asset': {'version': '2.0'},
+        'scene': 0,
+        'scenes': [{'nodes': [0, 1]}],
+        'nodes': [{'mesh': 0, 'name': '10UJA'}, {'mesh': 0, 'name': '20UJA', 'translation': [100, 0, 0]}],
+        'meshes': [{'primitives': [{'attributes': {}}]}],
+    }
+    writer = GltfWriter(document)
+    document['meshes'][0]['primitives'][0]['attributes'] = {
+        'POSITION': writer.add_accessor(positions, ARRAY_BUFFER, bounds=True),
+        'NORMAL': writer.add_accessor(np.tile(np.float32([0, 1, 0]), (len(positions), 1)), ARRAY_BUFFER),
+        'TEXCOORD_0': writer.add_accessor(triangles.astype(np.float32) / size, ARRAY_BUFFER),
+    }
+    return writer.to_glb()
+
+
+def get_world_triangles(gltf: Gltf) -> np.ndarray:
+    """Returns triangles of all meshes of a scene in world coordinates"""
+    nodes, triangles = gltf.document['nodes'], []
+    for node_index, matrix in gltf.iterate_scene_nodes():
+        if 'mesh' not in nodes[node_index]:
+            continue
+        for primitive in gltf.document['meshes'][nodes[node_index]['mesh']]['primitives']:
+            positions = gltf.read_accessor(primitive['attributes']['POSITION']).astype(np.float64)
+            if 'indices' in primitive:
+                positions = positions[gltf.read_accessor(primitive['indices'])[:, 0]]
+            triangles.append(transform_points(matrix, positions).reshape(-1, 3, 3))
+    return np.concatenate(triangles)
+
+
+class OptimizationTest(ViewPointsSetUp):
+    """Tests for optimization of glTF files"""
+    def test_weld_and_quantize(self):
+        """Checks that vertices are welded and quantized without moving triangles"""
+        source = Gltf.load(make_plate_gltf())
+        optimized = Gltf.load(optimization.optimize_gltf(source))
+        self.assertIn(optimization.QUANTIZATION_EXTENSION, optimized.document['extensionsRequired'])
+        primitive = optimized.document['meshes'][0]['primitives'][0]
+        positions = optimized.read_accessor(primitive['attributes']['POSITION'])
+        self.assertEqual(positions.dtype, np.uint16)
+        self.assertEqual(len(positions), 21 * 21)
+        self.assertEqual(optimized.read_accessor(primitive['attributes']['NORMAL']).shape, (21 * 21, 3))
+        expected, actual = get_world_triangles(source), get_world_triangles(optimized)
+        self.assertEqual(actual.shape, expected.shape)
+        self.assertLess(np.abs(np.sort(actual.reshape(-1, 9), axis=0) - np.sort(expected.reshape(-1, 9), axis=0)).max(),
+                        1e-3)
+
+    def test_levels_of_detail(self):
+        """Checks that coarser levels have fewer triangles"""
+        source = Gltf.load(make_plate_gltf())
+        counts = [len(get_world_triangles(Gltf.load(optimization.optimize_gltf(source, cells))))
+                  for cells in optimization.LOD_CELLS]
+        self.assertEqual(counts[0], 2 * 2 * 20 * 20)
+        self.assertEqual(counts, sorted(counts, reverse=True))
+        self.assertLess(counts[-1], counts[0])
+
+    def test_build_lods(self):
+        """Checks that levels of detail are built once per file and exposed by API"""
+        with TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root):
+            self.model1.gltf.save('plate.glb', ContentFile(make_plate_gltf()))
+            built = tasks.optimize_model_task.apply(args=(self.model1.pk,)).get()
+            self.assertEqual(len(built), len(optimization.LOD_CELLS))
+            self.assertEqual(optimization.build_lods(self.model1), [])
+            lods = self.client.get(f'/api/v1/models/{self.model1.pk}/').json()['gltf_lods']
+            self.assertEqual([lod['level'] for lod in lods], list(range(len(optimization.LOD_CELLS))))
+            response = self.client.get(lods[0]['url'])
+            self.assertEqual(response['Content-Type'], 'model/gltf-binary')
+            self.assertEqual(models.ModelArtefact.objects.filter(model=self.model1).count(), len(lods))
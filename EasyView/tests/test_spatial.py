@@ -0,0 +1,91 @@
+import math
+import random
+
+from django.db import connection
+from django.urls import reverse
+
+from AtomproektBase.test.test_models import SetUp
+
+from EasyView import models, spatial
+
+
+class SpatialSearchTest(SetUp):
+    """Tests for spatial search of view points and notes"""
+    def setUp(self) -> None:
+        super(SpatialSearchTest, self).setUp()
+        self.model1 = models.Model3D.objects.create(building=self.building1_1)
+        random.seed(0)
+        self.positions = [[random.uniform(-100, 100) for _ in range(3)] for _ in range(200)]
+        view_points = models.ViewPoint.objects.bulk_create([
+            models.ViewPoint(model=self.model1, position=position, quaternion=[0, 0, 0, 1])
+            for position in self.positions
+        ])
+        models.Note.objects.bulk_create([
+            models.Note(view_point=view_point, text='Note', position=view_point.position)
+            for view_point in view_points
+        ])
+
+    def test_box(self):
+        """Checks that exactly the positions inside a box are found"""
+        lower, upper = [10, -50, -20], [-30, 40, 60]
+        found = spatial.filter_in_box(models.ViewPoint.objects.all(), 'position', lower, upper)
+        expected = [
+            position for position in self.positions
+            if all(min(pair) <= value <= max(pair) for value, pair in zip(position, zip(lower, upper)))
+        ]
+        self.assertCountEqual([view_point.position for view_point in found], expected)
+
+    def test_sphere(self):
+        """Checks that exactly the positions within a radius are found, nearest first"""
+        center, radius = [5, 5, 5], 50
+        found = [view_point.position for view_point in spatial.filter_in_sphere(
+            models.ViewPoint.objects.all(), 'position', center, radius)]
+        expected = sorted(
+            (position for position in self.positions if math.dist(position, center) <= radius),
+            key=lambda position: math.dist(position, center),
+        )
+        self.assertEqual(found, expected)
+
+    def test_index_is_used(self):
+        """Checks that the query can be answered by the GiST index"""
+        queryset = spatial.filter_in_box(models.ViewPoint.objects.all(), 'position', [0, 0, 0], [1, 1, 1])
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            plan = queryset.explain()
+            cursor.execute('SET enable_seqscan = on')
+        self.assertIn('easyview_viewpoint_plan_idx', plan)
+
+    def test_api(self):
+        """Checks spatial search endpoint of a model"""
+        url = reverse('model3d-spatial-search', kwargs={'pk': self.model1.pk})
+        box = self.client.get(url, {'min': '-100,-100,-100', 'max': '100,100,100', 'limit': 1000}).json()
+        self.assertEqual(len(box['view_points']), len(self.positions))
+        self.assertEqual(len(box['notes']), len(self.positions))
+        self.assertEqual(box['truncated'], {'view_points': False, 'notes': False})
+        sphere = self.client.get(url, {'center': '0,0,0', 'radius': 0}).json()
+        self.assertEqual(sphere, {'view_points': [], 'notes': [], 'truncated': {'view_points': False, 'notes': False}})
+        cases = [
+            ({'min': '0,0', 'max': '1,1,1'}, 'min'),
+            ({'center': '0,0,0'}, 'radius'),
+            ({'center': '0,0,0', 'radius': -1}, 'radius'),
+            ({'center': '0,0,0', 'radius': 1, 'limit': 0}, 'limit'),
+            ({'center': '0,0,0', 'radius': 1, 'limit': 1001}, 'limit'),
+        ]
+        for params, error in cases:
+            with self.subTest(msg=str(params)):
+                response = self.client.get(url, params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn(error, response.json())
+
+    def test_api_limit(self):
+        """Checks that the endpoint returns at most a limited number of nearest objects of every kind"""
+        url = reverse('model3d-spatial-search', kwargs={'pk': self.model1.pk})
+        center = [0, 0, 0]
+        expected = sorted(self.positions, key=lambda position: math.dist(position, center))
+        sphere = self.client.get(url, {'center': '0,0,0', 'radius': 1000, 'limit': 10}).json()
+        self.assertEqual([view_point['position'] for view_point in sphere['view_points']], expected[:10])
+        self.assertEqual([note['position'] for note in sphere['notes']], expected[:10])
+        self.assertEqual(sphere['truncated'], {'view_points': True, 'notes': True})
+        box = self.client.get(url, {'min': '-100,-100,-100', 'max': '100,100,100'}).json()
+        self.assertEqual(len(box['view_points']), 100)
+        self.assertTrue(box['truncated']['view_points'])
@@ -0,0 +1,104 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, Storage
+from django.test import SimpleTestCase
+
+from EasyView.storage import CachedStorage
+
+
+class ModifiedTimeStorage(FileSystemStorage):
+    """A storage that only has the old 'modified_time' with naive UTC time, like Dropbox storage does"""
+    get_modified_time = Storage.get_modified_time
+
+    def modified_time(self, name: str) -> datetime:
+        return datetime.utcfromtimestamp(os.path.getmtime(self.path(name)))
+
+
+class CachedStorageTest(SimpleTestCase):
+    """Tests for the local disk cache of a remote storage"""
+    def setUp(self):
+        cache.clear()
+        self.remote_root = TemporaryDirectory()
+        self.cache_root = TemporaryDirectory()
+        self.addCleanup(self.remote_root.cleanup)
+        self.addCleanup(self.cache_root.cleanup)
+        self.settings_override = self.settings(MEDIA_ROOT=self.remote_root.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+    def get_storage(self, max_size: int = 1024) -> CachedStorage:
+        return CachedStorage('django.core.files.storage.FileSystemStorage', self.cache_root.name, max_size)
+
+    def read(self, storage: CachedStorage, name: str) -> bytes:
+        with storage.open(name) as file:
+            return file.read()
+
+    def test_hits_and_freshness(self):
+        """Checks that files are read locally until they are replaced through any instance of the storage"""
+        storage, other_storage = self.get_storage(), self.get_storage()
+        name = storage.save('models/a.glb', ContentFile(b'first'))
+        with mock.patch.object(storage.remote, 'open', side_effect=AssertionError):
+            self.assertEqual(self.read(storage, name), b'first')
+            self.assertTrue(storage.exists(name))
+            self.assertEqual(storage.size(name), 5)
+        self.assertEqual(storage.get_stats()['hits'], 1)
+        # another worker replaces the file
+        other_storage.delete(name)
+        self.assertFalse(storage.exists(name))
+        os.utime(os.path.join(self.remote_root.name, other_storage.save(name, ContentFile(b'second'))), (0, 0))
+        cache.clear()
+        self.assertEqual(self.read(storage, name), b'second')
+        self.assertEqual(storage.get_stats(), {'hits': 0, 'misses': 1, 'evictions': 0, 'size': 6})
+        self.assertEqual(len(os.listdir(self.cache_root.name)), 2)  # one copy and its lock
+
+    def test_modified_time(self):
+        """Checks that files of a remote storage without 'get_modified_time' are saved, found and read"""
+        storage = CachedStorage('EasyView.tests.test_storage.ModifiedTimeStorage', self.cache_root.name, 1024)
+        name = storage.save('models/a.glb', ContentFile(b'first'))
+        os.utime(os.path.join(self.remote_root.name, name), (0, 0))
+        cache.clear()
+        self.assertTrue(storage.exists(name))
+        self.assertEqual(storage.size(name), 5)
+        self.assertEqual(storage.get_modified_time(name).timestamp(), 0)
+        self.assertEqual(self.read(storage, name), b'first')
+
+    def test_eviction(self):
+        """Checks that the least recently used files are evicted when the cache is full"""
+        storage = self.get_storage(max_size=250)
+        for name in ('a', 'b', 'c'):
+            storage.save(name, ContentFile(name.encode() * 100))
+            time.sleep(0.01)
+        stats = storage.get_stats()
+        self.assertEqual((stats['evictions'], stats['size']), (1, 200))
+        self.assertEqual(self.read(storage, 'a'), b'a' * 100)
+        time.sleep(0.01)
+        self.read(storage, 'c')
+        self.read(storage, 'b')
+        stats = storage.get_stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['evictions']), (1, 2, 3))
+        self.assertEqual(stats['size'], 200)
+
+    def test_single_flight(self):
+        """Checks that concurrent reads of a missing file wait for one download"""
+        remote_storage = self.get_storage()
+        remote_storage.remote.save('big.glb', ContentFile(b'data'))
+        storage = self.get_storage()
+        remote_open = storage.remote.open
+
+        def slow_open(*args, **kwargs):
+            time.sleep(0.1)
+            return remote_open(*args, **kwargs)
+
+        with mock.patch.object(storage.remote, 'open', side_effect=slow_open) as opened, \
+                ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(lambda _: self.read(storage, 'big.glb'), range(4)))
+        self.assertEqual(results, [b'data'] * 4)
+        self.assertEqual(opened.call_count, 1)
+        self.assertEqual(storage.get_stats()['misses'], 1)
@@ -0,0 +1,76 @@
+import json
+import os
+import time
+from tempfile import TemporaryDirectory
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django_celery_results.models import TaskResult
+
+from EasyView import models, tasks
+from EasyView.tests.test_import_export import ViewPointsSetUp
+
+
+class JobsTest(ViewPointsSetUp):
+    """Tests for background import and export jobs"""
+    databases = {'default', 'jobs'}
+
+    def setUp(self) -> None:
+        super(JobsTest, self).setUp()
+        self.media_root = TemporaryDirectory()
+        self.settings_override = self.settings(MEDIA_ROOT=self.media_root.name)
+        self.settings_override.enable()
+
+    def tearDown(self) -> None:
+        self.settings_override.disable()
+        self.media_root.cleanup()
+        super(JobsTest, self).tearDown()
+
+    def test_export_and_import(self):
+        """Checks that exported file can be imported back by a job"""
+        pk_list = [view_point.pk for view_point in self.view_points]
+        export_result = tasks.export_viewpoints_task.apply(args=(pk_list,)).get()
+        self.assertEqual(export_result['processed'], len(pk_list))
+        file_name = export_result['file']
+        with default_storage.open(file_name) as exported:
+            import_file_name = default_storage.save(f'{tasks.IMPORT_JOBS_DIR}/test.xml', exported)
+        import_result = tasks.import_viewpoints_task.apply(args=(import_file_name, self.model1.pk)).get()
+        self.assertEqual(import_result['processed'], len(pk_list))
+        self.assertEqual(models.ViewPoint.objects.filter(pk__in=import_result['list']).count(), len(pk_list))
+        self.assertFalse(default_storage.exists(import_file_name))
+
+    def test_status(self):
+        """Checks that status of a job is reported"""
+        cases = [
+            ('PROGRESS', {'processed': 10}, {'processed': 10}),
+            ('SUCCESS', {'processed': 2, 'list': [1, 2]}, {'processed': 2, 'list': [1, 2]}),
+        ]
+        for state, result, expected in cases:
+            with self.subTest(msg=state):
+                TaskResult.objects.store_result('application/json', 'utf-8', state, json.dumps(result), state)
+                response = self.client.get(reverse('job_status', kwargs={'job_id': state}))
+                self.assertEqual(response.json(), {'job': state, 'status': state, **expected})
+
+    def test_export_status(self):
+        """Checks that a link to a file of an export job is made when a status is requested"""
+        result = tasks.export_viewpoints_task.apply(args=([self.view_points[0].pk],)).get()
+        TaskResult.objects.store_result('application/json', 'utf-8', 'export', json.dumps(result), 'SUCCESS')
+        url = reverse('job_status', kwargs={'job_id': 'export'})
+        self.assertEqual(self.client.get(url).json(), {
+            'job': 'export', 'status': 'SUCCESS', 'processed': 1, 'url': default_storage.url(result['file']),
+        })
+        default_storage.delete(result['file'])
+        self.assertIsNone(self.client.get(url).json()['url'])
+
+    def test_delete_old_export_files(self):
+        """Checks that only files of export jobs that are older than the limit are deleted"""
+        self.assertEqual(tasks.delete_old_export_files_task(), [])
+        old, new = [
+            tasks.export_viewpoints_task.apply(args=([self.view_points[0].pk],)).get()['file'] for _ in range(2)
+        ]
+        timestamp = time.time() - settings.EXPORT_FILES_MAX_AGE - 60
+        os.utime(default_storage.path(old), (timestamp, timestamp))
+        self.assertEqual(tasks.delete_old_export_files_task(), [old])
+        self.assertFalse(default_storage.exists(old))
+        self.assertTrue(default_storage.exists(new))
@@ -0,0 +1,62 @@
+import json
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+import numpy as np
+from django.core.files.base import ContentFile
+
+from EasyView import models, tasks, tiling
+from EasyView.gltf import Gltf
+from EasyView.tests.test_import_export import ViewPointsSetUp
+from EasyView.tests.test_optimization import make_plate_gltf, get_world_triangles
+
+
+class TilingTest(ViewPointsSetUp):
+    """Tests for splitting of glTF files into tiles"""
+    def test_octree(self):
+        """Checks that every triangle gets into exactly one small enough tile"""
+        groups = tiling.collect_triangles(Gltf.load(make_plate_gltf()))
+        root, leaves = tiling.build_octree(groups, max_triangles=200)
+        self.assertGreater(len(leaves), 1)
+        self.assertTrue(all(len(leaf['triangles']) <= 200 for leaf in leaves))
+        triangles = np.concatenate([leaf['triangles'] for leaf in leaves])
+        self.assertEqual(len(np.unique(triangles, axis=0)), 2 * 2 * 20 * 20)
+        self.assertEqual(root['min'].tolist(), [0, 0, 0])
+        self.assertEqual(root['max'].tolist(), [120, 0, 20])
+
+    def test_tiles(self):
+        """Checks that tiles keep all triangles and are found by a camera frustum"""
+        with TemporaryDirectory() as media_root, self.settings(MEDIA_ROOT=media_root), \
+                mock.patch.object(tiling, 'MAX_TILE_TRIANGLES', 200):
+            self.model1.gltf.save('plate.glb', ContentFile(make_plate_gltf()))
+            built = tasks.tile_model_task.apply(args=(self.model1.pk,)).get()
+            self.assertEqual(tiling.build_tiles(self.model1), [])
+            tiles = models.ModelArtefact.objects.filter(model=self.model1, kind=models.ModelArtefact.TILE)
+            self.assertEqual(len(built), len(tiles) + 1)
+            triangles = sum(len(get_world_triangles(Gltf.load(tile.file.read()))) for tile in tiles)
+            self.assertEqual(triangles, 2 * 2 * 20 * 20)
+            model = self.client.get(f'/api/v1/models/{self.model1.pk}/').json()
+            index = json.loads(b''.join(self.client.get(model['gltf_tileset']).streaming_content))
+            self.assertEqual(len(index['root']['children']), 2)
+            url = f'/api/v1/models/{self.model1.pk}/tiles/'
+            # looks down at the first plate
+            visible = self.client.get(url, {'position': '10,-10,50', 'quaternion': '0,0,0,1', 'aspect': 1}).json()
+            self.assertTrue(visible['tiles'])
+            self.assertTrue(all(tile['max'][0] <= 20 for tile in visible['tiles']))
+            # looks up
+            visible = self.client.get(url, {'position': '10,-10,50', 'quaternion': '1,0,0,0'}).json()
+            self.assertEqual(visible['tiles'], [])
+            response = self.client.get(url, {'position': '10,-10,50'})
+            self.assertEqual(response.status_code, 400)
+
+    def test_priority(self):
+        """Checks that boxes that look bigger go first and invisible ones are dropped"""
+        bounds = np.array([
+            [0, 0, -10, 1, 1, -9],
+            [0, 0, -100, 1, 1, -99],
+            [0, 0, -20, 10, 10, -19],
+            [0, 0, 10, 1, 1, 11],
+        ], dtype=np.float64)
+        position = np.zeros(3)
+        planes = tiling.get_frustum_planes(position, np.array([0, 0, -1.0]), 90, 1)
+        self.assertEqual(tiling.sort_visible_boxes(bounds, position, planes).tolist(), [2, 0, 1])
@@ -0,0 +1,124 @@
+import hashlib
+import os
+from tempfile import TemporaryDirectory
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+
+from EasyView import blobs, models, uploads
+from EasyView.tests.test_import_export import ViewPointsSetUp
+
+
+class ChunkedUploadTest(ViewPointsSetUp):
+    """Tests for chunked uploads of model files"""
+    def setUp(self):
+        super(ChunkedUploadTest, self).setUp()
+        media_root, uploads_root = TemporaryDirectory(), TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.addCleanup(uploads_root.cleanup)
+        settings_override = self.settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        for patcher in (
+            mock.patch.object(uploads, 'MODEL_UPLOADS_ROOT', uploads_root.name),
+            mock.patch.object(blobs, 'BLOCK_SIZE', 2),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.uploads_root = uploads_root.name
+
+    def start(self, data: bytes, chunk_size: int, file_name: str = 'model.nwd', model=None) -> dict:
+        chunks = [data[i:i + chunk_size] for i in range(0, len(data), chunk_size)]
+        response = self.client.post('/api/v1/model_uploads/', {
+            'model': f'http://testserver/api/v1/models/{(model or self.model1).pk}/',
+            'kind': 'nwd',
+            'file_name': file_name,
+            'size': len(data),
+            'chunk_size': chunk_size,
+            'checksum': uploads.get_checksum([hashlib.sha256(chunk).hexdigest() for chunk in chunks]),
+        })
+        self.assertEqual(response.status_code, 201, response.content)
+        return response.json()
+
+    def put_chunk(self, upload: dict, number: int, data: bytes, **headers):
+        return self.client.put(
+            f'/api/v1/model_uploads/{upload["id"]}/chunks/{number}/', data, content_type='application/octet-stream',
+            **headers,
+        )
+
+    def test_upload(self):
+        """Checks that chunks are received in any order and the file is attached to a model when it is complete"""
+        data = b'0123456789'
+        upload = self.start(data, chunk_size=4)
+        self.assertEqual(upload['chunks_count'], 3)
+        self.assertEqual(self.put_chunk(upload, 2, b'89').status_code, 200)
+        self.assertEqual(self.put_chunk(upload, 0, b'0123').status_code, 200)
+        self.assertEqual(self.put_chunk(upload, 3, b'').status_code, 400)
+        self.assertEqual(self.put_chunk(upload, 1, b'45678').status_code, 400)
+        response = self.put_chunk(upload, 1, b'4567', HTTP_X_CHUNK_CHECKSUM='0' * 64)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(upload['url']).json()['received_chunks'], [0, 2])
+        finalize_url = f'{upload["url"]}finalize/'
+        self.assertIn('missing: 1', self.client.post(finalize_url).json()['upload'])
+        response = self.put_chunk(upload, 1, b'4567', HTTP_X_CHUNK_CHECKSUM=hashlib.sha256(b'4567').hexdigest())
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post(finalize_url)
+        self.assertEqual(response.json()['status'], models.ModelUpload.COMPLETED)
+        self.model1.refresh_from_db()
+        self.assertEqual(self.model1.nwd.read(), data)
+        self.assertEqual(blobs.get_content_key(self.model1.nwd), blobs.hash_file(ContentFile(data)))
+        self.assertEqual(os.listdir(self.uploads_root), [])
+        self.assertEqual(self.put_chunk(upload, 0, b'0123').status_code, 400)
+
+    def test_replace_file(self):
+        """Checks that a corrupted upload is refused and a new file replaces the previous one"""
+        self.model1.nwd.save('model.nwd', ContentFile(b'old'))
+        previous_name = self.model1.nwd.name
+        upload = self.start(b'new file', chunk_size=8)
+        self.put_chunk(upload, 0, b'new file')
+        models.ModelUpload.objects.filter(pk=upload['id']).update(checksum='0' * 64)
+        response = self.client.post(f'{upload["url"]}finalize/')
+        self.assertIn('Checksum', response.json()['upload'])
+        models.ModelUpload.objects.filter(pk=upload['id']).update(checksum=upload['checksum'])
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.client.post(f'{upload["url"]}finalize/')
+        self.model1.refresh_from_db()
+        self.assertEqual(self.model1.nwd.read(), b'new file')
+        # the previous file is deleted only after the transaction is committed
+        self.assertTrue(self.model1.nwd.storage.exists(previous_name))
+        for callback in callbacks:
+            # background jobs of the saved model are not started
+            if callback.__module__ == uploads.__name__:
+                callback()
+        self.assertFalse(self.model1.nwd.storage.exists(previous_name))
+        response = self.client.post('/api/v1/model_uploads/', {**upload, 'file_name': 'model.glb'})
+        self.assertIn('file_name', response.json())
+        response = self.client.post('/api/v1/model_uploads/', {**upload, 'size': 100, 'chunk_size': 5})
+        self.assertIn('chunk_size', response.json())
+
+    def test_deduplication(self):
+        """Checks that a file that is uploaded again is stored once and is not replaced"""
+        data = b'0123456789'
+        model2 = models.Model3D.objects.create(building=self.building1_2)
+        for model in (self.model1, model2, self.model1):
+            upload = self.start(data, chunk_size=4, model=model)
+            for number in range(3):
+                self.put_chunk(upload, number, data[number * 4:number * 4 + 4])
+            self.client.post(f'{upload["url"]}finalize/')
+        self.model1.refresh_from_db()
+        model2.refresh_from_db()
+        self.assertEqual(self.model1.nwd.name, model2.nwd.name)
+        self.assertTrue(self.model1.nwd.name.startswith(blobs.BLOBS_DIR))
+        self.assertEqual(models.ModelUpload.objects.filter(status=models.ModelUpload.COMPLETED).count(), 3)
+        # the blob is kept while a model uses it
+        model2.nwd.save('other.nwd', ContentFile(b'other'))
+        blobs.delete_unused_blob(self.model1.nwd)
+        self.assertTrue(self.model1.nwd.storage.exists(self.model1.nwd.name))
+        with self.settings(FILE_UPLOAD_MAX_MEMORY_SIZE=0):
+            body = encode_multipart(BOUNDARY, {'nwd': SimpleUploadedFile('model.nwd', data)})
+            response = self.client.patch(f'/api/v1/models/{model2.pk}/', body, content_type=MULTIPART_CONTENT)
+        self.assertEqual(response.status_code, 200)
+        model2.refresh_from_db()
+        self.assertEqual(model2.nwd.name, self.model1.nwd.name)
@@ -0,0 +1,112 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from EasyView import models
+from EasyView.tests.test_import_export import ViewPointsSetUp
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class BuildingModelViewTest(ViewPointsSetUp):
+    """Tests for a page of a building model"""
+    def setUp(self) -> None:
+        super(BuildingModelViewTest, self).setUp()
+        cache.clear()
+        self.url = reverse('building_model', kwargs={'project': self.project1.slug, 'building': self.building1_1.slug})
+
+    def test_remarks_sidebar(self):
+        """Checks that remarks are shown in lists of their specialities"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.context['HVAC_remarks'].count('class="list-group-item'), 1)
+        self.assertEqual(response.context['Process_remarks'], '')
+        self.assertContains(response, f'key="{self.view_points[1].pk}"')
+
+    def test_remarks_sidebar_is_cached(self):
+        """Checks that remarks are not queried again until they are changed"""
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        remarks_queries = [query for query in context.captured_queries if models.Remark._meta.db_table in query['sql']]
+        self.assertEqual(remarks_queries, [])
+        self.assertNotContains(response, 'New remark')
+        models.Remark.objects.create(
+            view_point=self.view_points[2],
+            description='New remark',
+            speciality='Process',
+            reviewer='Reviewer',
+            deadline=self.remark.deadline,
+            status='Uncompleted',
+        )
+        response = self.client.get(self.url)
+        self.assertContains(response, 'New remark')
+
+    def test_moved_remarks(self):
+        """Checks that sidebars of both models are rendered again when a remark or a view point is moved"""
+        view_point = models.ViewPoint.objects.create(
+            model=models.Model3D.objects.create(building=self.building1_2), position=[0, 0, 0], quaternion=[0, 0, 0, 1],
+        )
+        url = reverse('building_model', kwargs={'project': self.project1.slug, 'building': self.building1_2.slug})
+        self.client.get(self.url)
+        self.client.get(url)
+        remark = models.Remark.objects.get(pk=self.remark.pk)
+        remark.view_point = view_point
+        remark.save()
+        self.assertEqual(self.client.get(self.url).context['HVAC_remarks'], '')
+        self.assertEqual(self.client.get(url).context['HVAC_remarks'].count('class="list-group-item'), 1)
+        view_point.model = self.model1
+        view_point.save()
+        self.assertEqual(self.client.get(url).context['HVAC_remarks'], '')
+        self.assertEqual(self.client.get(self.url).context['HVAC_remarks'].count('class="list-group-item'), 1)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class BuildingBundleViewTest(ViewPointsSetUp):
+    """Tests for a bundle of a building for the viewer"""
+    def setUp(self) -> None:
+        super(BuildingBundleViewTest, self).setUp()
+        cache.clear()
+        self.note = models.Note.objects.create(view_point=self.view_points[1], text='Note', position=[1, 1, 1])
+        self.url = reverse('building_bundle', kwargs={'project': self.project1.slug, 'building': self.building1_1.slug})
+
+    def test_bundle(self):
+        """Checks that view points come with their notes and remarks"""
+        response = self.client.get(self.url)
+        self.assertEqual(response['Cache-Control'], 'no-cache')
+        bundle = response.json()
+        self.assertEqual(bundle['building']['slug'], self.building1_1.slug)
+        self.assertEqual(bundle['model']['pk'], self.model1.pk)
+        view_points = {view_point['pk']: view_point for view_point in bundle['view_points']}
+        self.assertEqual(set(view_points), {view_point.pk for view_point in self.view_points})
+        self.assertEqual(view_points[self.view_points[1].pk]['notes'][0]['text'], 'Note')
+        self.assertEqual(view_points[self.view_points[1].pk]['remark']['description'], 'Remark')
+        self.assertIsNone(view_points[self.view_points[0].pk]['remark'])
+        building = reverse('building_bundle', kwargs={'project': self.project1.slug, 'building': 'missing'})
+        self.assertEqual(self.client.get(building).status_code, 404)
+
+    def test_queries(self):
+        """Checks that a bundle is built of a fixed number of queries and is not built again until it changes"""
+        with CaptureQueriesContext(connection) as context:
+            self.client.get(self.url)
+        queries_count = len(context.captured_queries)
+        self.assertLessEqual(queries_count, 4)
+        for view_point in self.view_points:
+            models.Note.objects.create(view_point=view_point, text='Another note', position=[0, 0, 0])
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url)
+        self.assertEqual(len(context.captured_queries), queries_count)
+        self.assertContains(response, 'Another note')
+        with self.assertNumQueries(0):
+            self.client.get(self.url)
+
+    def test_conditional_get(self):
+        """Checks that a client revalidates the bundle and gets a new one after a change"""
+        etag = self.client.get(self.url)['ETag']
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.note.text = 'Changed note'
+        self.note.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Changed note')
@@ -0,0 +1,310 @@
+import json
+import logging
+import posixpath
+import time
+
+import numpy as np
+from django.core.files.base import ContentFile
+
+from EasyView import blobs, delivery
+from EasyView.gltf import Gltf, GltfWriter, ARRAY_BUFFER, TRIANGLES, transform_points
+from EasyView.models import Model3D, ModelArtefact
+from EasyView.optimization import load_model_gltf, optimize_gltf
+
+logger = logging.getLogger(__name__)
+
+MAX_TILE_TRIANGLES = 100000
+MAX_DEPTH = 8
+# Attributes that are kept in tiles, others are dropped
+TILE_ATTRIBUTES = ('POSITION', 'NORMAL', 'TEXCOORD_0')
+
+
+class TriangleGroup:
+    """Triangles of a scene in world coordinates that share a material and a set of attributes"""
+    def __init__(self, material, names: tuple):
+        self.material = material
+        self.names = names
+        self.parts = {name: [] for name in names}
+        self.corners = {}
+
+    def add(self, corners: dict):
+        """Adds triangles given by values of attributes of their corners"""
+        for name in self.names:
+            self.parts[name].append(corners[name])
+
+    def close(self):
+        """Joins added triangles into arrays"""
+        self.corners = {name: np.concatenate(parts) for name, parts in self.parts.items()}
+        self.parts = {}
+
+    @property
+    def count(self) -> int:
+        return len(self.corners['POSITION']) // 3
+
+
+def collect_triangles(source: Gltf) -> list:
+    """
+    Collects triangles of all meshes of the default scene in world coordinates.
+
+    :param source: a parsed glTF file.
+    :return: list of groups of triangles.
+    """
+    nodes, meshes = source.document.get('nodes', []), source.document.get('meshes', [])
+    groups = {}
+    for node_index, matrix in source.iterate_scene_nodes():
+        if 'mesh' not in nodes[node_index]:
+            continue
+        normal_matrix = np.linalg.inv(matrix[:3, :3]).T
+        for primitive in meshes[nodes[node_index]['mesh']]['primitives']:
+            attributes = primitive['attributes']
+            if primitive.get('mode', TRIANGLES) != TRIANGLES or 'POSITION' not in attributes:
+                continue
+            names = tuple(name for name in TILE_ATTRIBUTES if name in attributes)
+            corners = {name: source.read_accessor(attributes[name]).astype(np.float64) for name in names}
+            if 'indices' in primitive:
+                indices = source.read_accessor(primitive['indices'])[:, 0]
+                corners = {name: values[indices] for name, values in corners.items()}
+            corners = {name: values[:len(values) - len(values) % 3] for name, values in corners.items()}
+            corners['POSITION'] = transform_points(matrix, corners['POSITION'])
+            if 'NORMAL' in corners:
+                corners['NORMAL'] = corners['NORMAL'] @ normal_matrix.T
+            key = (primitive.get('material'), names)
+            groups.setdefault(key, TriangleGroup(*key)).add(corners)
+    for group in groups.values():
+        group.close()
+    return [group for group in groups.values() if group.count]
+
+
+def build_octree(groups: list, max_triangles: int = MAX_TILE_TRIANGLES, max_depth: int = MAX_DEPTH) -> tuple:
+    """
+    Splits triangles into an octree by their centroids.
+
+    :param groups: groups of triangles.
+    :param max_triangles: a cell with more triangles is split further.
+    :param max_depth: cells of this depth are not split.
+    :return: tuple of the root cell and a list of leaf cells. A cell is a dict with 'min', 'max' and 'children'.
+    A leaf cell also has 'tile' number and 'triangles', an array of group numbers and triangle numbers.
+    """
+    triangles = np.concatenate([
+        np.column_stack([np.full(group.count, number), np.arange(group.count)]) for number, group in enumerate(groups)
+    ])
+    centroids = np.concatenate([group.corners['POSITION'].reshape(-1, 3, 3).mean(axis=1) for group in groups])
+    lower, upper = centroids.min(axis=0), centroids.max(axis=0)
+    size = (upper - lower).max()
+    leaves = []
+
+    def split(selection: np.ndarray, cell_lower: np.ndarray, cell_size: float, depth: int) -> dict:
+        if len(selection) <= max_triangles or depth >= max_depth:
+            cell = {'tile': len(leaves), 'triangles': triangles[selection], 'children': []}
+            cell.update(zip(('min', 'max'), get_triangles_bounds(groups, cell['triangles'])))
+            leaves.append(cell)
+            return cell
+        half = cell_size / 2
+        octants = ((centroids[selection] - cell_lower) >= half) @ np.array([1, 2, 4])
+        children = []
+        for octant in range(8):
+            child_selection = selection[octants == octant]
+            if len(child_selection):
+                offset = np.array([octant & 1, octant >> 1 & 1, octant >> 2 & 1]) * half
+                children.append(split(child_selection, cell_lower + offset, half, depth + 1))
+        return {
+            'min': np.min([child['min'] for child in children], axis=0),
+            'max': np.max([child['max'] for child in children], axis=0),
+            'children': children,
+        }
+
+    root = split(np.arange(len(triangles)), lower, size, 0)
+    return root, leaves
+
+
+def get_triangles_bounds(groups: list, triangles: np.ndarray) -> tuple:
+    """Returns corners of an axis-aligned box around given triangles"""
+    lower, upper = np.full(3, np.inf), np.full(3, -np.inf)
+    for number, group in enumerate(groups):
+        selected = triangles[triangles[:, 0] == number, 1]
+        if len(selected):
+            positions = group.corners['POSITION'].reshape(-1, 3, 3)[selected].reshape(-1, 3)
+            lower, upper = np.minimum(lower, positions.min(axis=0)), np.maximum(upper, positions.max(axis=0))
+    return lower, upper
+
+
+def write_tile(source: Gltf, groups: list, triangles: np.ndarray) -> bytes:
+    """
+    Builds an optimized .glb file with given triangles. Materials, textures and images are copied to every tile.
+
+    :param source: a parsed glTF file the triangles are taken from.
+    :param groups: groups of triangles.
+    :param triangles: array of group numbers and triangle numbers.
+    :return: contents of a file.
+    """
+    document = {
+        key: source.document[key]
+        for key in ('asset', 'materials', 'textures', 'samplers', 'images', 'extensionsUsed', 'extensionsRequired')
+        if key in source.document
+    }
+    document.update({'scene': 0, 'scenes': [{'nodes': [0]}], 'nodes': [{'mesh': 0}], 'meshes': [{'primitives': []}]})
+    writer = GltfWriter(json.loads(json.dumps(document)))
+    for image in writer.document.get('images', []):
+        if 'bufferView' in image:
+            image['bufferView'] = writer.add_view(source.read_view(image['bufferView']))
+    for number, group in enumerate(groups):
+        selected = triangles[triangles[:, 0] == number, 1]
+        if not len(selected):
+            continue
+        corners = (selected[:, None] * 3 + np.arange(3)).ravel()
+        primitive = {'attributes': {
+            name: writer.add_accessor(values[corners].astype(np.float32), ARRAY_BUFFER, bounds=name == 'POSITION')
+            for name, values in group.corners.items()
+        }}
+        if group.material is not None:
+            primitive['material'] = group.material
+        writer.document['meshes'][0]['primitives'].append(primitive)
+    return optimize_gltf(Gltf.load(writer.to_glb()))
+
+
+def build_tiles(model: Model3D) -> list:
+    """
+    Splits a glTF file of a model into an octree of tiles and saves them next to it with a tileset index,
+    a JSON file with a tree of bounding boxes. Tiles that were built of the same contents are not rebuilt.
+
+    :param model: a model with a glTF file.
+    :return: list of built artefacts.
+    """
+    signature = blobs.get_content_key(model.gltf)
+    old = list(model.artefacts.filter(kind__in=[ModelArtefact.TILESET, ModelArtefact.TILE]))
+    if old and all(artefact.source == signature for artefact in old):
+        return []
+    for artefact in old:
+        delivery.delete_model_file(artefact.file)
+        artefact.delete()
+    started = time.perf_counter()
+    source = load_model_gltf(model.gltf)
+    groups = collect_triangles(source)
+    if not groups:
+        return []
+    root, leaves = build_octree(groups, MAX_TILE_TRIANGLES, MAX_DEPTH)
+    stem = posixpath.splitext(posixpath.basename(model.gltf.name))[0]
+    built = []
+    for leaf in leaves:
+        tile = ModelArtefact(
+            model=model,
+            kind=ModelArtefact.TILE,
+            level=leaf['tile'],
+            source=signature,
+            bounds=[*leaf['min'].tolist(), *leaf['max'].tolist()],
+        )
+        tile.file.save(f'{stem}.tile{leaf["tile"]}.glb', ContentFile(write_tile(source, groups, leaf['triangles'])),
+                       save=False)
+        tile.save()
+        delivery.compress_model_file(tile.file)
+        leaf['url'] = tile.get_file_url()
+        built.append(tile)
+    tileset = ModelArtefact(
+        model=model,
+        kind=ModelArtefact.TILESET,
+        source=signature,
+        bounds=[*root['min'].tolist(), *root['max'].tolist()],
+    )
+    tileset.file.save(f'{stem}.tileset.json', ContentFile(json.dumps({'root': _get_index_cell(root)})), save=False)
+    tileset.save()
+    built.append(tileset)
+    logger.debug(f'{len(leaves)} tiles of {model.gltf.name} are built in {time.perf_counter() - started:.2f} s')
+    return built
+
+
+def _get_index_cell(cell: dict) -> dict:
+    """Returns a cell of an octree as it is written to a tileset index"""
+    index_cell = {'min': cell['min'].tolist(), 'max': cell['max'].tolist()}
+    if 'tile' in cell:
+        index_cell.update({'tile': cell['tile'], 'url': cell['url']})
+    else:
+        index_cell['children'] = [_get_index_cell(child) for child in cell['children']]
+    return index_cell
+
+
+# Frustum culling
+def navisworks_to_gltf(vector: np.ndarray) -> np.ndarray:
+    """Converts a vector from Navisworks coordinates (Z axis is up) to glTF ones (Y axis is up)"""
+    x, y, z = vector
+    return np.array([x, z, -y])
+
+
+def rotate(quaternion: np.ndarray, vector: np.ndarray) -> np.ndarray:
+    """Rotates a vector by a quaternion in format [x, y, z, w]"""
+    axis, w = quaternion[:3], quaternion[3]
+    cross = np.cross(axis, vector)
+    return vector + 2 * w * cross + 2 * np.cross(axis, cross)
+
+
+def get_frustum_planes(position: np.ndarray, direction: np.ndarray, fov: float, aspect: float,
+                       far: float = None) -> tuple:
+    """
+    Returns planes of a camera frustum, their normals look inside the frustum.
+    The camera has no roll, as in the viewer.
+
+    :param position: position of the camera.
+    :param direction: view direction of the camera.
+    :param fov: vertical field of view in degrees.
+    :param aspect: ratio of width to height of a view.
+    :param far: distance to a far plane, without it the frustum is not limited.
+    :return: tuple of an array of normals and an array of offsets, a point is inside if normal * point >= offset.
+    """
+    forward = direction / np.linalg.norm(direction)
+    right = np.cross(forward, [0, 1, 0])
+    if np.linalg.norm(right) < 1e-9:
+        right = np.array([1.0, 0, 0])
+    right /= np.linalg.norm(right)
+    up = np.cross(right, forward)
+    tan_vertical = np.tan(np.radians(fov) / 2)
+    tan_horizontal = tan_vertical * aspect
+    normals = [
+        forward,
+        forward * tan_horizontal + right,
+        forward * tan_horizontal - right,
+        forward * tan_vertical + up,
+        forward * tan_vertical - up,
+    ]
+    if far:
+        normals.append(-forward)
+    normals = np.array(normals)
+    offsets = normals @ position
+    if far:
+        offsets[-1] -= far
+    return normals, offsets
+
+
+def sort_visible_boxes(bounds: np.ndarray, position: np.ndarray, planes: tuple) -> np.ndarray:
+    """
+    Finds boxes that intersect a frustum and sorts them by priority: boxes that look bigger on a screen,
+    that is, bigger and closer ones, go first.
+
+    :param bounds: array of boxes in format [min x, min y, min z, max x, max y, max z].
+    :param position: position of a camera.
+    :param planes: normals and offsets of planes of a frustum.
+    :return: array of numbers of visible boxes.
+    """
+    normals, offsets = planes
+    lower, upper = bounds[:, :3], bounds[:, 3:]
+    farthest = np.where(normals[None, :, :] >= 0, upper[:, None, :], lower[:, None, :])
+    visible = np.flatnonzero(((farthest * normals).sum(axis=2) >= offsets).all(axis=1))
+    diagonals = np.linalg.norm(upper[visible] - lower[visible], axis=1)
+    distances = np.linalg.norm(np.clip(position, lower[visible], upper[visible]) - position, axis=1)
+    return visible[np.argsort(-diagonals / np.maximum(distances, 1e-6), kind='stable')]
+
+
+def get_visible_tiles(model: Model3D, position: list, quaternion: list, fov: float, aspect: float,
+                      far: float = None) -> list:
+    """
+    Returns tiles of a model that a camera sees, in order they should be loaded.
+    A camera is given by fields of a view point in Navisworks coordinates.
+
+    :return: list of tile artefacts.
+    """
+    tiles = list(model.artefacts.filter(kind=ModelArtefact.TILE).only('pk', 'bounds').order_by('level'))
+    if not tiles:
+        return []
+    camera = navisworks_to_gltf(np.array(position, dtype=np.float64))
+    direction = navisworks_to_gltf(rotate(np.array(quaternion, dtype=np.float64), np.array([0, 0, -1.0])))
+    planes = get_frustum_planes(camera, direction, fov, aspect, far)
+    order = sort_visible_boxes(np.array([tile.bounds for tile in tiles]), camera, planes)
+    return [tiles[number] for number in order]
@@ -0,0 +1,139 @@
+"""
+Chunked uploads of model files. A client creates an upload session with the size of a file, a size of chunks
+and a checksum, sends numbered chunks in any order (in parallel or again after a failure), then finalizes
+the session. Chunks are written right into their places of one file on a local disk, so nothing is
+assembled in memory or copied at the end.
+
+The checksum of a file is a hex SHA-256 of concatenated binary SHA-256 digests of all its chunks in order,
+so it is checked by digests of chunks, which are found while they are received, without reading the file again.
+For the same reason chunks are multiples of blocks of a content hash, unless a file is sent in one chunk.
+"""
+import copy
+import hashlib
+import os
+
+from django.core.files import File
+from django.db import transaction
+
+from AtomREST.settings import MODEL_UPLOADS_ROOT
+from EasyView import blobs
+from EasyView.models import ModelUpload, ModelUploadChunk
+
+READ_SIZE = 1024 * 1024
+
+
+class StagedFile(File):
+    """
+    A file that is already complete on a local disk. Django's file system storage moves such files
+    into place instead of copying them, as it does with large uploaded files.
+    """
+    def temporary_file_path(self) -> str:
+        return self.file.name
+
+
+def get_staging_path(upload: ModelUpload) -> str:
+    """Returns a path of a file that chunks of an upload are written into"""
+    return os.path.join(MODEL_UPLOADS_ROOT, f'{upload.pk}.part')
+
+
+def get_checksum(chunk_checksums: list) -> str:
+    """Returns a checksum of a file by hex SHA-256 digests of its chunks in order"""
+    return hashlib.sha256(b''.join(bytes.fromhex(checksum) for checksum in chunk_checksums)).hexdigest()
+
+
+def start_upload(upload: ModelUpload):
+    """Creates a file of the full size for chunks of a new upload, it takes no disk space until they come"""
+    os.makedirs(MODEL_UPLOADS_ROOT, exist_ok=True)
+    with open(get_staging_path(upload), 'wb') as file:
+        file.truncate(upload.size)
+
+
+def write_chunk(upload: ModelUpload, number: int, stream, checksum: str = None) -> ModelUploadChunk:
+    """
+    Writes a chunk into its place of a staged file while it is read from a request. A chunk that is sent
+    again replaces the previous one.
+
+    :param upload: an upload session.
+    :param number: number of the chunk, starting from 0.
+    :param stream: file-like object with contents of the chunk.
+    :param checksum: hex SHA-256 of the chunk that a client expects, if it is given.
+    :return: saved chunk.
+    """
+    if upload.status != ModelUpload.UPLOADING:
+        raise ValueError('Upload is already finished')
+    if number >= upload.chunks_count:
+        raise ValueError(f'Upload has only {upload.chunks_count} chunks')
+    expected_size, received_size = upload.get_chunk_size(number), 0
+    digest, hasher = hashlib.sha256(), blobs.ContentHasher()
+    with open(get_staging_path(upload), 'r+b') as file:
+        file.seek(number * upload.chunk_size)
+        for data in iter(lambda: stream.read(READ_SIZE) if stream else b'', b''):
+            received_size += len(data)
+            if received_size > expected_size:
+                break
+            digest.update(data)
+            hasher.update(data)
+            file.write(data)
+    if received_size != expected_size:
+        raise ValueError(f'Chunk {number} should be {expected_size} bytes long')
+    if checksum and checksum.lower() != digest.hexdigest():
+        raise ValueError(f'Checksum of chunk {number} does not match')
+    chunk, _ = ModelUploadChunk.objects.update_or_create(
+        upload=upload, number=number, defaults={
+            'checksum': digest.hexdigest(),
+            'blocks': [block.hex() for block in hasher.get_block_digests()],
+        },
+    )
+    return chunk
+
+
+def finalize_upload(upload_pk) -> ModelUpload:
+    """
+    Checks that all chunks of an upload are received and match its checksum, then attaches the file
+    to a model. If the model already has the same file, nothing is changed. The previous file of the model
+    is deleted if no other model uses it.
+
+    :param upload_pk: PK of an upload session.
+    :return: finished upload.
+    """
+    with transaction.atomic():
+        upload = ModelUpload.objects.select_for_update().select_related('model__building').get(pk=upload_pk)
+        if upload.status != ModelUpload.UPLOADING:
+            return upload
+        chunks = {number: (checksum, blocks) for number, checksum, blocks in upload.chunks.values_list(
+            'number', 'checksum', 'blocks',
+        )}
+        missing = [number for number in range(upload.chunks_count) if number not in chunks]
+        if missing:
+            raise ValueError(f'Chunks are missing: {", ".join(map(str, missing[:20]))}')
+        if get_checksum([chunks[number][0] for number in range(upload.chunks_count)]) != upload.checksum:
+            raise ValueError('Checksum of the file does not match')
+        content_hash = blobs.get_content_hash([
+            bytes.fromhex(block) for number in range(upload.chunks_count) for block in chunks[number][1]
+        ])
+        model = upload.model
+        previous_file = copy.copy(getattr(model, upload.kind))
+        path = get_staging_path(upload)
+        if previous_file.name != blobs.get_blob_name(content_hash, upload.file_name):
+            with open(path, 'rb') as file:
+                staged_file = StagedFile(file)
+                staged_file.content_hash = content_hash
+                getattr(model, upload.kind).save(upload.file_name, staged_file, save=False)
+            model.save()
+            if previous_file:
+                # the previous file stays in place if the transaction is rolled back
+                transaction.on_commit(lambda: blobs.delete_unused_blob(previous_file))
+        upload.status = ModelUpload.COMPLETED
+        upload.save(update_fields=['status'])
+        upload.chunks.all().delete()
+    # storages that upload files elsewhere leave a staged file in place
+    if os.path.exists(path):
+        os.remove(path)
+    return upload
+
+
+def abort_upload(upload: ModelUpload):
+    """Deletes an upload session with its received chunks"""
+    if os.path.exists(get_staging_path(upload)):
+        os.remove(get_staging_path(upload))
+    upload.delete()
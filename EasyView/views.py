@@ -1,18 +1,38 @@
+import posixpath
 from tempfile import TemporaryFile
+from uuid import uuid4
 import random
 
 from django.views.generic import TemplateView, DetailView
 from django.views import View
 from django.views.decorators.csrf import csrf_exempt
-from django.http import HttpRequest, HttpResponse, JsonResponse
+from django.http import HttpRequest, HttpResponse, JsonResponse, StreamingHttpResponse, Http404
 from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db.models import Prefetch
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
 from django.utils.decorators import method_decorator
+from django.utils.http import http_date
 
-from rest_framework import viewsets
+from celery.result import AsyncResult
+from rest_framework import mixins, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.fields import empty
+from rest_framework.serializers import CharField, ChoiceField, DateField, IntegerField, ListField, FloatField
 from rest_framework.permissions import IsAuthenticatedOrReadOnly
 
 from AtomREST.settings import CURRENT_API_URL
-from EasyView import serializers, models, import_export, content
+from AtomproektBase import versions
+from AtomproektBase.models import Building, Project
+from AtomproektBase.views import ConditionalGetMixin
+from EasyView import (
+    serializers, models, import_export, content, tasks, cache, pagination, filters, spatial, feed, delivery, tiling,
+    uploads, nodes, batch, bundle, register, remark_counters,
+)
 
 
 class IndexTemplateView(TemplateView):
@@ -28,7 +48,7 @@ class BuildingModelView(DetailView):
     context_object_name = 'model'
 
     def get_object(self, queryset=None):
-        return models.Model3D.objects.get(
+        return models.Model3D.objects.select_related('building').get(
             building__project__slug=self.kwargs['project'],
             building__slug=self.kwargs['building'],
         )
@@ -37,11 +57,10 @@ class BuildingModelView(DetailView):
         context = super(BuildingModelView, self).get_context_data(**kwargs)
         context['api_url'] = CURRENT_API_URL
         context['no_remarks_tips'] = []
+        remarks_sidebar = cache.get_remarks_sidebar(self.object)
         for speciality in models.Remark.SPECIALITIES:
-            context[f'{speciality[0]}_remarks'] = models.Remark.objects.filter(
-                view_point__model=self.object,
-                speciality=speciality[0],
-            )
+            context[f'{speciality[0]}_remarks'] = remarks_sidebar[speciality[0]]
+            # tips are chosen on every request, so they are never cached with the sidebar
             context['no_remarks_tips'].append(random.choice(content.NO_REMARKS_TIPS))
         return context
 
@@ -53,17 +72,27 @@ class ViewPointView(BuildingModelView):
 
     def get_context_data(self, **kwargs):
         context = super(ViewPointView, self).get_context_data(**kwargs)
-        context['view_point'] = models.ViewPoint.objects.get(pk=self.kwargs['pk'])
+        context['view_point'] = models.ViewPoint.objects.select_related('model__building').get(pk=self.kwargs['pk'])
         return context
 
 
 # Views for export/import of viewpoints
 @method_decorator(csrf_exempt, name='dispatch')
 class ExportViewPointsView(View):  # TODO add errors handling
-    """A view that processes incoming GET request and prepares an XML file with viewpoints to return"""
+    """
+    A view that processes incoming GET request and prepares an XML file with viewpoints to return.
+    If 'stream' parameter is set, the file is streamed to a client while it is being built.
+    """
     def get(self, request: HttpRequest):
-        viewpoints_pk_list = self.request.GET.get('viewpoints_pk_list', None).split(',')
-        if viewpoints_pk_list and viewpoints_pk_list != ['']:
+        viewpoints_pk_list = _get_view_points_pk_list(request)
+        if viewpoints_pk_list:
+            if self.request.GET.get('stream'):
+                response = StreamingHttpResponse(
+                    import_export.stream_exported_viewpoints_xml(viewpoints_pk_list),
+                    content_type='application/force-download',
+                )
+                response['Content-Disposition'] = 'attachment; filename=viewpoints_export.xml'
+                return response
             xml = import_export.create_exported_viewpoints_xml(viewpoints_pk_list)
             with TemporaryFile() as tf:
                 xml.write(tf)
@@ -74,6 +103,20 @@ class ExportViewPointsView(View):  # TODO add errors handling
             return HttpResponse(status=400)
 
 
+def _get_view_points_pk_list(request: HttpRequest) -> list:
+    """
+    Reads PKs of exported view points from 'viewpoints_pk_list' as '1,2,3' before a response is started,
+    repeated PKs are dropped.
+
+    :return: list of int PKs, empty if the parameter is missing or not valid.
+    """
+    field = ListField(child=IntegerField(min_value=1), min_length=1)
+    try:
+        return list(dict.fromkeys(field.run_validation(request.GET.get('viewpoints_pk_list', '').split(','))))
+    except ValidationError:
+        return []
+
+
 @method_decorator(csrf_exempt, name='dispatch')
 class ImportViewPointsView(View):  # TODO add errors handling
     """
@@ -90,31 +133,351 @@ class ImportViewPointsView(View):  # TODO add errors handling
             return HttpResponse(status=400)
 
 
+# Views for background export/import jobs
+@method_decorator(csrf_exempt, name='dispatch')
+class ExportViewPointsJobView(View):
+    """A view that starts a background job exporting viewpoints to an XML file, then returns JSON with the job ID"""
+    def get(self, request: HttpRequest):
+        viewpoints_pk_list = _get_view_points_pk_list(request)
+        if viewpoints_pk_list:
+            job = tasks.export_viewpoints_task.delay(viewpoints_pk_list)
+            return JsonResponse({'job': job.id}, status=202)
+        else:
+            return HttpResponse(status=400)
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class ImportViewPointsJobView(View):
+    """
+    A view that saves incoming file and starts a background job importing viewpoints off it, then returns JSON with
+    the job ID.
+    """
+    def post(self, request: HttpRequest):
+        file = self.request.FILES.get('file')
+        model_pk = self.request.POST.get('model')
+        if file and model_pk:
+            file_name = default_storage.save(f'{tasks.IMPORT_JOBS_DIR}/{uuid4()}.xml', file)
+            job = tasks.import_viewpoints_task.delay(file_name, model_pk)
+            return JsonResponse({'job': job.id}, status=202)
+        else:
+            return HttpResponse(status=400)
+
+
+class JobStatusView(View):
+    """
+    A view that returns JSON with a status of a background job and a number of viewpoints processed so far.
+    A finished import job also returns a list of saved viewpoints' pks, an export job - a link to download a file.
+    The link is made on every request, since links of some storages expire, and it is null when the file
+    is already deleted as an old one.
+    """
+    def get(self, request: HttpRequest, job_id: str):
+        job = AsyncResult(job_id)
+        status = {'job': job_id, 'status': job.state, 'processed': 0}
+        if job.state == tasks.PROGRESS:
+            status.update(job.info)
+        elif job.successful():
+            status.update(job.result)
+            if 'file' in status:
+                file_name = status.pop('file')
+                status['url'] = default_storage.url(file_name) if default_storage.exists(file_name) else None
+        elif job.failed():
+            status['error'] = str(job.result)
+        return JsonResponse(status)
+
+
+# Delivery of model files
+class ModelFileView(View):
+    """
+    A view that sends a .gltf/.glb or .nwd file of a model. Clients can resume downloads with range requests
+    and get precompressed variants of files.
+    """
+    def get(self, request: HttpRequest, pk: int, kind: str):
+        if kind not in models.Model3D.FILE_FIELDS:
+            raise Http404
+        model = get_object_or_404(models.Model3D.objects.select_related('building').only(kind, 'building__slug'), pk=pk)
+        field_file = getattr(model, kind)
+        if not field_file:
+            raise Http404
+        # files are stored under their content hashes, so they are saved by a browser under a name of a building
+        file_name = model.building.slug + posixpath.splitext(field_file.name)[1]
+        return delivery.serve_model_file(request, field_file, as_attachment=kind == 'nwd', file_name=file_name)
+
+
+class ModelArtefactView(View):
+    """A view that sends a file built of a model, like an optimized level of detail"""
+    def get(self, request: HttpRequest, pk: int):
+        artefact = get_object_or_404(models.ModelArtefact.objects.only('file'), pk=pk)
+        return delivery.serve_model_file(request, artefact.file)
+
+
+class BuildingBundleView(View):
+    """
+    A view that sends everything the viewer needs to open a building, found by slugs of its project and itself,
+    as one JSON document. Responses have validators, so clients keep the document and revalidate it.
+    """
+    def get(self, request: HttpRequest, project: str, building: str):
+        etag, last_modified = versions.get_validators(bundle.VERSION_MODELS, request.build_absolute_uri())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            try:
+                data = bundle.get_building_bundle(project, building, etag, {'request': request})
+            except models.Model3D.DoesNotExist:
+                raise Http404
+            response = HttpResponse(data, content_type='application/json')
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_cache_control(response, no_cache=True)
+        return response
+
+
 # REST API
-class Model3DViewSet(viewsets.ModelViewSet):
+class Model3DViewSet(ConditionalGetMixin, viewsets.ModelViewSet):
     """View set for a 3D model"""
-    queryset = models.Model3D.objects.all()
+    version_models = [models.Model3D, models.ModelArtefact, models.ViewPoint]
+    queryset = models.Model3D.objects.prefetch_related(
+        Prefetch('view_points', queryset=models.ViewPoint.objects.only('pk', 'model')),
+        Prefetch('artefacts', queryset=models.ModelArtefact.objects.exclude(kind=models.ModelArtefact.TILE).only(
+            'pk', 'model', 'kind', 'level',
+        )),
+    )
     serializer_class = serializers.Model3DSerializer
 
+    def get_queryset(self):
+        # actions that return view points by themselves don't need their prefetched links
+        if self.action in ('view_points_feed', 'spatial_search', 'tiles', 'nodes'):
+            return models.Model3D.objects.all()
+        return super(Model3DViewSet, self).get_queryset()
+
+    @action(detail=True)
+    def view_points_feed(self, request, pk=None):
+        """Returns camera states of all view points of the model packed into one binary buffer"""
+        return HttpResponse(feed.get_view_points_feed(self.get_object()), content_type='application/octet-stream')
+
+    @action(detail=True)
+    def spatial_search(self, request, pk=None):
+        """
+        Finds view points and notes of the model either inside an axis-aligned box, given by 'min' and 'max'
+        corners, or within 'radius' of 'center'. Points are passed as 'x,y,z'. Every kind of objects is searched
+        in the coordinate system its positions are stored in. At most 'limit' objects of every kind are returned,
+        nearest ones in a sphere and newest ones in a box, 'truncated' tells kinds that have more of them.
+        """
+        model = self.get_object()
+        limit = _get_query_param(request, 'limit', IntegerField(
+            min_value=1,
+            max_value=pagination.CreationTimeCursorPagination.max_page_size,
+            default=pagination.CreationTimeCursorPagination.page_size,
+        ))
+        view_points = ViewPointViewSet.queryset.filter(model=model)
+        notes = NotesViewSet.queryset.filter(view_point__model=model)
+        if 'center' in request.query_params or 'radius' in request.query_params:
+            center = _get_position_param(request, 'center')
+            radius = _get_query_param(request, 'radius', FloatField(min_value=0))
+            view_points = spatial.filter_in_sphere(view_points, 'position', center, radius)
+            notes = spatial.filter_in_sphere(notes, 'position', center, radius)
+        else:
+            lower, upper = _get_position_param(request, 'min'), _get_position_param(request, 'max')
+            ordering = pagination.CreationTimeCursorPagination.ordering
+            view_points = spatial.filter_in_box(view_points, 'position', lower, upper).order_by(*ordering)
+            notes = spatial.filter_in_box(notes, 'position', lower, upper).order_by(*ordering)
+        # one more object of every kind tells if results are truncated
+        view_points, notes = list(view_points[:limit + 1]), list(notes[:limit + 1])
+        context = self.get_serializer_context()
+        return Response({
+            'view_points': serializers.ViewPointSerializer(view_points[:limit], many=True, context=context).data,
+            'notes': serializers.NoteSerializer(notes[:limit], many=True, context=context).data,
+            'truncated': {'view_points': len(view_points) > limit, 'notes': len(notes) > limit},
+        })
+
+    @action(detail=True)
+    def tiles(self, request, pk=None):
+        """
+        Returns tiles of the model that a camera sees, in order they should be loaded. The camera is given
+        by fields of a view point: 'position' as 'x,y,z', 'quaternion' as 'x,y,z,w' and 'fov', and also by
+        'aspect' ratio of a view and optional distance to a 'far' plane.
+        """
+        model = self.get_object()
+        position = _get_position_param(request, 'position')
+        quaternion = _get_query_param(
+            request, 'quaternion', ListField(child=FloatField(), min_length=4, max_length=4), is_list=True,
+        )
+        fov = _get_query_param(request, 'fov', FloatField(min_value=0.1, max_value=179, default=60.0))
+        aspect = _get_query_param(request, 'aspect', FloatField(min_value=0.01, default=1.0))
+        far = _get_query_param(request, 'far', FloatField(min_value=0, default=None))
+        tiles = tiling.get_visible_tiles(model, position, quaternion, fov, aspect, far)
+        return Response({'tiles': [{
+            'tile': tile.level,
+            'url': request.build_absolute_uri(tile.get_file_url()),
+            'min': tile.bounds[:3],
+            'max': tile.bounds[3:],
+        } for tile in tiles]})
+
+    @action(detail=True)
+    def nodes(self, request, pk=None):
+        """
+        Returns indices of nodes of the glTF file of the model which KKS codes start with a code given in 'kks',
+        with their merged bounding box in glTF coordinates and a system of the building that has the code.
+        Indices are the same in optimized levels of detail, so a viewer flies to a system without loading
+        the whole file.
+        """
+        model = self.get_object()
+        code = nodes.get_node_kks(_get_query_param(request, 'kks', CharField(max_length=50)), None)
+        if not code:
+            raise ValidationError({'kks': ['Not a KKS code.']})
+        found = nodes.find_nodes(model, code)
+        system = found['system']
+        return Response({
+            **found,
+            'kks': code,
+            'system': request.build_absolute_uri(reverse('system-detail', args=[system.pk])) if system else None,
+        })
+
+
+class ModelUploadViewSet(mixins.CreateModelMixin, mixins.RetrieveModelMixin, mixins.DestroyModelMixin,
+                         viewsets.GenericViewSet):
+    """
+    View set for chunked uploads of model files. After a session is created, its chunks are sent by PUT requests
+    to 'chunks/<number>/' with raw contents and an optional 'X-Chunk-Checksum' header with hex SHA-256 of a chunk.
+    Then a POST request to 'finalize/' attaches the file to the model. A session shows received chunks,
+    so an interrupted upload is resumed by sending the rest of them.
+    """
+    queryset = models.ModelUpload.objects.prefetch_related(
+        Prefetch('chunks', queryset=models.ModelUploadChunk.objects.only('pk', 'upload', 'number')),
+    )
+    serializer_class = serializers.ModelUploadSerializer
+
+    def get_queryset(self):
+        if self.action in ('chunk', 'finalize'):
+            return models.ModelUpload.objects.all()
+        return super(ModelUploadViewSet, self).get_queryset()
+
+    def perform_create(self, serializer):
+        uploads.start_upload(serializer.save())
 
-class ViewPointViewSet(viewsets.ModelViewSet):
-    """View set for view points"""
-    queryset = models.ViewPoint.objects.all()
+    def perform_destroy(self, instance):
+        uploads.abort_upload(instance)
+
+    @action(detail=True, methods=['put'], url_path=r'chunks/(?P<number>\d+)')
+    def chunk(self, request, pk=None, number=None):
+        """Writes a chunk of the file while it is received, the body of a request is never read into memory"""
+        upload = self.get_object()
+        try:
+            chunk = uploads.write_chunk(upload, int(number), request.stream, request.headers.get('X-Chunk-Checksum'))
+        except ValueError as error:
+            raise ValidationError({'chunk': str(error)})
+        return Response({'number': chunk.number, 'checksum': chunk.checksum})
+
+    @action(detail=True, methods=['post'])
+    def finalize(self, request, pk=None):
+        """Checks the received file and attaches it to the model"""
+        try:
+            upload = uploads.finalize_upload(self.get_object().pk)
+        except ValueError as error:
+            raise ValidationError({'upload': str(error)})
+        return Response(self.get_serializer(upload).data)
+
+
+class ViewPointViewSet(ConditionalGetMixin, filters.QueryParamsFilterMixin, batch.BatchMixin, viewsets.ModelViewSet):
+    """
+    View set for view points, can be filtered by a model and a creation time range.
+    Several view points are fetched, created, updated or deleted at once by 'batch' endpoint.
+    """
+    # viewer urls are built of slugs of a building and a project
+    version_models = [models.ViewPoint, models.Note, models.Remark, models.Model3D, Building, Project]
+    queryset = models.ViewPoint.objects.select_related('model__building__project', 'remark').prefetch_related(
+        Prefetch('notes', queryset=models.Note.objects.only('pk', 'view_point')),
+    )
     serializer_class = serializers.ViewPointSerializer
+    pagination_class = pagination.CreationTimeCursorPagination
+    filter_fields = {
+        'model': filters.pk_filter('model'),
+        **filters.datetime_range_filters('created', 'creation_time'),
+    }
 
 
-class NotesViewSet(viewsets.ModelViewSet):
-    """View set for notes model"""
+class NotesViewSet(ConditionalGetMixin, filters.QueryParamsFilterMixin, batch.BatchMixin, viewsets.ModelViewSet):
+    """View set for notes model, can be filtered by a view point, several notes are handled at once by 'batch'"""
+    version_models = [models.Note]
     queryset = models.Note.objects.all()
     serializer_class = serializers.NoteSerializer
+    pagination_class = pagination.CreationTimeCursorPagination
+    filter_fields = {
+        'view_point': filters.pk_filter('view_point'),
+    }
 
 
-class RemarksViewSet(viewsets.ModelViewSet):
-    """View set for view points"""
+class RemarksViewSet(ConditionalGetMixin, filters.QueryParamsFilterMixin, batch.BatchMixin, viewsets.ModelViewSet):
+    """
+    View set for remarks, can be filtered by a speciality, a status, a deadline range, a model, a building
+    and a project. Several remarks are handled at once by 'batch' endpoint, numbers of remarks of buildings
+    and projects are given by 'statistics' endpoint.
+    """
+    version_models = [models.Remark, models.ViewPoint]
     queryset = models.Remark.objects.all()
     serializer_class = serializers.RemarkSerializer
+    pagination_class = pagination.CreationTimeCursorPagination
+    filter_fields = {
+        'speciality': filters.choice_filter('speciality', models.Remark.SPECIALITIES),
+        'status': filters.choice_filter('status', models.Remark.STATUSES),
+        'model': filters.pk_filter('view_point__model'),
+        'building': filters.pk_filter('view_point__model__building'),
+        'project': filters.pk_filter('view_point__model__building__project'),
+        **filters.date_range_filters('deadline', 'deadline'),
+    }
     permission_classes = [IsAuthenticatedOrReadOnly]
 
+    def get_queryset(self):
+        queryset = super(RemarksViewSet, self).get_queryset()
+        if self.action == 'batch_destroy':
+            # deleted remarks find models of their view points to drop cached sidebars and change counters
+            return queryset.select_related('view_point')
+        return queryset
+
+    @action(detail=False)
+    def register(self, request):
+        """
+        Streams a register of filtered remarks as a spreadsheet, 'file_type' is 'csv' (default) or 'xlsx'.
+        Every remark has a URL that opens its view point in the viewer.
+        """
+        file_type = _get_query_param(
+            request, 'file_type', ChoiceField(choices=list(register.FILE_TYPES), default='csv'),
+        )
+        write, content_type = register.FILE_TYPES[file_type]
+        rows = register.iterate_register_rows(self.get_queryset())
+        response = StreamingHttpResponse(write(rows), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename=remarks_register.{file_type}'
+        return response
+
+    @action(detail=False)
+    def statistics(self, request):
+        """
+        Returns numbers of remarks of projects and their buildings: total, overdue, by statuses and by specialities.
+        Can be limited to a 'project' by its PK, remarks are overdue after a 'date' (today by default).
+        """
+        project_pk = _get_query_param(request, 'project', IntegerField(min_value=1, default=None))
+        date = _get_query_param(request, 'date', DateField(default=None))
+        projects = remark_counters.get_remark_statistics(project_pk, date)
+        for project in projects:
+            project['url'] = request.build_absolute_uri(reverse('project-detail', args=[project['pk']]))
+            for building in project['buildings']:
+                building['url'] = request.build_absolute_uri(reverse('building-detail', args=[building['pk']]))
+        return Response(projects)
+
+
+def _get_query_param(request, name: str, field, is_list: bool = False):
+    """Reads a query parameter and validates it by a serializer field, comma-separated lists are split"""
+    value = request.query_params.get(name, empty)
+    if is_list and value is not empty:
+        value = value.split(',')
+    try:
+        return field.run_validation(value)
+    except ValidationError as error:
+        raise ValidationError({name: error.detail})
+
+
+def _get_position_param(request, name: str) -> list:
+    """Reads a query parameter with a position in format 'x,y,z'"""
+    return _get_query_param(request, name, ListField(child=FloatField(), min_length=3, max_length=3), is_list=True)
+
 
 # Error handlers TODO Remove in production
 class Error404(TemplateView):